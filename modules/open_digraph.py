@@ -1,7 +1,26 @@
 from typing import List, Dict, Tuple, Set, Union
-from random import randint, sample, choice
+from random import randint, sample, Random
+from heapq import heappush, heappop
+from collections import deque, OrderedDict
+from itertools import islice, repeat
+from array import array
+from bisect import bisect_left, bisect_right
+import re
+import io
+import gzip
+import lzma
+import hashlib
+import pickle
+import mmap
+import struct
+import time
+import multiprocessing
 import os
 import sys
+try:
+    import numpy as np
+except ImportError:  # NumPy is only needed by the array-based methods
+    np = None
 root = os.path.normpath(os.path.join(os.path.dirname(__file__)))
 sys.path.append(root)  # allows us to fetch files from the project root
 
@@ -115,7 +134,7 @@ class Node:
         """
         Creates a copy of the node
         """
-        return Node(self.get_id(), self.get_label(), self.get_parents(), self.get_children())
+        return Node(self.get_id(), self.get_label(), dict(self.get_parents()), dict(self.get_children()))
 
     def remove_parent_once(self, identity: int) -> None:
         """
@@ -325,7 +344,7 @@ class OpenDigraph:  # for open directed graph
         Creates a copy of the graph
         """
         return OpenDigraph(list(self.get_input_ids()), list(self.get_output_ids()),
-                           list(self.get_nodes_by_ids(self.get_node_ids())))
+                           [node.copy() for node in self.get_nodes()])
 
     def new_id(self):
         """
@@ -351,13 +370,28 @@ class OpenDigraph:  # for open directed graph
         else:
             raise ValueError("src or tgt doesn't exist")
 
-    def add_edges(self, edges: List[Tuple[int, int]]) -> None:
+    def add_edges(self, edges: List[Tuple[int, int]], multiplicities: List[int] = None) -> None:
         """
-        Adds edges between each pair of node IDs in the list of edges
+        Adds edges between each pair of node IDs in the list of edges, in a single pass.
+        Nothing is added if one of the nodes doesn't exist or a multiplicity is invalid
         :param edges: list(tuple(int, int)); list of edges to add (int; source node, int; target node)
+        :param multiplicities: list(int); number of parallel edges to add for each pair (positive), 1 if None
         """
-        for src, tgt in edges:
-            self.add_edge(src, tgt)
+        edges, nodes = list(edges), self.nodes
+        if not all(src in nodes and tgt in nodes for src, tgt in edges):
+            raise ValueError("src or tgt doesn't exist")
+        if multiplicities is None:
+            multiplicities = repeat(1)
+        else:
+            multiplicities = list(multiplicities)
+            if len(multiplicities) != len(edges):
+                raise ValueError("There must be one multiplicity per edge")
+            if not all(isinstance(m, int) and m > 0 for m in multiplicities):
+                raise ValueError("Multiplicities must be positive integers")
+        for (src, tgt), multiplicity in zip(edges, multiplicities):
+            children, parents = nodes[src].children, nodes[tgt].parents
+            children[tgt] = children.get(tgt, 0) + multiplicity  # Add a child to the source node
+            parents[src] = parents.get(src, 0) + multiplicity  # Add a parent to the target node
 
     def remove_edge(self, src: int, tgt: int) -> None:
         """
@@ -503,7 +537,7 @@ class OpenDigraph:  # for open directed graph
         Returns True if the graph is well-formed, else False
         """
         # Getters
-        node_ids = self.get_node_ids()
+        node_ids = set(self.get_node_ids())
         input_ids = self.get_input_ids()
         output_ids = self.get_output_ids()
 
@@ -542,17 +576,16 @@ class OpenDigraph:  # for open directed graph
             if node.get_id() != node_id:
                 return False
 
-        # Property 5: Check the relationship between parents and children
-        for node_id, node in self.get_id_node_map().items():
+        # Property 5: Check the relationship between parents and children (and that they exist)
+        nodes = self.get_id_node_map()
+        for node_id, node in nodes.items():
             for child_id, multiplicity in node.get_children().items():  # child->parent
-                child = self.get_node_by_id(child_id)
-                parents = child.get_parents()
-                if node_id not in parents or parents[node_id] != multiplicity:
+                child = nodes.get(child_id)
+                if child is None or child.parents.get(node_id) != multiplicity:
                     return False
             for parent_id, multiplicity in node.get_parents().items():  # parent->child
-                parent = self.get_node_by_id(parent_id)
-                children = parent.get_children()
-                if node_id not in children or children[node_id] != multiplicity:
+                parent = nodes.get(parent_id)
+                if parent is None or parent.children.get(node_id) != multiplicity:
                     return False
 
         return True
@@ -619,6 +652,110 @@ class OpenDigraph:  # for open directed graph
 
         return graph
     
+    @classmethod
+    def random_sparse(cls, n: int, edges: int, bound: int = 1, inputs: int = 0, outputs: int = 0,
+                      form: str = "free", seed=None, exponent: float = None) -> 'OpenDigraph':
+        """
+        Generates a random graph with exactly the given number of distinct edges (Erdős–Rényi G(n, m)),
+        sampled directly with NumPy in O(V+E) time and memory, without any adjacency matrix.
+        "free" allows loops, "loop-free" doesn't, "DAG" orients each edge along a random rank order,
+        "oriented" never has both (i, j) and (j, i), and "undirected" / "loop-free_undirected" have both
+        directions of each edge (an undirected edge counting once).
+        Inputs and outputs are new nodes, each linked to a random node of the graph.
+        :param n: int; number of nodes in the graph (without the inputs and outputs)
+        :param edges: int; number of distinct edges
+        :param bound: int; maximum multiplicity of the edges (drawn uniformly in 1..bound)
+        :param inputs: int; number of input nodes
+        :param outputs: int; number of output nodes
+        :param form: str; form of the graph
+        :param seed: seed of the NumPy random generator
+        :param exponent: float; if given, the fan-out follows a power law: the k-th node of a random order
+                         is the source of an edge with a probability proportional to (k+1)^-exponent.
+                         "oriented" keeps the drawn source and "DAG" ranks the nodes in that order, so the
+                         hubs stay sources; the undirected forms have both directions of every edge, so
+                         the exponent skews the degree in both directions
+        :return: OpenDigraph; randomly generated graph
+        """
+        if np is None:
+            raise ImportError("random_sparse requires NumPy")
+        if form not in ("free", "DAG", "oriented", "loop-free", "undirected", "loop-free_undirected"):
+            raise ValueError("Invalid graph form")
+        if inputs < 0 or outputs < 0 or edges < 0 or bound < 1 or (n == 0 and inputs + outputs > 0):
+            raise ValueError("Invalid input/output values")
+        rng = np.random.default_rng(seed)
+
+        # Edges are sampled as keys src * n + tgt, with src <= tgt for the forms that orient them later
+        ordered = form in ("free", "loop-free")
+        loops = form in ("free", "undirected")
+        if ordered:
+            capacity = n * n if loops else n * (n - 1)
+        else:
+            capacity = n * (n + 1) // 2 if loops else n * (n - 1) // 2
+        if edges > capacity:
+            raise ValueError(f"A {form} graph on {n} nodes has at most {capacity} edges")
+
+        if exponent is not None:
+            weights = np.arange(1, n + 1, dtype=float) ** -exponent
+            weights /= weights.sum()
+            order = rng.permutation(n)
+
+        keys = np.empty(0, dtype=np.int64)
+        flips = np.empty(0, dtype=bool)  # Whether the drawn source is the higher endpoint of the key
+        while len(keys) < edges:
+            size = int((edges - len(keys)) * 1.1) + 16
+            if exponent is None:
+                src = rng.integers(0, n, size)
+            else:
+                src = order[rng.choice(n, size, p=weights)]
+            tgt = rng.integers(0, n, size)
+            flip = src > tgt
+            if not ordered:
+                src, tgt = np.minimum(src, tgt), np.maximum(src, tgt)
+            if not loops:
+                src, tgt, flip = src[src != tgt], tgt[src != tgt], flip[src != tgt]
+            keys, first = np.unique(np.concatenate([keys, src * n + tgt]), return_index=True)
+            flips = np.concatenate([flips, flip])[first]
+        if len(keys) > edges:
+            chosen = rng.choice(len(keys), edges, replace=False)
+            keys, flips = keys[chosen], flips[chosen]
+        src, tgt = keys // n, keys % n
+
+        if form == "DAG":  # From the lower to the higher rank
+            if exponent is None:
+                rank = rng.permutation(n)
+            else:  # The hubs come first
+                rank = np.empty(n, dtype=np.int64)
+                rank[order] = np.arange(n)
+            swap = rank[src] > rank[tgt]
+        elif form == "oriented":
+            swap = flips if exponent is not None else rng.random(edges) < 0.5
+        else:
+            swap = None
+        if swap is not None:
+            src, tgt = np.where(swap, tgt, src), np.where(swap, src, tgt)
+        multiplicities = rng.integers(1, bound + 1, edges)
+
+        nodes = [Node(i, str(i), {}, {}) for i in range(n)]
+        symmetric = form in ("undirected", "loop-free_undirected")
+        for i, j, m in zip(src.tolist(), tgt.tolist(), multiplicities.tolist()):
+            nodes[i].children[j] = m
+            nodes[j].parents[i] = m
+            if symmetric:
+                nodes[j].children[i] = m
+                nodes[i].parents[j] = m
+
+        # New input and output nodes, linked to random nodes
+        input_ids = list(range(n, n + inputs))
+        output_ids = list(range(n + inputs, n + inputs + outputs))
+        for node_id, child_id in zip(input_ids, rng.integers(0, n, inputs).tolist()):
+            nodes.append(Node(node_id, '', {}, {child_id: 1}))
+            nodes[child_id].parents[node_id] = 1
+        for node_id, parent_id in zip(output_ids, rng.integers(0, n, outputs).tolist()):
+            nodes.append(Node(node_id, '', {parent_id: 1}, {}))
+            nodes[parent_id].children[node_id] = 1
+
+        return cls(input_ids, output_ids, nodes)
+
     def node_id_to_index_map(self) -> Dict[int, int]:
         """
         Returns a dictionary mapping each node ID to a unique integer index.
@@ -652,78 +789,223 @@ class OpenDigraph:  # for open directed graph
                 
         return adj_matrix
 
+    def save_binary(self, file) -> None:
+        """
+        Saves the graph in the binary format read by load_binary and MappedGraph: a header, the table of
+        the distinct labels, then arrays of fixed-size little-endian integers (node ids, node indices sorted
+        by id, label indices, CSR children and parents with multiplicities, input and output ports).
+        Labels are stored as strings (str of the label) and multiplicities on 32 bits
+        :param file: str, path-like or binary file object; where to write
+        """
+        if isinstance(file, (str, os.PathLike)):
+            with open(file, 'wb') as stream:
+                return self.save_binary(stream)
+
+        ids = list(self.nodes)  # In the order of the graph, which is kept
+        index = {node_id: k for k, node_id in enumerate(ids)}
+        nodes = list(self.nodes.values())
+        labels = {}  # Interned labels -> position in the table
+        sections = [array('q', ids), array('I', sorted(range(len(ids)), key=ids.__getitem__)),
+                    array('I', [labels.setdefault(str(node.label), len(labels)) for node in nodes])]
+        for adjacencies in ([node.children for node in nodes], [node.parents for node in nodes]):
+            offsets, targets, multiplicities = [0], [], []
+            for adjacency in adjacencies:
+                targets.extend(map(index.__getitem__, adjacency))
+                multiplicities.extend(adjacency.values())
+                offsets.append(len(targets))
+            if multiplicities and max(multiplicities) >= 1 << 32:
+                raise ValueError("Multiplicities must be below 2**32 in the binary format")
+            sections += [array('Q', offsets), array('I', targets), array('I', multiplicities)]
+        sections += [array('I', (index[i] for i in self.get_input_ids())),
+                     array('I', (index[i] for i in self.get_output_ids()))]
+
+        table = bytearray()
+        for label in labels:
+            encoded = label.encode()
+            table += struct.pack('<I', len(encoded)) + encoded
+        edges = len(sections[4])
+        file.write(struct.pack(BINARY_HEADER, BINARY_MAGIC, BINARY_VERSION, 0, len(ids), edges, len(labels),
+                               len(self.get_input_ids()), len(self.get_output_ids())))
+        file.write(table + bytes(-len(table) % 8))
+        for section in sections:
+            if sys.byteorder != 'little':
+                section.byteswap()
+            data = section.tobytes()
+            file.write(data + bytes(-len(data) % 8))  # Sections are 8-byte aligned
+
+    @classmethod
+    def load_binary(cls, file) -> 'OpenDigraph':
+        """
+        Loads a graph saved by save_binary, with the same ids and port order
+        :param file: str, path-like or binary file object; see MappedGraph, the file is memory-mapped,
+                     so in-memory streams aren't supported
+        :return: OpenDigraph; the graph
+        """
+        with MappedGraph(file) as mapped:
+            return mapped.to_graph(cls)
+
+    def dot_chunks(self, verbose=False, lines: int = 8192):
+        """
+        Generates the graph in .dot format, in chunks of about the given number of lines. Each node is
+        followed by its outgoing edges, labelled by their multiplicity; the inputs and outputs are kept in
+        order as the graph attributes inputs and outputs, and verbose output is marked by verbose="true"
+        :param verbose: bool; if True, includes both label and id for nodes
+        :param lines: int; number of lines per chunk
+        :return: generator of str; the chunks
+        """
+        parts = ["digraph G {\n"]
+        for name, ports in (("inputs", self.get_input_ids()), ("outputs", self.get_output_ids())):
+            if ports:
+                parts.append(f'{name}="{" ".join(map(str, ports))}";\n')
+        if verbose:
+            parts.append('verbose="true";\n')
+        for node_id, node in self.nodes.items():
+            label = f"{node.label} (id: {node_id})" if verbose else str(node.label)
+            if '"' in label or '\\' in label or '\n' in label:
+                label = label.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+            head = f"v{node_id}"
+            parts.append(f'{head} [label="{label}"];\n')
+            parts.extend([f'{head} -> v{child_id} [label="{multiplicity}"];\n'
+                          for child_id, multiplicity in node.children.items()])
+            if len(parts) >= lines:
+                yield ''.join(parts)
+                parts = []
+        parts.append("}\n")
+        yield ''.join(parts)
+
+    def write_dot(self, file, verbose=False, compression: str = None) -> None:
+        """
+        Writes the graph in .dot format, chunk by chunk, to a path or to a text or binary stream (pipe,
+        in-memory buffer, ...)
+        :param file: str, path-like or file object; where to write
+        :param verbose: bool; if True, includes both label and id for nodes
+        :param compression: str; None, 'gzip' or 'xz'; for a path, defaults to its .gz or .xz suffix
+        """
+        if isinstance(file, (str, os.PathLike)) and compression is None:
+            compression = DOT_COMPRESSIONS.get(os.path.splitext(os.fspath(file))[1])
+        if compression not in (None, 'gzip', 'xz'):
+            raise ValueError(f"Unknown compression {compression!r}")
+        if isinstance(file, (str, os.PathLike)):
+            with open(file, 'wb') as stream:
+                return self.write_dot(stream, verbose, compression)
+        if compression is not None:
+            opener = gzip.GzipFile(fileobj=file, mode='wb') if compression == 'gzip' else lzma.LZMAFile(file, 'wb')
+            with opener as stream:
+                return self.write_dot(stream, verbose)
+
+        text = isinstance(file, io.TextIOBase)
+        for chunk in self.dot_chunks(verbose):
+            file.write(chunk if text else chunk.encode())
+
     def save_as_dot_file(self, path, verbose=False) -> None:
         """
         Save the graph in .dot format at the specified path.
-        :param path: str; the path where the .dot file will be saved
+        :param path: str, path-like or file object; where the .dot file will be saved, compressed if it ends
+                     with .gz or .xz
         :param verbose: bool; if True, includes both label and id for nodes
         """
-        with open(path, 'w') as file:
-            file.write("digraph G {\n")
-            
-            # Write nodes
-            for node in self.get_nodes():
-                label = node.get_label()
-                if verbose:
-                    label = f"{node.get_label()} (id: {node.get_id()})"
-                file.write(f"v{node.get_id()} [label=\"{label}\"];\n")
-            
-            # Write edges
-            for node in self.get_nodes():
-                for child_id, multiplicity in node.get_children().items():
-                    file.write(f"v{node.get_id()} -> v{child_id} [label=\"{multiplicity}\"];\n")
-            
-            file.write("}\n")
-    
+        self.write_dot(path, verbose)
+
     @classmethod
-    def from_dot_file(cls, path: str) -> 'OpenDigraph':
-        """
-        Construct an OpenDigraph from a .dot file.
-        :param path: str; Path to the .dot file
+    def from_dot_file(cls, file, compression: str = None) -> 'OpenDigraph':
+        """
+        Construct an OpenDigraph from a .dot file, read line by line: the subset written by write_dot
+        (node labels, edges labelled by their multiplicity, inputs, outputs and verbose graph attributes).
+        Nodes are named v<id> or <id>; if the graph has verbose="true", labels "label (id: n)" are read back
+        as label
+        :param file: str, path-like or file object; path or text or binary stream to read
+        :param compression: str; None, 'gzip' or 'xz'; for a path, defaults to its .gz or .xz suffix
         :return: OpenDigraph; An instance of OpenDigraph constructed from the .dot file
         """
-        inputs = []
-        outputs = []
-        nodes = []
-        
-        with open(path, 'r') as file:
-            lines = file.readlines()
-        # Parse the lines to extract node information
-            for line in lines:
-                clean_line = line.strip()
-                if clean_line.startswith("v"):
-                    parts = clean_line.split('[label="')
-                    node_id = parts[0].strip()
-                    if node_id.isdigit():
-                        node_id = int(node_id)
-                    label_parts = parts[1].split('"')
-                    if len(label_parts) > 1:
-                        label = label_parts[1]
-                    else:
-                        label = None
-                    if '"' in parts[1]:
-                        verbose = True
+        if isinstance(file, (str, os.PathLike)) and compression is None:
+            compression = DOT_COMPRESSIONS.get(os.path.splitext(os.fspath(file))[1])
+        if compression not in (None, 'gzip', 'xz'):
+            raise ValueError(f"Unknown compression {compression!r}")
+        if isinstance(file, (str, os.PathLike)):
+            with open(file, 'rb') as stream:
+                return cls.from_dot_file(stream, compression)
+        if compression is not None:
+            opener = gzip.GzipFile(fileobj=file, mode='rb') if compression == 'gzip' else lzma.LZMAFile(file, 'rb')
+            with opener as stream:
+                return cls.from_dot_file(stream)
+        if not isinstance(file, io.TextIOBase):
+            file = (line.decode() for line in file)
+
+        labels = {}  # Node id -> label, in order of appearance
+        edges = {}  # (src, tgt) -> multiplicity
+        ports = {'inputs': [], 'outputs': []}
+        opened = closed = verbose = False
+        for number, tokens, fields in dot_statements(file):
+            if closed:
+                raise ValueError(f"Unexpected statement after the end of the graph at line {number}")
+            if fields is not None and opened:  # Node or edge line as written by write_dot
+                src, tgt, label = fields
+                if tgt is None:
+                    ids, attributes = [int(src)], {'label': label}
+                elif label.isdigit() and int(label) > 0:
+                    edge = (int(src), int(tgt))
+                    edges[edge] = edges.get(edge, 0) + int(label)
+                    continue
+                else:
+                    ids, attributes = [int(src), int(tgt)], {'label': label}
+            else:
+                kinds = [kind for kind, _ in tokens or ()]
+                if not opened:  # [strict] digraph [name] {
+                    header = [value for _, value in tokens or ()][:-1]
+                    if header[:1] == ['strict']:
+                        header = header[1:]
+                    if kinds[-1:] != ['{'] or header[:1] != ['digraph'] or len(header) > 2:
+                        raise ValueError(f"Expected 'digraph ... {{' at line {number}")
+                    opened = True
+                    continue
+                if kinds == ['}']:
+                    closed = True
+                    continue
+                if kinds == ['id', '=', 'id'] or (tokens[0] == ('id', 'graph') and kinds[1:2] == ['[']):
+                    if kinds[1] == '=':
+                        attributes = {tokens[0][1]: tokens[2][1]}
                     else:
-                        verbose = False
-                    if verbose:
-                        label += f" ({node_id})"
-                    nodes.append(Node(identity=node_id, label=label, parents={}, children={}))
-
-                elif "->" in clean_line:
-                    parts = line.split('->')
-                    src = int(parts[0].strip())
-                    tgt = int(parts[1].split(';')[0].strip())
-                    nodes[src - 1].add_child_id(tgt)
-                    nodes[tgt - 1].add_parent_id(src)
-
-        # Identify input and output nodes
-        for node in nodes:
-            if node.get_id() in node.get_parents():
-                inputs.append(node.get_id())
-            if node.get_id() in node.get_children():
-                outputs.append(node.get_id())
-
-        return cls(inputs=inputs, outputs=outputs, nodes=nodes)
+                        attributes = dot_attributes(tokens, 1, number)
+                    for name in ports:
+                        if name in attributes:
+                            ports[name] = [dot_node_id(port, number) for port in attributes[name].split()]
+                    if 'verbose' in attributes:
+                        verbose = attributes['verbose'] == 'true'
+                    continue
+                if tokens[0] in (('id', 'node'), ('id', 'edge')):
+                    dot_attributes(tokens, 1, number)  # Default attributes are checked, but don't matter here
+                    continue
+                if kinds[0] != 'id' or tokens[0] == ('id', 'subgraph'):
+                    raise ValueError(f"Unsupported statement at line {number}")
+                ids = [dot_node_id(tokens[0][1], number)]
+                k = 1
+                while kinds[k:k + 2] == ['->', 'id']:
+                    ids.append(dot_node_id(tokens[k + 1][1], number))
+                    k += 2
+                attributes = dot_attributes(tokens, k, number)
+
+            if len(ids) == 1:
+                label = attributes.get('label', labels.get(ids[0], ''))
+                suffix = f" (id: {ids[0]})"
+                labels[ids[0]] = label[:-len(suffix)] if verbose and label.endswith(suffix) else label
+            else:
+                multiplicity = attributes.get('label', '1')
+                if not multiplicity.isdigit() or int(multiplicity) < 1:
+                    raise ValueError(f"Invalid multiplicity {multiplicity!r} at line {number}")
+                for edge in zip(ids, ids[1:]):
+                    edges[edge] = edges.get(edge, 0) + int(multiplicity)
+        if not closed:
+            raise ValueError("Unexpected end of file, expected '}'")
+        for src, tgt in edges:  # Nodes without a statement of their own come last
+            labels.setdefault(src, '')
+            labels.setdefault(tgt, '')
+        if not all(node_id in labels for node_id in ports['inputs'] + ports['outputs']):
+            raise ValueError("An input or an output isn't a node of the graph")
+
+        nodes = [Node(node_id, label, {}, {}) for node_id, label in labels.items()]
+        graph = cls(ports['inputs'], ports['outputs'], nodes)
+        graph.add_edges(list(edges), list(edges.values()))
+        return graph
 
     def display(self, verbose=False) -> None:
         """
@@ -746,36 +1028,34 @@ class OpenDigraph:  # for open directed graph
 
     def is_cyclic(self) -> bool:
         """
-        Checks if the directed graph contains a cycle using depth-first search (DFS).
+        Checks if the directed graph contains a cycle using depth-first search (DFS), in O(V+E).
         Returns True if the graph has a cycle, otherwise False.
         :return: bool;
         """
 
-        # Helper function for DFS traversal
-        def dfs_util(node_id, v, s):
-            v[node_id] = True
-            s[node_id] = True
-
-            # Recur for all neighbors
-            for neighbor_id in self.get_node_by_id(node_id).get_children():
-                if not v[neighbor_id]:
-                    if dfs_util(neighbor_id, v, s):
+        # Iterative DFS (deep graphs would exceed the recursion limit): each stack entry is a node
+        # with the iterator over its remaining children, and on_stack holds the nodes of the current path
+        visited = set()
+        on_stack = set()
+        for root in self.get_node_ids():
+            if root in visited:
+                continue
+            visited.add(root)
+            on_stack.add(root)
+            stack = [(root, iter(self.nodes[root].get_children()))]
+            while stack:
+                node_id, children = stack[-1]
+                for neighbor_id in children:
+                    if neighbor_id in on_stack:
                         return True
-                elif s[neighbor_id]:
-                    return True
-
-            s[node_id] = False
-            return False
-
-        # Initialize visited and recursion stack
-        visited = {node_id: False for node_id in self.get_node_ids()}
-        stack = {node_id: False for node_id in self.get_node_ids()}
-
-        # Perform DFS for each node in the graph
-        for node_id in self.get_node_ids():
-            if not visited[node_id]:
-                if dfs_util(node_id, visited, stack):
-                    return True
+                    if neighbor_id not in visited:
+                        visited.add(neighbor_id)
+                        on_stack.add(neighbor_id)
+                        stack.append((neighbor_id, iter(self.nodes[neighbor_id].get_children())))
+                        break
+                else:
+                    on_stack.discard(node_id)
+                    stack.pop()
 
         return False
 
@@ -1045,6 +1325,81 @@ class OpenDigraph:  # for open directed graph
 
         return cpt, dic, res
 
+    def subgraph(self, ids: List[int], remap: bool = False, cut_outputs: bool = True) \
+            -> Tuple['OpenDigraph', Dict[int, int]]:
+        """
+        Returns the subgraph induced by the given ids, without modifying self.
+        Every edge entering the set from outside becomes a new input (one per external source, fanned out
+        through a copy node if needed) and every node with a child outside the set gets a new output.
+        Runs in the size of the result (plus one pass over the port lists).
+        :param ids: List[int]; ids of the nodes to keep
+        :param remap: bool; if True, kept nodes are renumbered 0..k-1 in increasing id order
+        :param cut_outputs: bool; if False, edges leaving the set are dropped instead of becoming outputs
+        :return: Tuple[OpenDigraph, Dict[int, int]]; the subgraph and the mapping from the ids of self
+                 (kept nodes and external sources) to their ids in the subgraph
+        """
+        ids = list(dict.fromkeys(ids))  # Remove duplicates but keep the order
+        inside = set(ids)
+        for node_id in ids:
+            if node_id not in self.nodes:
+                raise ValueError(f"Node {node_id} doesn't exist")
+
+        # Ids of the kept nodes, new ids start right after them
+        if remap:
+            mapping = {old_id: new_id for new_id, old_id in enumerate(sorted(ids))}
+            next_id = len(ids)
+        else:
+            mapping = {node_id: node_id for node_id in ids}
+            next_id = max(ids) + 1 if ids else 0
+
+        # Copy the kept nodes with their internal edges only
+        nodes = {}
+        for old_id in ids:
+            node = self.nodes[old_id]
+            nodes[mapping[old_id]] = Node(mapping[old_id], node.get_label(),
+                                          {mapping[i]: m for i, m in node.get_parents().items() if i in inside},
+                                          {mapping[i]: m for i, m in node.get_children().items() if i in inside})
+
+        inputs = [mapping[i] for i in self.get_input_ids() if i in inside]
+        outputs = [mapping[i] for i in self.get_output_ids() if i in inside]
+
+        # Group the incoming cut edges by external source
+        sources = {}
+        for old_id in ids:
+            for parent_id, multiplicity in self.nodes[old_id].get_parents().items():
+                if parent_id not in inside:
+                    sources.setdefault(parent_id, []).append((mapping[old_id], multiplicity))
+
+        # One new input per external source
+        for source_id, targets in sources.items():
+            input_id = next_id
+            next_id += 1
+            nodes[input_id] = Node(input_id, '', {}, {})
+            inputs.append(input_id)
+            mapping[source_id] = input_id
+            if len(targets) == 1 and targets[0][1] == 1:
+                tgt = input_id
+            else:  # An input has a single child, so we fan out through a copy node
+                tgt = next_id
+                next_id += 1
+                nodes[tgt] = Node(tgt, '', {input_id: 1}, {})
+                nodes[input_id].children[tgt] = 1
+            for target_id, multiplicity in targets:
+                nodes[tgt].children[target_id] = multiplicity
+                nodes[target_id].parents[tgt] = multiplicity
+
+        # One new output per kept node with a child outside the set
+        if cut_outputs:
+            for old_id in ids:
+                if any(child_id not in inside for child_id in self.nodes[old_id].get_children()):
+                    output_id = next_id
+                    next_id += 1
+                    nodes[output_id] = Node(output_id, '', {mapping[old_id]: 1}, {})
+                    nodes[mapping[old_id]].children[output_id] = 1
+                    outputs.append(output_id)
+
+        return OpenDigraph(inputs, outputs, list(nodes.values())), mapping
+
     @staticmethod
     def min_distance(dist, q):
         min_dist = float('inf')
@@ -1174,7 +1529,41 @@ class OpenDigraph:  # for open directed graph
             co_leaves = new_co_leaves
 
         return topological_sequence
-    
+
+    def topological_order(self) -> List[int]:
+        """
+        Returns all the node ids in a topological order (Kahn's algorithm), in O(V+E).
+        Raises a ValueError if the graph is cyclic.
+        :return: List[int]; every parent comes before its children
+        """
+        indegree = {node_id: len(node.get_parents()) for node_id, node in self.nodes.items()}
+        order = [node_id for node_id, degree in indegree.items() if degree == 0]
+
+        # order is used as a queue: i is the position of the next node to process
+        i = 0
+        while i < len(order):
+            for child_id in self.nodes[order[i]].get_children():
+                indegree[child_id] -= 1
+                if indegree[child_id] == 0:
+                    order.append(child_id)
+            i += 1
+
+        if len(order) != len(self.nodes):
+            raise ValueError("Graph is cyclic")
+        return order
+
+    def levels(self) -> Dict[int, int]:
+        """
+        Returns the level of each node: the length of the longest path from a node without parent to it.
+        Raises a ValueError if the graph is cyclic.
+        :return: Dict[int, int]; maps each node id to its level
+        """
+        levels = {}
+        for node_id in self.topological_order():
+            parents = self.nodes[node_id].get_parents()
+            levels[node_id] = 1 + max(levels[i] for i in parents) if parents else 0
+        return levels
+
     def graph_depth(self) -> int:
         """
         Calculates the depth of the graph, which is the number of sets in the topological sort.
@@ -1296,24 +1685,238 @@ class OpenDigraph:  # for open directed graph
             raise ValueError("Node IDs must be valid nodes in the graph")
 
         # Choose the label for the merged node
-        if label is None:
-            self.nodes[node_id1].label = self.nodes[node_id1].label
-        else:
+        if label is not None:
             self.nodes[node_id1].label = label
 
         # Transfer edges from node2 to node1
-        for child_id in self.nodes[node_id2].children:
-            self.nodes[node_id1].add_child_id(child_id)
-            self.nodes[child_id].add_parent_id(node_id1)
+        if node_id1 != node_id2:
+            self._move_edges(node_id2, node_id1)
+            self._rename_ports({node_id2: node_id1})
 
-        for parent_id in self.nodes[node_id2].parents:
-            self.nodes[node_id1].add_parent_id(parent_id)
-            self.nodes[parent_id].add_child_id(node_id1)
+        return node_id1
 
-        # Remove node2 from the graph
-        del self.nodes[node_id2]
+    def _move_edges(self, old_id: int, new_id: int) -> None:
+        """
+        Moves every edge of old_id onto new_id (summing multiplicities) and removes old_id, in O(degree)
+        """
+        old_node = self.nodes[old_id]
+        new_node = self.nodes[new_id]
+
+        for child_id, multiplicity in old_node.get_children().items():
+            self.nodes[child_id].parents.pop(old_id)
+            if child_id == old_id:  # A loop on old_id becomes a loop on new_id
+                child_id = new_id
+            new_node.children[child_id] = new_node.children.get(child_id, 0) + multiplicity
+            child = self.nodes[child_id]
+            child.parents[new_id] = child.parents.get(new_id, 0) + multiplicity
+
+        for parent_id, multiplicity in old_node.get_parents().items():  # Loops are already moved
+            parent = self.nodes[parent_id]
+            parent.children.pop(old_id)
+            parent.children[new_id] = parent.children.get(new_id, 0) + multiplicity
+            new_node.parents[parent_id] = new_node.parents.get(parent_id, 0) + multiplicity
+
+        del self.nodes[old_id]
+
+    def _rename_ports(self, mapping: Dict[int, int]) -> None:
+        """
+        Applies an id mapping to the input and output lists, removing the duplicates it creates
+        """
+        self.inputs = list(dict.fromkeys(mapping.get(i, i) for i in self.get_input_ids()))
+        self.outputs = list(dict.fromkeys(mapping.get(i, i) for i in self.get_output_ids()))
+
+    def contract(self, partition: Union[List[Tuple[int, int]], Dict[int, object]]) -> Dict[int, int]:
+        """
+        Merges many nodes at once. The classes are resolved with a union-find, then every merged node
+        has its edges moved onto the representative of its class (multiplicities are summed), so the
+        whole contraction costs O(V+E) however many merges are requested and leaves no dangling id.
+        :param partition: either a list of pairs (id1, id2) to merge, id1's class keeping its representative,
+                          or a dict mapping node ids to a class key, nodes with the same key being merged
+                          into the first one of the dict
+        :return: Dict[int, int]; maps each removed id to the id of the node it was merged into
+        """
+        # Union-find over the ids involved only (union by size, path halving)
+        forest = {}
+        size = {}
+        keep = {}  # root -> id that survives the merge
+
+        def find(x):
+            while forest.get(x, x) != x:
+                forest[x] = forest.get(forest[x], forest[x])
+                x = forest[x]
+            return x
+
+        def union(a, b):
+            if a not in self.nodes or b not in self.nodes:
+                raise ValueError("Node IDs must be valid nodes in the graph")
+            ra, rb = find(a), find(b)
+            if ra == rb:
+                return
+            survivor = keep.get(ra, ra)
+            if size.get(ra, 1) < size.get(rb, 1):
+                ra, rb = rb, ra
+            forest[rb] = ra
+            forest.setdefault(ra, ra)
+            size[ra] = size.get(ra, 1) + size.get(rb, 1)
+            keep[ra] = survivor
+
+        if isinstance(partition, dict):
+            first = {}
+            for node_id, key in partition.items():
+                if key in first:
+                    union(first[key], node_id)
+                else:
+                    first[key] = node_id
+        else:
+            for id1, id2 in partition:
+                union(id1, id2)
+
+        mapping = {}
+        for node_id in forest:
+            root = find(node_id)
+            survivor = keep.get(root, root)
+            if survivor != node_id:
+                mapping[node_id] = survivor
+
+        # Rewrite the adjacency: each edge is moved at most once per endpoint
+        for old_id, new_id in mapping.items():
+            self._move_edges(old_id, new_id)
+        if mapping:
+            self._rename_ports(mapping)
+
+        return mapping
+
+    def structural_hashes(self) -> Dict[int, int]:
+        """
+        Returns a hash of each node that only depends on the structure of the graph and not on the ids:
+        the label of the node combined with the hashes of its parents (and their multiplicities).
+        If the graph is cyclic, only the label and the degrees of the node are used.
+        :return: Dict[int, int]; maps each node id to its structural hash
+        """
+        try:
+            order = self.topological_order()
+        except ValueError:
+            return {node_id: hash((node.get_label(), node.indegree(), node.outdegree()))
+                    for node_id, node in self.nodes.items()}
+
+        hashes = {}
+        for node_id in order:
+            node = self.nodes[node_id]
+            parents = sorted((hashes[parent_id], m) for parent_id, m in node.get_parents().items())
+            hashes[node_id] = hash((node.get_label(), tuple(parents)))
+        return hashes
+
+    def diff(self, other: 'OpenDigraph') -> Dict[str, list]:
+        """
+        Computes a patch turning self into other, without modifying them, in O(V+E).
+        Nodes are matched by id first, then the remaining ones by structural hash (they are renamed
+        instead of being removed and added again). The patch only lists what changed:
+            'remove': ids of self to remove
+            'rename': (old id, new id) pairs of structurally matched nodes
+            'add': (id, label) of the new nodes
+            'labels': (id, label) of the matched nodes whose label changed
+            'edges': (src, tgt, multiplicity) of the edges whose multiplicity changed, 0 meaning removed
+            'inputs', 'outputs': the new port lists, or None if unchanged
+        :param other: OpenDigraph; the target graph
+        :return: Dict[str, list]; the patch, to be given to apply_patch
+        """
+        # Match by id, then by structural hash among the unmatched nodes
+        match = {node_id: node_id for node_id in other.nodes if node_id in self.nodes}  # other id -> self id
+        candidates = {}
+        self_hashes = self.structural_hashes()
+        for node_id in self.nodes:
+            if node_id not in other.nodes:
+                candidates.setdefault(self_hashes[node_id], []).append(node_id)
+        rename = []
+        if candidates:
+            for node_id, h in other.structural_hashes().items():
+                if node_id not in match and candidates.get(h):
+                    old_id = candidates[h].pop()
+                    match[node_id] = old_id
+                    rename.append((old_id, node_id))
+        matched = {self_id: other_id for other_id, self_id in match.items()}  # self id -> other id
+
+        patch = {'remove': [node_id for node_id in self.nodes if node_id not in matched],
+                 'rename': rename, 'add': [], 'labels': [], 'edges': [],
+                 'inputs': None, 'outputs': None}
+
+        for node_id, node in other.nodes.items():
+            if node_id in match:
+                old = self.nodes[match[node_id]]
+                if old.get_label() != node.get_label():
+                    patch['labels'].append((node_id, node.get_label()))
+                old_children = {matched[i]: m for i, m in old.get_children().items() if i in matched}
+            else:
+                patch['add'].append((node_id, node.get_label()))
+                old_children = {}
+            for child_id, multiplicity in node.get_children().items():
+                if old_children.get(child_id) != multiplicity:
+                    patch['edges'].append((node_id, child_id, multiplicity))
+            for child_id in old_children:
+                if child_id not in node.get_children():
+                    patch['edges'].append((node_id, child_id, 0))
 
-        return node_id1
+        if [matched.get(i) for i in self.get_input_ids()] != other.get_input_ids():
+            patch['inputs'] = list(other.get_input_ids())
+        if [matched.get(i) for i in self.get_output_ids()] != other.get_output_ids():
+            patch['outputs'] = list(other.get_output_ids())
+
+        return patch
+
+    def apply_patch(self, patch: Dict[str, list]) -> None:
+        """
+        Applies a patch computed by diff to self, in the size of the patch (plus the size of the removed
+        and renamed nodes' neighbourhoods)
+        :param patch: Dict[str, list]; the patch
+        """
+        nodes = self.nodes
+
+        for node_id in patch['remove']:
+            node = nodes.pop(node_id)
+            for parent_id in node.get_parents():
+                if parent_id in nodes:  # Not removed yet
+                    nodes[parent_id].children.pop(node_id)
+            for child_id in node.get_children():
+                if child_id in nodes:
+                    nodes[child_id].parents.pop(node_id)
+
+        for old_id, new_id in patch['rename']:
+            node = nodes.pop(old_id)
+            for parent_id in node.get_parents():
+                if parent_id != old_id:
+                    parent = nodes[parent_id]
+                    parent.children[new_id] = parent.children.pop(old_id)
+            for child_id in node.get_children():
+                if child_id != old_id:
+                    child = nodes[child_id]
+                    child.parents[new_id] = child.parents.pop(old_id)
+            node.parents = {new_id if i == old_id else i: m for i, m in node.get_parents().items()}
+            node.children = {new_id if i == old_id else i: m for i, m in node.get_children().items()}
+            node.set_id(new_id)
+            nodes[new_id] = node
+        if patch['rename']:  # diff compares the ports through the renaming
+            renamed = dict(patch['rename'])
+            self.inputs = [renamed.get(i, i) for i in self.inputs]
+            self.outputs = [renamed.get(i, i) for i in self.outputs]
+
+        for node_id, label in patch['add']:
+            nodes[node_id] = Node(node_id, label, {}, {})
+
+        for node_id, label in patch['labels']:
+            nodes[node_id].set_label(label)
+
+        for src, tgt, multiplicity in patch['edges']:
+            if multiplicity:
+                nodes[src].children[tgt] = multiplicity
+                nodes[tgt].parents[src] = multiplicity
+            else:
+                nodes[src].children.pop(tgt, None)
+                nodes[tgt].parents.pop(src, None)
+
+        if patch['inputs'] is not None:
+            self.inputs = list(patch['inputs'])
+        if patch['outputs'] is not None:
+            self.outputs = list(patch['outputs'])
 
 
 class BoolCirc(OpenDigraph):
@@ -1339,9 +1942,12 @@ class BoolCirc(OpenDigraph):
         # List of allowed primitive operations
         allowed_primitives = {'0', '1', '~', '|', '&', '^'}
 
-        # Check each node validity
+        # Check each node validity (input nodes have no parent)
+        inputs = set(self.g.get_input_ids())
         for node in self.g.get_nodes():
             label = node.get_label()
+            if node.get_id() in inputs:
+                continue
             if label == '':
                 if node.indegree() != 1:
                     return False
@@ -1351,6 +1957,611 @@ class BoolCirc(OpenDigraph):
         # Check if the graph itself is well-formed and acyclic
         return self.g.is_well_formed() and not self.g.is_cyclic()
 
+    def subcircuit(self, ids: List[int], remap: bool = False) -> Tuple['BoolCirc', Dict[int, int]]:
+        """
+        Returns the circuit induced by the given ids as a standalone BoolCirc, without modifying self.
+        Signals entering the set become new inputs and signals leaving it become new outputs.
+        :param ids: List[int]; ids of the nodes to keep
+        :param remap: bool; if True, kept nodes are renumbered 0..k-1
+        :return: Tuple[BoolCirc, Dict[int, int]]; the circuit and the mapping of the ids (see OpenDigraph.subgraph)
+        """
+        g, mapping = self.g.subgraph(ids, remap)
+        return BoolCirc(g), mapping
+
+    def _cone_from(self, ids: List[int], output_id: int, remap: bool) -> Tuple['BoolCirc', Dict[int, int]]:
+        """
+        Builds the cone of output_id from the (parent-closed) list of its ids
+        """
+        g, mapping = self.g.subgraph(ids, remap, cut_outputs=False)
+        g.outputs = [mapping[output_id]]
+        return BoolCirc(g), mapping
+
+    def cone(self, k: int, remap: bool = False) -> Tuple['BoolCirc', Dict[int, int]]:
+        """
+        Returns the transitive fan-in cone of the k-th output as a standalone BoolCirc, in the size of the cone.
+        The cone keeps the inputs it depends on (in their original order) and the k-th output only.
+        :param k: int; index of the output in the output list
+        :param remap: bool; if True, nodes are renumbered 0..k-1
+        :return: Tuple[BoolCirc, Dict[int, int]]; the cone and the mapping from old ids to new ids
+        """
+        output_id = self.g.get_output_ids()[k]
+        visited = {output_id}
+        stack = [output_id]
+        while stack:
+            for parent_id in self.g.get_node_by_id(stack.pop()).get_parents():
+                if parent_id not in visited:
+                    visited.add(parent_id)
+                    stack.append(parent_id)
+        return self._cone_from(list(visited), output_id, remap)
+
+    def cones(self, remap: bool = False) -> List[Tuple['BoolCirc', Dict[int, int]]]:
+        """
+        Returns the cone of every output (see cone), sharing one backward pass between all the outputs:
+        each node gets a bitmask of the outputs it reaches, so the graph is traversed once.
+        :param remap: bool; if True, nodes of each cone are renumbered 0..k-1
+        :return: List[Tuple[BoolCirc, Dict[int, int]]]; one cone per output, in output order
+        """
+        outputs = self.g.get_output_ids()
+        order = self.g.topological_order()
+
+        # Propagate the output bitmasks from the children to the parents
+        masks = {output_id: 1 << k for k, output_id in enumerate(outputs)}
+        for node_id in reversed(order):
+            mask = masks.get(node_id, 0)
+            if mask:
+                for parent_id in self.g.get_node_by_id(node_id).get_parents():
+                    masks[parent_id] = masks.get(parent_id, 0) | mask
+
+        # Dispatch each node to the cones of the outputs it reaches
+        members = [[] for _ in outputs]
+        for node_id in order:
+            mask = masks.get(node_id, 0)
+            while mask:
+                low = mask & -mask
+                members[low.bit_length() - 1].append(node_id)
+                mask ^= low
+
+        return [self._cone_from(members[k], output_id, remap) for k, output_id in enumerate(outputs)]
+
+    def structural_hashing(self) -> Dict[int, int]:
+        """
+        Merges the duplicated gates in place (common subexpression elimination). The nodes are visited in
+        topological order and each gate is keyed on its label and its canonicalized fan-in (set of parents
+        for the idempotent & and |, parents of odd multiplicity for ^), so the parents are already merged
+        when a gate is visited and a single pass merges every duplicate. Inputs and outputs are kept.
+        :return: Dict[int, int]; maps each removed id to the id of the equivalent gate that was kept
+        """
+        nodes = self.g.get_id_node_map()
+        ports = set(self.g.get_input_ids()) | set(self.g.get_output_ids())
+        table = {}
+        mapping = {}
+        for node_id in self.g.topological_order():
+            if node_id in ports:
+                continue
+            node = nodes[node_id]
+            key = gate_key(node.get_label(), node.get_parents())
+            if key not in table:
+                table[key] = node_id
+                continue
+
+            # Move the fan-out of the duplicate onto the kept gate, and drop the duplicate
+            kept_id = table[key]
+            kept = nodes[kept_id]
+            for child_id, multiplicity in node.get_children().items():
+                child = nodes[child_id]
+                child.parents.pop(node_id)
+                child.parents[kept_id] = child.parents.get(kept_id, 0) + multiplicity
+                kept.children[child_id] = kept.children.get(child_id, 0) + multiplicity
+            for parent_id in node.get_parents():
+                nodes[parent_id].children.pop(node_id)
+            del nodes[node_id]
+            mapping[node_id] = kept_id
+        return mapping
+
+    def compile(self) -> 'CompiledCirc':
+        """
+        Levelizes the circuit once and compiles it into a straight-line program, without modifying self.
+        Copy nodes become aliases and the gates no output depends on are dropped.
+        :return: CompiledCirc; a callable mapping a tuple of input bits to the tuple of output bits
+        """
+        g = self.g
+        order = g.topological_order()
+
+        # Only keep the nodes some output depends on
+        live = set(g.get_output_ids())
+        for node_id in reversed(order):
+            if node_id in live:
+                live.update(g.get_node_by_id(node_id).get_parents())
+
+        slots = {input_id: k for k, input_id in enumerate(g.get_input_ids())}
+        ops = []
+        for node_id in order:
+            if node_id not in live or node_id in slots:
+                continue
+            node = g.get_node_by_id(node_id)
+            label = node.get_label()
+            parents = node.get_parents()
+            if label == '':  # Copy node: same value as its parent
+                if len(parents) != 1:
+                    raise ValueError(f"Copy node {node_id} doesn't have exactly one parent")
+                slots[node_id] = slots[next(iter(parents))]
+                continue
+            if label in ('0', '1'):
+                srcs = ()
+            elif label == '~':
+                if sum(parents.values()) != 1:
+                    raise ValueError(f"Not gate {node_id} doesn't have exactly one parent")
+                srcs = (slots[next(iter(parents))],)
+            elif label == '^':  # x ^ x = 0, so only the parity of the multiplicity matters
+                srcs = tuple(slots[i] for i, m in parents.items() if m % 2)
+            elif label in ('&', '|'):  # Idempotent gates
+                srcs = tuple(slots[i] for i in parents)
+            else:
+                raise ValueError(f"Unknown label {label!r} on node {node_id}")
+            slots[node_id] = len(g.get_input_ids()) + len(ops)
+            ops.append((label, slots[node_id], srcs))
+
+        return CompiledCirc(len(g.get_input_ids()), ops, [slots[i] for i in g.get_output_ids()])
+
+    def simulate(self, assignments, width: int = 64) -> List[Tuple[int, ...]]:
+        """
+        Evaluates many assignments with the bit-parallel simulator, without modifying self
+        :param assignments: iterable of input bit tuples
+        :param width: int; number of assignments evaluated by each bitwise operation
+        :return: List[Tuple[int, ...]]; the output bits of each assignment
+        """
+        return list(self.compile().evaluate_many(assignments, width))
+
+    def evaluate_array(self, array, chunk: int = 65536):
+        """
+        Evaluates a NumPy array of assignments of shape (vectors, inputs), without modifying self
+        :param array: 2-D boolean or integer array; one assignment per row
+        :param chunk: int; number of rows evaluated at once (see CompiledCirc.evaluate_array)
+        :return: array of shape (vectors, outputs)
+        """
+        return self.compile().evaluate_array(array, chunk)
+
+    def truth_table(self, chunk_bits: int = 16, fixed: Dict[int, int] = None, samples: int = None, seed=None):
+        """
+        Generator over the rows (x, y) of the truth table, without modifying self
+        (see CompiledCirc.truth_table for the parameters)
+        """
+        yield from self.compile().truth_table(chunk_bits, fixed, samples, seed)
+
+    def write_truth_table(self, file, chunk_bits: int = 16, fixed: Dict[int, int] = None, samples: int = None,
+                          seed=None) -> int:
+        """
+        Writes the truth table to a binary file, each row being x then y in little-endian order,
+        on ceil(inputs / 8) and ceil(outputs / 8) bytes
+        :param file: str, path-like or binary file object; where to write
+        :return: int; number of rows written
+        """
+        if isinstance(file, (str, os.PathLike)):
+            with open(file, 'wb') as stream:
+                return self.write_truth_table(stream, chunk_bits, fixed, samples, seed)
+
+        x_size = (len(self.g.get_input_ids()) + 7) // 8
+        y_size = (len(self.g.get_output_ids()) + 7) // 8
+        count = 0
+        buffer = []
+        for x, y in self.truth_table(chunk_bits, fixed, samples, seed):
+            buffer.append(x.to_bytes(x_size, 'little') + y.to_bytes(y_size, 'little'))
+            if len(buffer) == 1 << 16:
+                file.write(b''.join(buffer))
+                count += len(buffer)
+                buffer = []
+        file.write(b''.join(buffer))
+        return count + len(buffer)
+
+    def incremental_simulator(self, bits=None) -> 'IncrementalSimulator':
+        """
+        Returns a simulator keeping the value of every node, to re-evaluate the circuit cheaply when only
+        a few inputs change (see IncrementalSimulator)
+        :param bits: sequence of the initial input bits (all 0 if None)
+        :return: IncrementalSimulator;
+        """
+        return IncrementalSimulator(self, bits)
+
+    def evaluate_parallel(self, assignments, processes: int = None, shard: int = 65536):
+        """
+        Generator evaluating a stream of assignments on several processes, without modifying self
+        (see CompiledCirc.evaluate_parallel for the parameters)
+        """
+        yield from self.compile().evaluate_parallel(assignments, processes, shard)
+
+    def check_equivalence(self, other: 'BoolCirc', exhaustive_inputs: int = 20, random_vectors: int = 1 << 16,
+                          chunk_bits: int = 12, seed=None, processes: int = 1) -> Tuple[Tuple[int, ...], int, bool]:
+        """
+        Checks that two circuits compute the same function, input k and output k of both circuits being
+        matched. Both are compiled into a single miter program: if there are at most exhaustive_inputs
+        inputs, every assignment is enumerated, else it is run on random vectors (drawn with replacement).
+        The chunks of vectors are evaluated bit-parallel, on several processes if asked.
+        :param other: BoolCirc; the circuit to compare with self
+        :param exhaustive_inputs: int; maximum number of inputs for the exhaustive enumeration
+        :param random_vectors: int; number of random vectors simulated when there are more inputs
+        :param chunk_bits: int; log2 of the number of vectors per chunk
+        :param seed: seed of the random generator
+        :param processes: int; number of worker processes (os.cpu_count() if None)
+        :return: Tuple[Tuple[int, ...], int, bool]; a counterexample (the input bits) or None, the number
+                 of vectors checked, and whether they were enumerated exhaustively: the equivalence is
+                 proved if there is no counterexample and the check was exhaustive
+        """
+        miter = self.compile().miter(other.compile())
+        n = miter.n_inputs
+        exhaustive = n <= exhaustive_inputs
+        if exhaustive:
+            chunks = miter.packed_chunks(chunk_bits)
+        else:
+            chunks = miter.packed_chunks(chunk_bits, samples=min(random_vectors, 1 << n), seed=seed)
+
+        checked = 0
+        sent = deque()  # Chunks being evaluated, to rebuild a counterexample from its position
+
+        def record():
+            for chunk in chunks:
+                sent.append(chunk)
+                yield chunk
+
+        for (difference,) in miter.map_shards(evaluate_packed_shard, record(), processes):
+            words, width = sent.popleft()
+            if difference:
+                j = (difference & -difference).bit_length() - 1
+                return tuple((word >> j) & 1 for word in words), checked + j + 1, exhaustive
+            checked += width
+        return None, checked, exhaustive
+
+    def dot_chunks(self, verbose=False, lines: int = 8192):
+        """
+        Generates the circuit in .dot format, see OpenDigraph.dot_chunks
+        :param verbose: bool; if True, includes both label and id for nodes
+        :param lines: int; number of lines per chunk
+        :return: generator of str; the chunks
+        """
+        return self.g.dot_chunks(verbose, lines)
+
+    def write_dot(self, file, verbose=False, compression: str = None) -> None:
+        """
+        Writes the circuit in .dot format, see OpenDigraph.write_dot
+        :param file: str, path-like or file object; where to write
+        :param verbose: bool; if True, includes both label and id for nodes
+        :param compression: str; None, 'gzip' or 'xz'
+        """
+        self.g.write_dot(file, verbose, compression)
+
+    def save_binary(self, file) -> None:
+        """
+        Saves the circuit in the binary format of OpenDigraph.save_binary
+        :param file: str, path-like or binary file object; where to write
+        """
+        self.g.save_binary(file)
+
+    @classmethod
+    def from_dot_file(cls, file, compression: str = None) -> 'BoolCirc':
+        """
+        Reads a circuit written by write_dot, see OpenDigraph.from_dot_file
+        :param file: str, path-like or file object; path or text or binary stream to read
+        :param compression: str; None, 'gzip' or 'xz'
+        :return: BoolCirc; the circuit
+        """
+        return cls(OpenDigraph.from_dot_file(file, compression))
+
+    @classmethod
+    def load_binary(cls, file) -> 'BoolCirc':
+        """
+        Loads a circuit saved by save_binary, with the same ids and port order
+        :param file: str, path-like or binary file object; see OpenDigraph.load_binary
+        :return: BoolCirc; the circuit
+        """
+        return cls(OpenDigraph.load_binary(file))
+
+    def write_blif(self, file, model: str = 'circuit', input_names: List[str] = None,
+                   output_names: List[str] = None) -> None:
+        """
+        Writes the circuit in BLIF, one .names cover per gate of the compiled program (so copy nodes
+        and dead gates are left out); n-ary xor gates are written as chains of 2-input covers.
+        Internal signals are named with a prefix (n, _n, __n, ...) that no input or output name starts with
+        :param file: str, path-like or text file object; where to write
+        :param model: str; name of the model
+        :param input_names: List[str]; names of the inputs (i0, i1, ... if None)
+        :param output_names: List[str]; names of the outputs (o0, o1, ... if None)
+        """
+        if isinstance(file, (str, os.PathLike)):
+            with open(file, 'w') as stream:
+                return self.write_blif(stream, model, input_names, output_names)
+
+        program = self.compile()
+        input_names = input_names or [f"i{k}" for k in range(program.n_inputs)]
+        output_names = output_names or [f"o{k}" for k in range(len(program.outputs))]
+        if len(input_names) != program.n_inputs or len(output_names) != len(program.outputs):
+            raise ValueError("Wrong number of input or output names")
+        if len(set(input_names) | set(output_names)) != len(input_names) + len(output_names):
+            raise ValueError("Input and output names must be distinct")
+        prefix = 'n'
+        while any(name.startswith(prefix) for name in list(input_names) + list(output_names)):
+            prefix = '_' + prefix
+        names = list(input_names) + [f"{prefix}{dst}" for _, dst, _ in program.ops]
+
+        lines = [f".model {model}", ".inputs " + ' '.join(input_names), ".outputs " + ' '.join(output_names)]
+        for label, dst, srcs in program.ops:
+            inputs = [names[src] for src in srcs]
+            if label == '^' and len(inputs) > 2:  # Chain of 2-input xors
+                previous = inputs[0]
+                for j, name in enumerate(inputs[1:-1]):
+                    lines += [f".names {previous} {name} {names[dst]}_{j}", "10 1", "01 1"]
+                    previous = f"{names[dst]}_{j}"
+                inputs = [previous, inputs[-1]]
+            lines.append(' '.join([".names"] + inputs + [names[dst]]))
+            if label == '1' or (label == '&' and not inputs):
+                lines.append("1")
+            elif label == '~':
+                lines.append("0 1")
+            elif label == '&':
+                lines.append('1' * len(inputs) + " 1")
+            elif label == '|':
+                lines += ['-' * k + '1' + '-' * (len(inputs) - k - 1) + " 1" for k in range(len(inputs))]
+            elif label == '^':
+                lines += ["1 1"] if len(inputs) == 1 else ["10 1", "01 1"] if inputs else []
+            if len(lines) >= 1 << 16:
+                file.write('\n'.join(lines) + '\n')
+                lines = []
+        for slot, name in zip(program.outputs, output_names):
+            lines += [f".names {names[slot]} {name}", "1 1"]
+        lines.append(".end")
+        file.write('\n'.join(lines) + '\n')
+
+    @staticmethod
+    def read_blif(file) -> Tuple['BoolCirc', List[str], List[str]]:
+        """
+        Reads a combinational BLIF model (.inputs, .outputs and .names covers, in any order), line by line.
+        Each cover becomes an or of ands of literals, negated if the cover gives the off-set.
+        :param file: str, path-like or text file object; where to read
+        :return: Tuple[BoolCirc, List[str], List[str]]; the circuit and the names of its inputs and outputs
+        """
+        if isinstance(file, (str, os.PathLike)):
+            with open(file, 'r') as stream:
+                return BoolCirc.read_blif(stream)
+
+        inputs, outputs = [], []
+        covers = {}  # name -> (fan-in names, rows, line number)
+        rows = None
+        pending = ''
+        for number, line in enumerate(file, 1):
+            line = pending + line.split('#', 1)[0].strip()
+            if line.endswith('\\'):  # Continued on the next line
+                pending = line[:-1] + ' '
+                continue
+            pending = ''
+            words = line.split()
+            if not words:
+                continue
+            if words[0] == '.names':
+                if len(words) < 2:
+                    raise ValueError(f"Line {number}: .names without output")
+                rows = []
+                covers[words[-1]] = (words[1:-1], rows, number)
+            elif words[0] in ('.inputs', '.outputs'):
+                (inputs if words[0] == '.inputs' else outputs).extend(words[1:])
+                rows = None
+            elif words[0] == '.model':
+                rows = None
+            elif words[0] == '.end':
+                break
+            elif words[0].startswith('.'):
+                raise ValueError(f"Line {number}: unsupported BLIF construct {words[0]}")
+            elif rows is None:
+                raise ValueError(f"Line {number}: cover row outside of .names")
+            else:
+                rows.append(words)
+
+        builder = CircuitBuilder()
+        signals = {name: builder.add_input() for name in inputs}
+
+        def build_cover(name):
+            fanins, cover, number = covers[name]
+            terms = []
+            values = set()
+            for row in cover:
+                cube, value = (row[0], row[1]) if len(row) == 2 else ('', row[0])
+                if len(cube) != len(fanins) or value not in '01' or len(value) != 1:
+                    raise ValueError(f"Cover of {name} (line {number}): invalid row {' '.join(row)}")
+                values.add(value)
+                literals = []
+                for char, fanin in zip(cube, fanins):
+                    if char == '1':
+                        literals.append(signals[fanin])
+                    elif char == '0':
+                        literals.append(builder.add_gate('~', [signals[fanin]]))
+                    elif char != '-':
+                        raise ValueError(f"Cover of {name} (line {number}): invalid row {' '.join(row)}")
+                terms.append(literals[0] if len(literals) == 1 else builder.add_gate('&', literals))
+            if len(values) > 1:
+                raise ValueError(f"Cover of {name} (line {number}) mixes on-set and off-set rows")
+            result = terms[0] if len(terms) == 1 else builder.add_gate('|', terms)
+            return builder.add_gate('~', [result]) if values == {'0'} else result
+
+        def fanins(name):
+            if name not in covers:
+                raise ValueError(f"Signal {name} is not defined")
+            return covers[name][0]
+
+        def build(name):
+            signals[name] = build_cover(name)
+
+        # BLIF doesn't order the covers: each one is built once its fan-in is
+        build_in_order(outputs, fanins, signals, build)
+        for output in outputs:
+            builder.add_output(signals[output])
+        return builder.build(), inputs, outputs
+
+    def write_aiger(self, file, binary: bool = True, input_names: List[str] = None,
+                    output_names: List[str] = None) -> None:
+        """
+        Writes the circuit in AIGER, as an and-inverter graph: or and xor gates are rewritten with and
+        gates and negated literals, and identical and gates are shared. The binary format ('aig') stores
+        the and gates as delta-encoded varints; the ASCII one ('aag') as text.
+        :param file: str, path-like or binary file object; where to write
+        :param binary: bool; True for the binary format, False for the ASCII one
+        :param input_names: List[str]; names written in the symbol table (none if None)
+        :param output_names: List[str]; names written in the symbol table (none if None)
+        """
+        if isinstance(file, (str, os.PathLike)):
+            with open(file, 'wb') as stream:
+                return self.write_aiger(stream, binary, input_names, output_names)
+
+        program = self.compile()
+        n = program.n_inputs
+        literals = [2 * (k + 1) for k in range(n)]  # Literal of each slot
+        ands = []
+        table = {}
+
+        def and_gate(a, b):
+            if a < b:
+                a, b = b, a
+            if b == 0 or a ^ 1 == b:
+                return 0
+            if b == 1 or a == b:
+                return a
+            if (a, b) not in table:
+                table[(a, b)] = 2 * (n + len(ands) + 1)
+                ands.append((table[(a, b)], a, b))
+            return table[(a, b)]
+
+        def or_gate(a, b):
+            return and_gate(a ^ 1, b ^ 1) ^ 1
+
+        def xor_gate(a, b):
+            return or_gate(and_gate(a, b ^ 1), and_gate(a ^ 1, b))
+
+        for label, _, srcs in program.ops:
+            values = [literals[src] for src in srcs]
+            if label in ('0', '1'):
+                literal = int(label)
+            elif label == '~':
+                literal = values[0] ^ 1
+            else:
+                function, literal = {'&': (and_gate, 1), '|': (or_gate, 0), '^': (xor_gate, 0)}[label]
+                for value in values:
+                    literal = function(literal, value)
+            literals.append(literal)
+
+        header = f"{'aig' if binary else 'aag'} {n + len(ands)} {n} 0 {len(program.outputs)} {len(ands)}\n"
+        lines = [] if binary else [f"{2 * (k + 1)}" for k in range(n)]
+        lines += [f"{literals[slot]}" for slot in program.outputs]
+        file.write((header + ''.join(line + '\n' for line in lines)).encode())
+        if binary:
+            buffer = bytearray()
+            for lhs, rhs0, rhs1 in ands:
+                for delta in (lhs - rhs0, rhs0 - rhs1):
+                    while delta >= 0x80:
+                        buffer.append(delta & 0x7f | 0x80)
+                        delta >>= 7
+                    buffer.append(delta)
+                if len(buffer) >= 1 << 16:
+                    file.write(bytes(buffer))
+                    buffer.clear()
+            file.write(bytes(buffer))
+        else:
+            file.write(''.join(f"{lhs} {rhs0} {rhs1}\n" for lhs, rhs0, rhs1 in ands).encode())
+
+        symbols = [f"i{k} {name}" for k, name in enumerate(input_names or [])]
+        symbols += [f"o{k} {name}" for k, name in enumerate(output_names or [])]
+        file.write(''.join(line + '\n' for line in symbols).encode())
+
+    @staticmethod
+    def read_aiger(file) -> Tuple['BoolCirc', List[str], List[str]]:
+        """
+        Reads a combinational AIGER file, binary ('aig') or ASCII ('aag'). The and gates of the binary
+        format are decoded straight from the delta-encoded bytes, block by block.
+        :param file: str, path-like or binary file object; where to read
+        :return: Tuple[BoolCirc, List[str], List[str]]; the circuit and the names of its inputs and outputs
+                 (from the symbol table, else i0, i1, ... and o0, o1, ...)
+        """
+        if isinstance(file, (str, os.PathLike)):
+            with open(file, 'rb') as stream:
+                return BoolCirc.read_aiger(stream)
+
+        header = file.readline().split()
+        if len(header) < 6 or header[0] not in (b'aig', b'aag'):
+            raise ValueError("Not an AIGER file")
+        binary = header[0] == b'aig'
+        _, inputs, latches, outputs, ands = (int(word) for word in header[1:6])
+        if latches:
+            raise ValueError("Latches are not supported")
+
+        builder = CircuitBuilder()
+        signals = {}  # variable -> signal
+        if binary:
+            input_variables = list(range(1, inputs + 1))
+        else:
+            input_variables = [int(file.readline()) >> 1 for _ in range(inputs)]
+        for variable in input_variables:
+            signals[variable] = builder.add_input()
+        output_literals = [int(file.readline()) for _ in range(outputs)]
+
+        def signal(literal):
+            variable = literal >> 1
+            if variable == 0:
+                return builder.add_gate('1' if literal & 1 else '0', [])
+            return builder.add_gate('~', [signals[variable]]) if literal & 1 else signals[variable]
+
+        rest = b''
+        if binary:  # Gates are in order: lhs = 2 (inputs + k + 1), rhs0 = lhs - delta0, rhs1 = rhs0 - delta1
+            buffer = b''
+            position = 0
+            for k in range(ands):
+                lhs = 2 * (inputs + k + 1)
+                deltas = []
+                for _ in range(2):
+                    value = shift = 0
+                    while True:
+                        if position == len(buffer):
+                            buffer = file.read(1 << 16)
+                            position = 0
+                            if not buffer:
+                                raise ValueError("Truncated AIGER file")
+                        byte = buffer[position]
+                        position += 1
+                        value |= (byte & 0x7f) << shift
+                        if byte < 0x80:
+                            break
+                        shift += 7
+                    deltas.append(value)
+                rhs0 = lhs - deltas[0]
+                signals[lhs >> 1] = builder.add_gate('&', [signal(rhs0), signal(rhs0 - deltas[1])])
+            rest = buffer[position:]
+        else:  # Gates may come in any order: they are built once their fan-in is, with an explicit stack
+            gates = {}
+            for _ in range(ands):
+                lhs, rhs0, rhs1 = (int(word) for word in file.readline().split())
+                gates[lhs >> 1] = (rhs0, rhs1)
+
+            def fanins(variable):
+                if variable not in gates:
+                    raise ValueError(f"Variable {variable} is not defined")
+                return [rhs >> 1 for rhs in gates[variable] if rhs >> 1]
+
+            def build(variable):
+                signals[variable] = builder.add_gate('&', [signal(rhs) for rhs in gates[variable]])
+
+            build_in_order(list(gates), fanins, signals, build)
+
+        for literal in output_literals:
+            if literal >> 1 and literal >> 1 not in signals:
+                raise ValueError(f"Variable {literal >> 1} is not defined")
+            builder.add_output(signal(literal))
+
+        input_names = [f"i{k}" for k in range(inputs)]
+        output_names = [f"o{k}" for k in range(outputs)]
+        for line in (rest + file.read()).decode(errors='replace').splitlines():
+            if line == 'c':  # Start of the comments
+                break
+            kind, _, name = line.partition(' ')
+            if kind[:1] in ('i', 'o') and kind[1:].isdigit():
+                names = input_names if kind[0] == 'i' else output_names
+                if int(kind[1:]) < len(names):
+                    names[int(kind[1:])] = name
+        return builder.build(), input_names, output_names
+
     '''
     def parse_parentheses(self, s: str) -> None:
         """
@@ -1393,398 +2604,1482 @@ class BoolCirc(OpenDigraph):
     def parse_parentheses(self, s: str) -> Tuple['BoolCirc', List[str]]:
         """
         Session 9.3)
-        Parses a propositional formula, merges nodes, and constructs a boolean circuit tree.
-        :param s: str; the propositional formula in infix notation
-        :return: Tuple[BoolCirc, List[str]]; the boolean circuit and list of variable names
-        """
-        current_node_id = self.max_id() + 1  # Start with a new node ID
-        parent_node_id = self.max_id() + 2
-        s2 = ''
-        variables = []
+        Parses a propositional formula and replaces the graph of self with its circuit, in O(len(s)).
+        Variables are names made of letters, digits and '_' (not starting with a digit), each one being a
+        single input shared by all its occurrences; 0 and 1 are constants. The operators are, by
+        decreasing priority: ~ (not), & (and), ^ (xor), | (or); parentheses group subformulas.
+        Identical subformulas are only built once.
+        :param s: str; the propositional formula in infix notation, e.g. "(x0 & ~x1) | (x1 ^ 1)"
+        :return: Tuple[BoolCirc, List[str]]; the boolean circuit (self) and the variable names, in the
+                 order of their inputs
+        """
+        builder = CircuitBuilder()
+        variables = {}
+        builder.add_output(parse_formula(builder, s, variables))
+        self.g = builder.build().g
+        return self, list(variables)
 
-        for char in s:
-            if char == '(':
-                # Add s2 to the label of the current node
-                self.nodes[current_node_id].label += s2
+    @staticmethod
+    def parse_parentheses_multiple(*args: str) -> 'BoolCirc':
+        """
+        Session 9.4)
+        Parses multiple propositional formulas and constructs a single boolean circuit that implements the sequence.
+        :param args: str; sequence of propositional formulas
+        :return: BoolCirc; the boolean circuit implementing the sequence
+        """
+        return BoolCirc.from_formulas(args)[0]
 
-                # Create a parent of current_node and make it current_node
-                parent_node_id = self.max_id() + 1
-                self.nodes[parent_node_id] = Node(identity=parent_node_id, label='', parents={}, children={})
-                self.nodes[parent_node_id].add_child_id(current_node_id)
-                self.nodes[current_node_id].add_parent_id(parent_node_id)
-                current_node_id = parent_node_id
-                s2 = ''
+    @staticmethod
+    def from_formulas(formulas) -> Tuple['BoolCirc', List[str]]:
+        """
+        Builds a single circuit with one output per formula (see parse_parentheses for the syntax).
+        Each variable name is one input shared by all the formulas, and identical subformulas are built
+        once across all of them, so the memory used grows with the number of distinct subformulas.
+        :param formulas: iterable of str (e.g. a generator or an open file with one formula per line)
+        :return: Tuple[BoolCirc, List[str]]; the circuit, output k computing formula k, and the variable
+                 names in the order of their inputs
+        """
+        builder = CircuitBuilder()
+        variables = {}
+        for k, formula in enumerate(formulas):
+            try:
+                builder.add_output(parse_formula(builder, formula, variables))
+            except ValueError as error:
+                raise ValueError(f"Formula {k}: {error}") from None
+        return builder.build(), list(variables)
+
+    def random_bool_circ(self, unary_operators: str, binary_operators: str, inputs: int, outputs: int,
+                         seed=None) -> None:
+        """
+        Replaces the graph of self with a random circuit having as many gates as self.g has nodes
+        (see random_circuit); only that number is taken from self.g, whose structure is discarded
+        :param unary_operators: str; list of unary operators
+        :param binary_operators: str; list of binary operators
+        :param inputs: int; number of inputs
+        :param outputs: int; number of outputs
+        :param seed: seed of the random generator
+        """
+        gates = max(len(self.g.get_id_node_map()), outputs, 1)
+        self.g = BoolCirc.random_circuit(gates, inputs, outputs, seed=seed, unary_operators=unary_operators,
+                                         binary_operators=binary_operators).g
 
-            elif char == ')':
-                # Add s2 to the label of current_node
-                self.nodes[current_node_id].label += s2
+    @staticmethod
+    def random_circuit(gates: int, inputs: int, outputs: int, depth: int = None, seed=None,
+                       unary_operators: str = '~', binary_operators: str = '&|^') -> 'BoolCirc':
+        """
+        Builds a random well-formed circuit directly, in O(gates). Each input feeds a copy node that
+        carries its fan-out; each gate draws its parents among the earlier signals, the second one of a
+        binary gate among the ones that have no child yet, and the outputs read the gates left without
+        a child first. The gates still without a child at the end become an extra input of a later
+        and/or/xor gate, so every gate is in the cone of an output (unless no such gate follows it,
+        with unary operators only).
+        If depth is given, the gates are spread over depth levels (the last one holding at most
+        max(outputs, 1) gates) and each gate has a parent in the previous level, so the longest path
+        from an input crosses exactly depth gates.
+        Ids are contiguous: inputs, their copy nodes, gates, then outputs.
+        :param gates: int; number of gates
+        :param inputs: int; number of inputs (at least 1)
+        :param outputs: int; number of outputs (at most gates), each reading a different gate
+        :param depth: int; number of levels of gates (at most gates), None for no level structure
+        :param seed: seed of the random generator
+        :param unary_operators: str; labels of the unary gates
+        :param binary_operators: str; labels of the binary gates
+        :return: BoolCirc; the circuit
+        """
+        if inputs < 1 or gates < 1:
+            raise ValueError("A random circuit needs at least one input and one gate")
+        if not 0 <= outputs <= gates:
+            raise ValueError("There must be between 0 and gates outputs")
+        if depth is not None and not 1 <= depth <= gates:
+            raise ValueError("depth must be between 1 and gates")
+        operators = [(label, 1) for label in unary_operators] + [(label, 2) for label in binary_operators]
+        if not operators:
+            raise ValueError("No operator given")
+        rng = Random(seed)
+        random = rng.random
+
+        nodes = [Node(i, '', {}, {inputs + i: 1}) for i in range(inputs)]
+        nodes += [Node(inputs + i, '', {i: 1}, {}) for i in range(inputs)]
+
+        # Levels as ranges of signal ids: the copy nodes, then the gates of each level
+        first_gate = 2 * inputs
+        if depth is None:
+            bounds = None
+        else:
+            sizes = [gates // depth + (level < gates % depth) for level in range(depth)]
+            extra = sizes[-1] - max(outputs, 1)
+            if depth > 1 and extra > 0:  # The last level can only feed the outputs: its extra gates go earlier
+                sizes[-1] -= extra
+                for level in range(depth - 1):
+                    sizes[level] += extra // (depth - 1) + (level < extra % (depth - 1))
+            bounds = [inputs, first_gate]
+            for size in sizes:
+                bounds.append(bounds[-1] + size)
+
+        # Earlier signals without a child, removed lazily; the gates of a level only join it at the next level
+        pool, current = list(range(inputs, first_gate)), []
+
+        def dangling():
+            while pool:
+                k = int(random() * len(pool))
+                signal = pool[k]
+                pool[k] = pool[-1]
+                pool.pop()
+                if not nodes[signal].children:
+                    return signal
+            return None
+
+        level = 0
+        nary = []  # Ids of the gates that can take an extra input
+        for node_id in range(first_gate, first_gate + gates):
+            if bounds is None:
+                low, previous, high = inputs, inputs, node_id
+            else:
+                if node_id >= bounds[level + 2]:
+                    level += 1
+                    pool += current
+                    current = []
+                low, previous, high = inputs, bounds[level], bounds[level + 1]
+            label, arity = operators[int(random() * len(operators))]
+            parent = previous + int(random() * (high - previous))
+            node = Node(node_id, label, {parent: 1}, {})
+            if arity == 2:
+                other = dangling()
+                if other is None:
+                    other = low + int(random() * (high - low))
+                if other == parent:
+                    other = low + (other - low + 1) % (high - low)
+                if other != parent:  # Only one signal available: the gate keeps a single input
+                    node.parents[other] = 1
+                nary.append(node_id)
+            for parent_id in node.parents:
+                nodes[parent_id].children[node_id] = 1
+            nodes.append(node)
+            (pool if bounds is None else current).append(node_id)
+
+        # The first output reads a gate of the last level, so that the depth is reached. The gates without
+        # a child come next: first the ones that can't be an extra input of an and/or/xor gate of a later
+        # level, then the others, which become such an extra input if no output is left; then random gates
+        last = first_gate + gates - 1
+        stuck, attachable = [], []
+        for node_id in range(first_gate, last):
+            if not nodes[node_id].children:
+                k = bisect_left(nary, node_id + 1 if bounds is None else bounds[bisect_right(bounds, node_id)])
+                (attachable if k < len(nary) else stuck).append((node_id, k))
+        rng.shuffle(stuck)
+        rng.shuffle(attachable)
+        childless = stuck + attachable
+        others = [node_id for node_id in range(first_gate, last) if nodes[node_id].children]
+        read = max(outputs - 1, 0)  # Childless gates read by an output
+        chosen = ([last] + [node_id for node_id, _ in childless[:read]]
+                  + rng.sample(others, max(read - len(childless), 0)) if outputs else [])
+        for node_id, k in childless[read:]:
+            if k < len(nary):
+                gate_id = nary[k + int(random() * (len(nary) - k))]
+                nodes[gate_id].parents[node_id] = 1
+                nodes[node_id].children[gate_id] = 1
+        output_ids = []
+        for k, gate_id in enumerate(chosen):
+            output_id = first_gate + gates + k
+            nodes.append(Node(output_id, '', {gate_id: 1}, {}))
+            nodes[gate_id].children[output_id] = 1
+            output_ids.append(output_id)
+        return BoolCirc(OpenDigraph(list(range(inputs)), output_ids, nodes), test=True)  # Well-formed by construction
 
-                # Change current_node so that it becomes its child
-                current_node_id = list(self.nodes[current_node_id].parents)[0]
-                s2 = ''
+    def half_adder(self, n: int) -> None:
+        """
+        Replaces the graph of self with a Half-Adder for registers of size 2^n (ripple-carry).
+        Inputs are a_0..a_{2^n-1} then b_0..b_{2^n-1}, outputs are the sum bits then the carry, LSB first.
+        :param n: int; log2 of the size of the registers
+        """
+        self.g = BoolCirc.adder_circuit(1 << n, carry_in=False).g
 
-            elif char.isalpha():
-                # Add char to variables if it's not already there
-                if char not in variables:
-                    variables.append(char)
+    def adder(self, n: int) -> None:
+        """
+        Replaces the graph of self with an Adder for registers of size 2^n (ripple-carry).
+        Inputs are a_0..a_{2^n-1}, b_0..b_{2^n-1} then the carry c, outputs are the sum bits then the
+        carry, LSB first.
+        :param n: int; log2 of the size of the registers
+        """
+        self.g = BoolCirc.adder_circuit(1 << n).g
 
-                # Add char to the end of s2
-                s2 += char
+    def carry_lookahead_adder_4(self) -> None:
+        """
+        Replaces the graph of self with a Carry-Lookahead Adder for registers of size 4.
+        """
+        self.g = BoolCirc.adder_circuit(4, 'lookahead').g
 
-            elif char == ' ':
-                # Merge nodes if s2 represents a variable
-                if s2.isalpha():
-                    self.merge_nodes(parent_node_id, current_node_id)
-                    current_node_id = list(self.nodes[parent_node_id].parents)[0]
-                    s2 = ''
-                else:
-                    s2 += char
+    def carry_lookahead_adder(self, n: int) -> None:
+        """
+        Replaces the graph of self with a Carry-Lookahead Adder for registers of size 4n, made of n blocks
+        of 4 bits whose carries are computed by lookahead inside each block.
+        :param n: int; number of blocks of 4 bits
+        """
+        if n <= 0:
+            raise ValueError("n must be positive")
+        self.g = BoolCirc.adder_circuit(4 * n, 'lookahead').g
 
-        # Add the remaining characters in s2 to the label of the current node
-        self.nodes[current_node_id].label += s2
+    @staticmethod
+    def adder_circuit(width: int, architecture: str = 'ripple', carry_in: bool = True) -> 'BoolCirc':
+        """
+        Builds an adder of two registers of size width, in O(gates). The architectures trade size
+        for depth: 'ripple' (O(n) gates, depth O(n)), 'lookahead' (blocks of 4 bits, depth O(n/4)),
+        'brent-kung' (O(n) gates, depth O(log n)) and 'kogge-stone' (O(n log n) gates, depth O(log n)).
+        Inputs are a_0..a_{width-1}, b_0..b_{width-1} then the carry c if carry_in, and outputs are the
+        sum bits then the carry, all LSB first.
+        :param width: int; size of the registers
+        :param architecture: str; one of 'ripple', 'lookahead', 'brent-kung', 'kogge-stone'
+        :param carry_in: bool; whether the adder has a carry input
+        :return: BoolCirc; the adder
+        """
+        if width <= 0:
+            raise ValueError("width must be positive")
+        builder = CircuitBuilder()
+        a = [builder.add_input() for _ in range(width)]
+        b = [builder.add_input() for _ in range(width)]
+        carry = builder.add_input() if carry_in else None
+        sums, carry_out = build_adder(builder, a, b, carry, architecture)
+        for signal in sums + [carry_out]:
+            builder.add_output(signal)
+        return builder.build()
 
-        return self, variables
+    def int_to_register_circuit(self, number: int, register_size: int) -> None:
+        """
+        Replaces the graph of self with a Boolean circuit representing the given integer instantiated
+        in a register: one constant node per bit, each read by an output, LSB first
+        :param number: int; the integer value to be represented.
+        :param register_size: int; the size of the register (number of bits)
+        """
+        self.g = BoolCirc.constant_registers([number], register_size)[0].g
 
     @staticmethod
-    def parse_parentheses_multiple(*args: str) -> 'BoolCirc':
+    def constant_registers(values, width: int, first_id: int = 0) -> Tuple['BoolCirc', List[range]]:
+        """
+        Builds a circuit instantiating many integers as constant registers at once. The bits are extracted
+        with vectorized shifts when NumPy is installed, and the ids form a single contiguous block:
+        the N = len(values) * width constants are first_id..first_id+N-1 and their outputs come next.
+        :param values: array or sequence of non-negative integers, each fitting in width bits
+        :param width: int; number of bits of each register
+        :param first_id: int; first id of the block
+        :return: Tuple[BoolCirc, List[range]]; the circuit and, for each register, the range of the ids
+                 of its outputs, LSB first (outputs are also listed in this order in the circuit)
+        """
+        if width <= 0:
+            raise ValueError("width must be positive")
+        if np is not None:
+            values = np.asarray(values)
+            if values.ndim != 1 or (values.size and values.dtype.kind not in 'iuO'):
+                raise ValueError("values must be a 1-D array of integers")
+            if width >= 63:  # The shifts would overflow the fixed-size integers
+                values = values.astype(object)
+            elif not values.size:  # An empty sequence gives a float array
+                values = values.astype(np.int64)
+            shifts = np.arange(width + 1, dtype=values.dtype)  # uint64 can't be shifted by int64
+            if values.size and ((values < 0).any() or (values >> shifts[width]).any()):
+                raise ValueError(f"values must be non-negative and fit in {width} bits")
+            bits = ((values[:, None] >> shifts[:width]) & 1).ravel().tolist()
+        else:
+            values = list(values)
+            if any(value < 0 or value >> width for value in values):
+                raise ValueError(f"values must be non-negative and fit in {width} bits")
+            bits = [(value >> i) & 1 for value in values for i in range(width)]
+
+        count = len(bits)
+        nodes = [Node(first_id + k, '1' if bit else '0', {}, {first_id + count + k: 1}) for k, bit in enumerate(bits)]
+        nodes += [Node(first_id + count + k, '', {first_id + k: 1}, {}) for k in range(count)]
+        outputs = list(range(first_id + count, first_id + 2 * count))
+        ports = [range(first_id + count + r, first_id + count + r + width) for r in range(0, count, width)]
+        return BoolCirc(OpenDigraph([], outputs, nodes)), ports
+
+    def evaluate(self) -> int:
+        """
+        Applies the evaluation rules (constant propagation, neutral elements, erasure of useless nodes)
+        until there are no more transformations to apply. A worklist only revisits the nodes touched by
+        each rewrite, so the whole evaluation runs in time near-linear in the number of rewrites.
+        The rules are the rewrite_* functions listed in EVALUATION_RULES; use RewriteEngine to apply others.
+        :return: int; number of rewrites applied
+        """
+        engine = RewriteEngine(self.g)
+        for rule, labels, indegree, outdegree in EVALUATION_RULES:
+            engine.register(rule, labels, indegree, outdegree)
+        return engine.run()
+
+    def optimize(self) -> Tuple['BoolCirc', Dict[str, int]]:
+        """
+        Returns an optimized copy of the circuit, without modifying self: constants are folded, double
+        negations, single-input gates and copy chains are removed, and so is every gate outside the cone
+        of all outputs. Duplicated gates are then merged (see structural_hashing).
+        :return: Tuple[BoolCirc, Dict[str, int]]; the new circuit and statistics ('gates_before',
+                 'gates_after', 'gates_removed', 'depth_before', 'depth_after', 'rewrites', 'merged')
+        """
+        g = self.g.copy()
+        engine = RewriteEngine(g)
+        for rule, labels, indegree, outdegree in OPTIMIZATION_RULES:
+            engine.register(rule, labels, indegree, outdegree)
+        rewrites = engine.run()
+        merged = BoolCirc(g, test=True).structural_hashing()
+
+        def gates(graph):
+            return sum(1 for node in graph.get_nodes() if node.get_label() != '')
+
+        def depth(graph):
+            return max(graph.levels().values(), default=0)
+
+        stats = {'gates_before': gates(self.g), 'gates_after': gates(g),
+                 'depth_before': depth(self.g), 'depth_after': depth(g), 'rewrites': rewrites,
+                 'merged': len(merged)}
+        stats['gates_removed'] = stats['gates_before'] - stats['gates_after']
+        return BoolCirc(g), stats
+
+    def hamming_encoder(self) -> None:
+        """
+        Replaces the graph of self with the Hamming(7,4) encoder. Inputs are the data bits d0..d3 and
+        outputs are the bits c0..c6 of the codeword, bit k being at position k+1 of the code:
+        p1 p2 d0 p3 d1 d2 d3, where p1, p2 and p3 are the parity bits.
+        """
+        builder = CircuitBuilder()
+        variables = {f"d{i}": builder.add_input() for i in range(4)}
+        for formula in ["d0 ^ d1 ^ d3", "d0 ^ d2 ^ d3", "d0", "d1 ^ d2 ^ d3", "d1", "d2", "d3"]:
+            builder.add_output(parse_formula(builder, formula, variables))
+        self.g = builder.build().g
+
+    def hamming_decoder(self) -> None:
+        """
+        Replaces the graph of self with the Hamming(7,4) decoder. Inputs are the bits c0..c6 of a codeword
+        (see hamming_encoder) and outputs are the data bits d0..d3, a single flipped bit being corrected:
+        the syndrome s1 s2 s3 is the position of the flipped bit.
+        """
+        builder = CircuitBuilder()
+        variables = {f"c{k}": builder.add_input() for k in range(7)}
+        for name, formula in [("s1", "c0 ^ c2 ^ c4 ^ c6"), ("s2", "c1 ^ c2 ^ c5 ^ c6"), ("s3", "c3 ^ c4 ^ c5 ^ c6")]:
+            variables[name] = parse_formula(builder, formula, variables)
+        for formula in ["c2 ^ (s1 & s2 & ~s3)", "c4 ^ (s1 & ~s2 & s3)", "c5 ^ (~s1 & s2 & s3)", "c6 ^ (s1 & s2 & s3)"]:
+            builder.add_output(parse_formula(builder, formula, variables))
+        self.g = builder.build().g
+
+
+class MappedGraph:
+    """
+    Read-only view of a graph saved by OpenDigraph.save_binary, memory-mapped: opening it only reads the
+    header and the label table, and the pages of the arrays are read by the system when they are used.
+    Nodes are addressed by their index k (their position in the saved graph); the arrays are memoryviews.
+    """
+
+    # Constructor
+    def __init__(self, file) -> None:
+        """
+        Constructs a new MappedGraph object
+        :param file: str, path-like or binary file object; the file object must be a real file (mmap needs
+                     its fileno()), which is mapped from its start and left open by close
+        """
+        self.owned = isinstance(file, (str, os.PathLike))
+        self.file = open(file, 'rb') if self.owned else file
+        self.map = None
+        self.views = []
+        try:
+            fileno = self.file.fileno()
+        except (AttributeError, io.UnsupportedOperation):
+            raise ValueError("A binary graph can only be mapped from a path or a real file, "
+                             "not from an in-memory stream") from None
+        try:
+            self.map = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+            self.read_sections()
+        except (ValueError, struct.error) as error:
+            self.close()
+            raise ValueError(f"Invalid binary graph file: {error}") from None
+
+    def read_sections(self) -> None:
+        """
+        Reads the header and the label table, and maps the arrays (without reading them)
+        """
+        magic, version, _, nodes, edges, labels, inputs, outputs = struct.unpack_from(BINARY_HEADER, self.map)
+        if magic != BINARY_MAGIC:
+            raise ValueError("wrong magic number")
+        if version != BINARY_VERSION:
+            raise ValueError(f"unsupported version {version}")
+
+        position = struct.calcsize(BINARY_HEADER)
+        self.labels = []
+        for _ in range(labels):
+            size, = struct.unpack_from('<I', self.map, position)
+            self.labels.append(self.map[position + 4:position + 4 + size].decode())
+            position += 4 + size
+        position += -position % 8
+
+        view = memoryview(self.map)
+        self.views.append(view)
+
+        def section(code, count):
+            nonlocal position
+            size = count * array(code).itemsize
+            if position + size > len(self.map):
+                raise ValueError("truncated file")
+            data = view[position:position + size].cast(code)
+            self.views.append(data)
+            position += size + -size % 8
+            return data
+
+        self.ids = section('q', nodes)
+        self.sorted_index = section('I', nodes)
+        self.label_index = section('I', nodes)
+        self.child_offsets, self.child_index, self.child_multiplicities = \
+            section('Q', nodes + 1), section('I', edges), section('I', edges)
+        self.parent_offsets, self.parent_index, self.parent_multiplicities = \
+            section('Q', nodes + 1), section('I', edges), section('I', edges)
+        self.inputs = section('I', inputs)
+        self.outputs = section('I', outputs)
+        if sys.byteorder != 'little':  # The arrays are copied once, swapped
+            for name in ('ids', 'sorted_index', 'label_index', 'child_offsets', 'child_index', 'child_multiplicities',
+                         'parent_offsets', 'parent_index', 'parent_multiplicities', 'inputs', 'outputs'):
+                swapped = array(getattr(self, name).format, getattr(self, name))
+                swapped.byteswap()
+                setattr(self, name, swapped)
+
+    def __enter__(self) -> 'MappedGraph':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Releases the mapping; the arrays can't be used afterwards
+        """
+        for view in reversed(self.views):  # The slices before the view they were taken from
+            view.release()
+        self.views = []
+        if self.map is not None:
+            self.map.close()
+        if self.owned:
+            self.file.close()
+
+    # Getters
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def index_of(self, node_id: int) -> int:
         """
-        Session 9.4)
-        Parses multiple propositional formulas and constructs a single boolean circuit that implements the sequence.
-        :param args: str; sequence of propositional formulas
-        :return: BoolCirc; the boolean circuit implementing the sequence
+        Returns the index of a node from its id, by binary search over the indices sorted by id
+        """
+        position = bisect_left(self.sorted_index, node_id, key=self.ids.__getitem__)
+        if position == len(self.ids) or self.ids[self.sorted_index[position]] != node_id:
+            raise ValueError(f"Node {node_id} doesn't exist")
+        return self.sorted_index[position]
+
+    def get_label(self, k: int) -> str:
+        """
+        Returns the label of the node of index k
+        """
+        return self.labels[self.label_index[k]]
+
+    def get_children(self, k: int) -> List[Tuple[int, int]]:
+        """
+        Returns the (index, multiplicity) pairs of the children of the node of index k
         """
-        circuits = []  # List to store individual circuits for each formula
-        merged_circuit = BoolCirc()  # Initialize the merged circuit
+        start, end = self.child_offsets[k], self.child_offsets[k + 1]
+        return list(zip(self.child_index[start:end], self.child_multiplicities[start:end]))
 
-        for formula in args:
-            # Parse each formula and obtain the boolean circuit
-            circuit, _ = merged_circuit.parse_parentheses(formula)
-            circuits.append(circuit)
+    def get_parents(self, k: int) -> List[Tuple[int, int]]:
+        """
+        Returns the (index, multiplicity) pairs of the parents of the node of index k
+        """
+        start, end = self.parent_offsets[k], self.parent_offsets[k + 1]
+        return list(zip(self.parent_index[start:end], self.parent_multiplicities[start:end]))
+
+    def to_graph(self, cls=None) -> 'OpenDigraph':
+        """
+        Reads the whole graph into an OpenDigraph (or a subclass), in O(V+E)
+        :param cls: class of the result (OpenDigraph if None)
+        :return: OpenDigraph; the graph with its original ids and port order
+        """
+        ids = self.ids.tolist()
+        labels = [self.labels[i] for i in self.label_index.tolist()]
+        nodes = [Node(node_id, label, {}, {}) for node_id, label in zip(ids, labels)]
+        for offsets, index, multiplicities, direction in (
+                (self.child_offsets, self.child_index, self.child_multiplicities, 'children'),
+                (self.parent_offsets, self.parent_index, self.parent_multiplicities, 'parents')):
+            targets = list(map(ids.__getitem__, index.tolist()))
+            offsets, multiplicities = offsets.tolist(), multiplicities.tolist()
+            for node, start, end in zip(nodes, offsets, offsets[1:]):
+                setattr(node, direction, dict(zip(targets[start:end], multiplicities[start:end])))
+        return (cls or OpenDigraph)([ids[i] for i in self.inputs], [ids[i] for i in self.outputs], nodes)
 
-        # Combine circuits side by side
-        for circuit in circuits:
-            # Connect the outputs of the current circuit to the inputs of the merged circuit
-            output_id = list(circuit.nodes.keys())[-1]  # Get the output node ID of the current circuit
-            input_id = merged_circuit.max_id() + 1  # Get the next available ID in the merged circuit
 
-            # Add the output node of the current circuit as a child of the input node of the merged circuit
-            merged_circuit.nodes[input_id] = Node(identity=input_id, label='', parents={}, children={})
-            merged_circuit.nodes[input_id].add_child_id(output_id)
-            merged_circuit.nodes[output_id].add_parent_id(input_id)
+class CompiledCirc:
+    """
+    Straight-line program computing a BoolCirc, built by BoolCirc.compile.
+    Slots 0..n_inputs-1 hold the inputs, then each operation (label, dst, srcs) writes one slot.
+    The program is turned into a generated Python function; only the opcode array is pickled.
+    """
 
-        return merged_circuit
+    # Constructor
+    def __init__(self, n_inputs: int, ops: List[Tuple[str, int, Tuple[int, ...]]], outputs: List[int]) -> None:
+        """
+        Constructs a new CompiledCirc object
+        :param n_inputs: int; number of inputs
+        :param ops: list of (label, destination slot, source slots); the operations in evaluation order
+        :param outputs: List[int]; the slot of each output
+        """
+        self.n_inputs = n_inputs
+        self.ops = ops
+        self.outputs = outputs
+        self.source = self.generate_source()
+        namespace = {}
+        exec(compile(self.source, '<CompiledCirc>', 'exec'), namespace)
+        self.function = namespace['circuit']
+
+    def generate_source(self) -> str:
+        """
+        Returns the Python source of the straight-line function circuit(x, mask).
+        Every value is a bit vector shaped like mask: negation is a xor with mask, constant 1 is mask
+        and constant 0 is mask ^ mask, so the same function works on single bits, packed words and
+        NumPy boolean arrays.
+        Slots are mapped to registers that are reused as soon as their value is dead, so only the
+        live values are kept in memory at any time.
+        """
+        # Last operation reading each slot (outputs are read at the end)
+        last_use = {}
+        for t, (_, _, srcs) in enumerate(self.ops):
+            for src in srcs:
+                last_use[src] = t
+        for slot in self.outputs:
+            last_use[slot] = len(self.ops)
+
+        registers = {}
+        free = []
+        count = 0
+
+        def allocate(slot):
+            nonlocal count
+            if free:
+                registers[slot] = free.pop()
+            else:
+                registers[slot] = count
+                count += 1
+            return registers[slot]
+
+        lines = ["def circuit(x, mask=1):"]
+        if self.n_inputs:
+            lines.append("    " + "".join(f"r{allocate(k)}, " for k in range(self.n_inputs)) + "= x")
+            free.extend(registers[k] for k in range(self.n_inputs) if k not in last_use)
+
+        neutral = {'&': 'mask', '|': 'mask ^ mask', '^': 'mask ^ mask'}
+        for t, (label, dst, srcs) in enumerate(self.ops):
+            if label == '0':
+                expr = 'mask ^ mask'
+            elif label == '1':
+                expr = 'mask'
+            elif label == '~':
+                expr = f"r{registers[srcs[0]]} ^ mask"
+            elif srcs:
+                expr = f" {label} ".join(f"r{registers[src]}" for src in srcs)
+            else:
+                expr = neutral[label]
+            # The right-hand side is computed first, so dst can take the register of a dying source
+            free.extend(registers[src] for src in dict.fromkeys(srcs) if last_use[src] == t)
+            lines.append(f"    r{allocate(dst)} = {expr}")
+            if dst not in last_use:
+                free.append(registers[dst])
+
+        lines.append("    return (" + "".join(f"r{registers[slot]}, " for slot in self.outputs) + ")")
+        return "\n".join(lines) + "\n"
+
+    def __call__(self, bits, mask=1) -> Tuple[int, ...]:
+        """
+        Evaluates the circuit
+        :param bits: sequence of the input values
+        :param mask: int; value of the constant 1 (1 for single bits)
+        :return: Tuple[int, ...]; the output values
+        """
+        if len(bits) != self.n_inputs:
+            raise ValueError(f"Expected {self.n_inputs} inputs, got {len(bits)}")
+        return self.function(bits, mask)
+
+    def evaluate_packed(self, words: List[int], width: int) -> Tuple[int, ...]:
+        """
+        Evaluates width assignments at once: bit j of words[i] is the value of input i in assignment j,
+        and each gate is computed by one bitwise operation on whole words
+        :param words: List[int]; one word per input
+        :param width: int; number of assignments packed in each word (any positive int)
+        :return: Tuple[int, ...]; one word per output, packed the same way
+        """
+        return self(words, (1 << width) - 1)
+
+    def evaluate_many(self, assignments, width: int = 64):
+        """
+        Generator evaluating a stream of assignments, width assignments per bitwise operation
+        :param assignments: iterable of input bit tuples
+        :param width: int; number of assignments packed in each word
+        :return: iterator over the output bit tuples, in the order of the assignments
+        """
+        chunk = []
+        for assignment in assignments:
+            chunk.append(assignment)
+            if len(chunk) == width:
+                yield from unpack_bits(self.evaluate_packed(pack_bits(chunk, self.n_inputs), width), width)
+                chunk = []
+        if chunk:
+            yield from unpack_bits(self.evaluate_packed(pack_bits(chunk, self.n_inputs), len(chunk)), len(chunk))
+
+    def evaluate_parallel(self, assignments, processes: int = None, shard: int = 65536):
+        """
+        Generator evaluating a stream of assignments on several processes. The circuit is pickled once
+        per worker (as its opcode array); then each shard of assignments is packed and evaluated by a
+        worker with shard-wide bitwise operations, and the results are yielded in the order of the stream.
+        Only a few shards per worker are in flight at once, so the stream can be arbitrarily long.
+        :param assignments: iterable of input bit tuples
+        :param processes: int; number of workers (os.cpu_count() if None)
+        :param shard: int; number of assignments sent to a worker at once
+        :return: iterator over the output bit tuples, in the order of the assignments
+        """
+        assignments = iter(assignments)
+        shards = iter(lambda: list(islice(assignments, shard)), [])
+        for outputs in self.map_shards(evaluate_shard, shards, processes):
+            yield from outputs
+
+    def evaluate_packed_parallel(self, batches, processes: int = None):
+        """
+        Generator evaluating already packed batches on several processes (see evaluate_parallel).
+        This skips packing and unpacking in the main process, which otherwise bounds the throughput.
+        :param batches: iterable of (words, width), as given to evaluate_packed
+        :param processes: int; number of workers (os.cpu_count() if None)
+        :return: iterator over the output words of each batch, in the order of the batches
+        """
+        yield from self.map_shards(evaluate_packed_shard, batches, processes)
+
+    def map_shards(self, function, shards, processes: int = None):
+        """
+        Generator applying function(circuit, shard) to each shard in a pool of worker processes that
+        receive the circuit once, when they start, and yielding the results in the order of the shards
+        :param function: module-level function (so that it can be pickled)
+        :param shards: iterable of the shards
+        :param processes: int; number of workers (os.cpu_count() if None, no pool if 1)
+        :return: iterator over the results
+        """
+        if processes is None:
+            processes = os.cpu_count() or 1
+        if processes < 1:
+            raise ValueError("processes must be positive")
+        if processes == 1:
+            for part in shards:
+                yield function(self, part)
+            return
+
+        with multiprocessing.Pool(processes, initializer=init_worker, initargs=(self,)) as pool:
+            pending = deque()
+            for part in shards:
+                pending.append(pool.apply_async(call_worker, (function, part)))
+                if len(pending) >= 2 * processes:  # Bounds the memory used by the stream
+                    yield pending.popleft().get()
+            while pending:
+                yield pending.popleft().get()
+
+    def evaluate_array(self, array, chunk: int = 65536):
+        """
+        Evaluates a NumPy array of assignments, each gate being one vectorized operation over a chunk
+        of rows. Dead values are released as soon as possible, so the peak memory is about
+        chunk x (live gates) and not (vectors) x (total gates).
+        :param array: 2-D array (boolean or integer) of shape (vectors, inputs)
+        :param chunk: int; number of rows evaluated at once
+        :return: array of shape (vectors, outputs), with the dtype of the given array
+        """
+        if np is None:
+            raise ImportError("evaluate_array requires NumPy")
+        array = np.asarray(array)
+        if array.ndim != 2 or array.shape[1] != self.n_inputs:
+            raise ValueError(f"Expected an array of shape (vectors, {self.n_inputs})")
+
+        result = np.empty((array.shape[0], len(self.outputs)), dtype=array.dtype)
+        for start in range(0, array.shape[0], chunk):
+            stop = min(start + chunk, array.shape[0])
+            columns = np.ascontiguousarray(array[start:stop].T != 0)  # One contiguous row per input
+            outputs = self.function(list(columns), np.ones(stop - start, dtype=bool))
+            for k, values in enumerate(outputs):
+                result[start:stop, k] = values
+        return result
+
+    def truth_table(self, chunk_bits: int = 16, fixed: Dict[int, int] = None, samples: int = None, seed=None):
+        """
+        Generator enumerating the truth table chunk by chunk: each chunk of 2^chunk_bits assignments is
+        built directly as packed words and evaluated by the bit-parallel engine, so the memory used
+        doesn't depend on the number of inputs.
+        Rows are packed integers (x, y): bit i of x is input i and bit k of y is output k.
+        :param chunk_bits: int; log2 of the number of assignments evaluated at once
+        :param fixed: Dict[int, int]; input index -> fixed bit, to only enumerate a subcube
+        :param samples: int; if given, evaluates this many random assignments instead of the whole space
+        :param seed: seed of the random generator used for the samples
+        :return: iterator over the (x, y) rows; for a full enumeration, x goes from 0 to 2^n - 1
+        """
+        for words, width in self.packed_chunks(chunk_bits, fixed, samples, seed):
+            outputs = self.evaluate_packed(words, width)
+            yield from zip(words_to_rows(words, width), words_to_rows(outputs, width))
+
+    def packed_chunks(self, chunk_bits: int = 16, fixed: Dict[int, int] = None, samples: int = None, seed=None):
+        """
+        Generator over the chunks of assignments enumerated by truth_table, as packed (words, width)
+        batches ready for evaluate_packed (see truth_table for the parameters)
+        """
+        n = self.n_inputs
+        fixed = fixed or {}
+        for i in fixed:
+            if not 0 <= i < n:
+                raise ValueError(f"Input {i} doesn't exist")
+        free = [i for i in range(n) if i not in fixed]
+
+        if samples is not None:
+            rng = Random(seed)
+            done = 0
+            while done < samples:
+                width = min(1 << chunk_bits, samples - done)
+                mask = (1 << width) - 1
+                words = [mask if fixed.get(i) else 0 for i in range(n)]
+                for i in free:
+                    words[i] = rng.getrandbits(width)
+                yield words, width
+                done += width
+            return
+
+        # The k lowest free inputs follow a counter inside each chunk, the other ones are constant
+        k = min(chunk_bits, len(free))
+        low, high = free[:k], free[k:]
+        width = 1 << k
+        mask = (1 << width) - 1
+        patterns = [(((1 << (1 << j)) - 1) << (1 << j)) * (mask // ((1 << (2 << j)) - 1)) for j in range(k)]
+
+        for c in range(1 << len(high)):
+            words = [mask if fixed.get(i) else 0 for i in range(n)]
+            for j, i in enumerate(low):
+                words[i] = patterns[j]
+            for j, i in enumerate(high):
+                if (c >> j) & 1:
+                    words[i] = mask
+            yield words, width
+
+    def miter(self, other: 'CompiledCirc') -> 'CompiledCirc':
+        """
+        Returns the program computing both circuits on the same inputs, with a single output that is 1
+        whenever some output of self differs from the matching output of other
+        :param other: CompiledCirc; a program with the same numbers of inputs and outputs
+        :return: CompiledCirc; the miter of the two programs
+        """
+        if other.n_inputs != self.n_inputs or len(other.outputs) != len(self.outputs):
+            raise ValueError("The circuits don't have the same numbers of inputs and outputs")
+        n = self.n_inputs
+        shift = len(self.ops)
+
+        def moved(slot):
+            return slot if slot < n else slot + shift
+
+        ops = list(self.ops)
+        ops.extend((label, moved(dst), tuple(moved(src) for src in srcs)) for label, dst, srcs in other.ops)
+        differences = []
+        for slot1, slot2 in zip(self.outputs, other.outputs):
+            differences.append(n + len(ops))
+            ops.append(('^', n + len(ops), (slot1, moved(slot2))))
+        ops.append(('|', n + len(ops), tuple(differences)))
+        return CompiledCirc(n, ops, [n + len(ops) - 1])
+
+    def __getstate__(self):
+        """
+        Only the opcode array is pickled, the function is regenerated when unpickling
+        """
+        return self.n_inputs, self.ops, self.outputs
+
+    def __setstate__(self, state) -> None:
+        """
+        Rebuilds the object from its pickled opcode array
+        """
+        self.__init__(*state)
+
+
+class IncrementalSimulator:
+    """
+    Event-driven simulator of a BoolCirc: the value of every node is kept, and when inputs change only
+    the nodes of their fan-out cone are re-evaluated, in topological order, stopping wherever the value
+    doesn't change. An update costs about the number of nodes whose value flips (times their fan-out).
+    The structure of the circuit is read once, so the circuit must not be modified afterwards.
+    """
 
-    def random_bool_circ(self, unary_operators: str, binary_operators: str, inputs: int, outputs: int) -> None:
+    # Constructor
+    def __init__(self, circ: BoolCirc, bits=None) -> None:
+        """
+        Constructs a new IncrementalSimulator object and evaluates the whole circuit once
+        :param circ: BoolCirc; the simulated circuit
+        :param bits: sequence of the initial input bits (all 0 if None)
+        """
+        g = circ.g
+        order = g.topological_order()
+        self.position = {node_id: k for k, node_id in enumerate(order)}
+        self.inputs = list(g.get_input_ids())
+        self.outputs = list(g.get_output_ids())
+        self.labels = {}
+        self.parents = {}
+        self.children = {}
+        for node_id in order:
+            node = g.get_node_by_id(node_id)
+            label = node.get_label()
+            if label == '^':  # x ^ x = 0, so only the parity of the multiplicity matters
+                self.parents[node_id] = [i for i, m in node.get_parents().items() if m % 2]
+            else:
+                self.parents[node_id] = list(node.get_parents())
+            self.labels[node_id] = label
+            self.children[node_id] = list(node.get_children())
+
+        if bits is None:
+            bits = [0] * len(self.inputs)
+        if len(bits) != len(self.inputs):
+            raise ValueError(f"Expected {len(self.inputs)} inputs, got {len(bits)}")
+        self.values = {input_id: bit & 1 for input_id, bit in zip(self.inputs, bits)}
+        for node_id in order:
+            if node_id not in self.values:
+                self.values[node_id] = self.compute(node_id)
+
+    def compute(self, node_id: int) -> int:
+        """
+        Computes the value of a node from the current values of its parents
+        :param node_id: int;
+        :return: int; 0 or 1
+        """
+        label = self.labels[node_id]
+        values = [self.values[i] for i in self.parents[node_id]]
+        if label == '&':
+            return int(all(values))
+        if label == '|':
+            return int(any(values))
+        if label == '^':
+            return sum(values) & 1
+        if label == '~':
+            return 1 - values[0]
+        if label in ('0', '1'):
+            return int(label)
+        if label == '':
+            return values[0]
+        raise ValueError(f"Unknown label {label!r} on node {node_id}")
+
+    def set_inputs(self, changes: Dict[int, int]) -> int:
+        """
+        Changes some inputs and propagates the changes through their fan-out cone
+        :param changes: Dict[int, int]; input index -> new bit
+        :return: int; number of nodes whose value flipped
+        """
+        heap = []
+        queued = set()
+        flipped = 0
+
+        def schedule(node_id):
+            for child_id in self.children[node_id]:
+                if child_id not in queued:
+                    queued.add(child_id)
+                    heappush(heap, (self.position[child_id], child_id))
+
+        for index, bit in changes.items():
+            input_id = self.inputs[index]
+            if self.values[input_id] != bit & 1:
+                self.values[input_id] = bit & 1
+                flipped += 1
+                schedule(input_id)
+
+        # Level order: a node is evaluated after all its changed parents
+        while heap:
+            _, node_id = heappop(heap)
+            queued.discard(node_id)
+            value = self.compute(node_id)
+            if value != self.values[node_id]:
+                self.values[node_id] = value
+                flipped += 1
+                schedule(node_id)
+
+        return flipped
+
+    def get_value(self, node_id: int) -> int:
+        """
+        Returns the current value of a node
+        """
+        return self.values[node_id]
+
+    def get_outputs(self) -> Tuple[int, ...]:
+        """
+        Returns the current values of the outputs
+        """
+        return tuple(self.values[output_id] for output_id in self.outputs)
+
+
+class CircuitBuilder:
+    """
+    Builds a BoolCirc gate by gate with structural hashing: a gate whose label and canonicalized fan-in
+    already exist is never created again, the existing one is returned instead. Ids are given in sequence,
+    so the circuit is built in O(1) per edge. Signals are plain node ids and can be shared freely: the
+    fan-out of a gate needs no copy node, and each input gets a single copy node carrying its fan-out.
+    """
+
+    # Constructor
+    def __init__(self) -> None:
         """
-        Creates a random bool circ with specified number of inputs and outputs
-        :param unary_operators: str; list of unary operators
-        :param binary_operators: str; list of binary operators
-        :param inputs: int; number of inputs
-        :param outputs: int; number of outputs
+        Constructs a new empty CircuitBuilder object
         """
-        # Label the nodes based on their in-degree and out-degree
-        for node in self.g.get_node_ids():
-            indegree = self.g.get_node_by_id(node).indegree()
-            outdegree = self.g.get_node_by_id(node).outdegree()
+        self.nodes = {}
+        self.inputs = []
+        self.outputs = []
+        self.table = {}  # gate key -> node id
 
-            if indegree == outdegree == 1:
-                # Assign unary operator
-                self.g.get_node_by_id(node).set_label(choice(unary_operators))
+    # Methods
+    def new_node(self, label: str, parents: List[int]) -> int:
+        """
+        Adds a node with an edge from each of the given parents and returns its id
+        """
+        node_id = len(self.nodes)
+        self.nodes[node_id] = Node(node_id, label, {}, {})
+        for parent_id in parents:
+            self.nodes[parent_id].children[node_id] = 1
+            self.nodes[node_id].parents[parent_id] = 1
+        return node_id
 
-            elif indegree == 1 and outdegree > 1:
-                # Do nothing, node represents a copy
-                pass
+    def add_input(self) -> int:
+        """
+        Adds an input to the circuit
+        :return: int; id of the signal carrying the input (its copy node)
+        """
+        input_id = self.new_node('', [])
+        self.inputs.append(input_id)
+        return self.new_node('', [input_id])
 
-            elif indegree > 1 and outdegree == 1:
-                # Assign binary operator
-                self.g.get_node_by_id(node).set_label(choice(binary_operators))
+    def add_gate(self, label: str, srcs: List[int]) -> int:
+        """
+        Returns the id of the gate computing label over srcs, creating it only if it doesn't exist yet
+        :param label: str; one of '0', '1', '~', '&', '|', '^'
+        :param srcs: List[int]; the signals the gate is computed from
+        :return: int; id of the gate
+        """
+        if label not in ('0', '1', '~', '&', '|', '^'):
+            raise ValueError(f"Unknown gate label {label!r}")
+        if label == '~' and len(srcs) != 1:
+            raise ValueError("A not gate takes exactly one signal")
+        if label in ('0', '1') and srcs:
+            raise ValueError("A constant takes no signal")
+        parents = {}
+        for src in srcs:
+            parents[src] = parents.get(src, 0) + 1
+        key = gate_key(label, parents)
+        if key not in self.table:
+            self.table[key] = self.new_node(label, [parent_id for parent_id, _ in key[1]])
+        return self.table[key]
 
-            elif indegree > 1 and outdegree > 1:
-                # Split the node into two nodes
-                new_node1 = len(self.g.get_nodes())
-                new_node2 = len(self.g.get_nodes()) + 1
-                self.g.get_node_by_id(new_node1).set_label(choice(binary_operators))
-                self.g.get_node_by_id(new_node2).set_label("")
+    def add_output(self, src: int) -> int:
+        """
+        Adds an output reading the signal src
+        :param src: int; id of the signal
+        :return: int; id of the output node
+        """
+        output_id = self.new_node('', [src])
+        self.outputs.append(output_id)
+        return output_id
 
-                for parent in self.g.get_node_ids():
-                    self.g.get_node_by_id(parent).remove_parent_id(node)
-                    self.g.get_node_by_id(parent).add_parent_id(new_node1)
+    def build(self) -> BoolCirc:
+        """
+        Returns the circuit built so far; the builder shouldn't be used afterwards
+        :return: BoolCirc; the circuit
+        """
+        return BoolCirc(OpenDigraph(self.inputs, self.outputs, list(self.nodes.values())))
 
-                for child in self.g.get_node_ids():
-                    self.g.get_node_by_id(child).remove_child_id(node)
-                    self.g.get_node_by_id(new_node2).add_child_id(child)
 
-                self.g.get_node_by_id(new_node2).set_label("")
+class HammingCodec:
+    """
+    Streaming Hamming(7,4) encoder and decoder. Both circuits are built and compiled once, then nibbles
+    and codewords (bit k of a codeword being the output c_k of BoolCirc.hamming_encoder) are evaluated
+    bit-parallel, chunk by chunk: one bitwise operation per gate for a whole chunk.
+    Streams are either iterables of ints, giving iterators, or NumPy arrays, giving arrays.
+    """
 
-        # Add inputs and outputs if necessary
-        node_ids = self.get_node_ids()
-        inputs_list = [i for i in node_ids if len(self.g.get_node_by_id(i).get_parents()) == 0 and
-                       len(self.g.get_node_by_id(i).get_children()) == 1]
-        if len(inputs_list) < inputs:
-            raise ValueError("This graph has too few possibilities for inputs nodes")
-        inputs_list = sample(node_ids, inputs)
+    # Constructor
+    def __init__(self, chunk: int = 4096) -> None:
+        """
+        Constructs a new HammingCodec object
+        :param chunk: int; number of values evaluated at once
+        """
+        encoder = BoolCirc(OpenDigraph.empty())
+        encoder.hamming_encoder()
+        decoder = BoolCirc(OpenDigraph.empty())
+        decoder.hamming_decoder()
+        self.encoder = encoder.compile()
+        self.decoder = decoder.compile()
+        self.chunk = chunk
 
-        outputs_list = [i for i in node_ids if len(self.g.get_node_by_id(i).get_children()) == 0 and
-                        len(self.g.get_node_by_id(i).get_parents()) == 1 and i not in inputs_list]
-        if len(outputs_list) < outputs:
-            raise ValueError("This graph has too few possibilities for outputs nodes")
-        outputs_list = sample(node_ids, outputs)
+    # Methods
+    def encode(self, nibbles):
+        """
+        Encodes nibbles (ints in 0..15) into codewords (ints in 0..127)
+        :param nibbles: iterable of ints or NumPy array
+        :return: iterator over the codewords, or array of the same shape and dtype
+        """
+        return self.stream(self.encoder, nibbles)
 
-        for node_id in inputs_list:
-            self.g.add_input_id(node_id)
-        for node_id in outputs_list:
-            self.g.add_output_id(node_id)
+    def decode(self, codewords):
+        """
+        Decodes codewords into nibbles, correcting up to one flipped bit per codeword
+        :param codewords: iterable of ints or NumPy array
+        :return: iterator over the nibbles, or array of the same shape and dtype
+        """
+        return self.stream(self.decoder, codewords)
 
-    def half_adder(self, n: int) -> None:
+    def stream(self, compiled: 'CompiledCirc', values):
         """
-        Constructs a Boolean Half-Adder circuit for a register of size 2^n.
-        :param n: int; size of the register
+        Evaluates a compiled circuit on a stream of packed values (bit i of a value being input i)
         """
-        if n == 0:
-            # Base case: Constructing the Half-Adder for a register of size 1
-            self.parse_parentheses("~a ~b Addern 0 :=")
-        else:
-            # Recursive construction of the Half-Adder
-            self.half_adder(n - 1)
-            self.parse_parentheses(f"Addern 0 := {n - 1} p")
+        n = compiled.n_inputs
+        if np is not None and isinstance(values, np.ndarray):
+            flat = values.ravel()
+            shifts = np.arange(n + 1, dtype=flat.dtype)  # uint64 can't be shifted by int64
+            if flat.size and (flat.min() < 0 or flat.max() >> shifts[n]):
+                raise ValueError(f"Values must be in 0..{(1 << n) - 1}")
+            bits = (flat[:, None] >> shifts[:n]) & 1
+            outputs = compiled.evaluate_array(bits.astype(bool), self.chunk)
+            weights = np.left_shift(1, np.arange(outputs.shape[1]))
+            return (outputs @ weights).astype(values.dtype).reshape(values.shape)
+        return self.stream_iterable(compiled, values)
 
-    def adder(self, n: int) -> None:
+    def stream_iterable(self, compiled: 'CompiledCirc', values):
         """
-        Constructs a Boolean Adder circuit for a register of size 2^n.
-        :param n: int; size of the register
+        Generator evaluating a compiled circuit on an iterable of packed values
         """
-        if n == 0:
-            # Base case: Constructing the Adder for a register of size 1
-            self.parse_parentheses("~a ~b Addern 0 :=")
+        n = compiled.n_inputs
+        values = iter(values)
+        for chunk in iter(lambda: list(islice(values, self.chunk)), []):
+            if min(chunk) < 0 or max(chunk) >> n:
+                raise ValueError(f"Values must be in 0..{(1 << n) - 1}")
+            words = words_to_rows(chunk, n)  # Transposing the values gives the packed input words
+            yield from words_to_rows(compiled.evaluate_packed(words, len(chunk)), len(chunk))
+
+    @staticmethod
+    def inject_errors(codewords, rate: float = 1.0, seed=None):
+        """
+        Flips one random bit in each codeword with the given probability
+        :param codewords: iterable of ints or NumPy array
+        :param rate: float; probability that a codeword gets an error
+        :param seed: seed of the random generator
+        :return: iterator over the codewords, or a new array
+        """
+        if np is not None and isinstance(codewords, np.ndarray):
+            rng = np.random.default_rng(seed)
+            flips = np.left_shift(1, rng.integers(0, 7, codewords.shape)) * (rng.random(codewords.shape) < rate)
+            return codewords ^ flips.astype(codewords.dtype)
+        rng = Random(seed)
+        return (codeword ^ (1 << rng.randrange(7)) if rng.random() < rate else codeword for codeword in codewords)
+
+    def benchmark(self, count: int = 1 << 18, seed=None) -> Dict[str, float]:
+        """
+        Encodes count random nibbles, flips one bit of every codeword and decodes them, checking that
+        every nibble is recovered; NumPy arrays are used when NumPy is installed
+        :param count: int; number of codewords
+        :param seed: seed of the random generator
+        :return: Dict[str, float]; 'codewords', 'encoded_per_second' and 'decoded_per_second'
+        """
+        if np is not None:
+            nibbles = np.random.default_rng(seed).integers(0, 16, count, dtype=np.uint8)
         else:
-            # Recursive construction of the Adder
-            self.adder(n - 1)
-            self.parse_parentheses(f"Addern {n} 0 := {n - 1} p")
+            rng = Random(seed)
+            nibbles = [rng.randrange(16) for _ in range(count)]
+        start = time.perf_counter()
+        codewords = self.encode(nibbles)
+        if np is None:
+            codewords = list(codewords)
+        encoded = time.perf_counter()
+        received = self.inject_errors(codewords, 1.0, seed)
+        if np is None:
+            received = list(received)
+        decode_start = time.perf_counter()
+        decoded = self.decode(received)
+        if np is None:
+            decoded = list(decoded)
+        end = time.perf_counter()
+        if list(decoded) != list(nibbles):
+            raise ValueError("The decoder didn't recover the encoded nibbles")
+        return {'codewords': count, 'encoded_per_second': count / max(encoded - start, 1e-9),
+                'decoded_per_second': count / max(end - decode_start, 1e-9)}
+
+
+class CircuitTemplate:
+    """
+    Frozen form of a BoolCirc, independent of its ids: the nodes are numbered 0..V-1 and stored as
+    tuples of labels and edges, which are cheap to keep, to pickle and to instantiate again.
+    """
 
-    def carry_lookahead_adder_4(self) -> None:
+    # Constructor
+    def __init__(self, circ: BoolCirc) -> None:
         """
-        Constructs a Carry-Lookahead Adder for registers of size 4.
-        :return: BoolCirc; the constructed Carry-Lookahead Adder circuit
+        Constructs a new CircuitTemplate object from a circuit (which isn't modified)
+        :param circ: BoolCirc; the circuit to freeze
         """
-        self.adder(4)
+        g = circ.g
+        index = {node_id: k for k, node_id in enumerate(sorted(g.get_node_ids()))}
+        self.labels = tuple(g.get_node_by_id(node_id).get_label() for node_id in index)
+        self.edges = tuple((index[node_id], index[child_id], multiplicity) for node_id in index
+                           for child_id, multiplicity in g.get_node_by_id(node_id).get_children().items())
+        self.inputs = tuple(index[i] for i in g.get_input_ids())
+        self.outputs = tuple(index[i] for i in g.get_output_ids())
 
-    def carry_lookahead_adder(self, n: int) -> None:
+    def instantiate(self, first_id: int = 0) -> BoolCirc:
         """
-        Constructs a Carry-Lookahead Adder for registers of size 4n.
-        :param n: int; size of the register 4n
+        Returns a new independent circuit, in O(V+E)
+        :param first_id: int; the ids of the nodes are first_id..first_id+V-1
+        :return: BoolCirc; the circuit
         """
-        if not n % 4 and n > 0:
-            raise ValueError("n must be a multiple of 4")
+        nodes = [Node(first_id + k, label, {}, {}) for k, label in enumerate(self.labels)]
+        for src, tgt, multiplicity in self.edges:
+            nodes[src].children[first_id + tgt] = multiplicity
+            nodes[tgt].parents[first_id + src] = multiplicity
+        g = OpenDigraph([first_id + i for i in self.inputs], [first_id + i for i in self.outputs], nodes)
+        return BoolCirc(g, test=True)  # Already checked when the template was built
 
-        if n == 0:
-            # Base case: Constructing the Adder for a register of size 1
-            self.carry_lookahead_adder_4()
-        else:
-            # Recursive construction of the Adder
-            self.carry_lookahead_adder(n-1)
-            self.carry_lookahead_adder_4()
 
-    def int_to_register_circuit(self, number: int, register_size: int) -> None:
+class TemplateCache:
+    """
+    Cache of the circuits built by generators, keyed by (generator, parameters). Each circuit is built
+    once and kept as a CircuitTemplate, in memory (least recently used templates are evicted beyond
+    maxsize) and, if a directory is given, on disk so that later runs skip the construction entirely.
+    On disk, the key also holds TEMPLATE_FORMAT and a digest of the code of the generator, so that the
+    templates of an older format or of a modified generator are built again (the functions the
+    generator calls are not covered: bump TEMPLATE_FORMAT when they change).
+    The persisted templates are unpickled, which can run arbitrary code: the directory must only be
+    writable by trusted users.
+    """
+
+    # Constructor
+    def __init__(self, maxsize: int = 128, directory: str = None) -> None:
+        """
+        Constructs a new TemplateCache object
+        :param maxsize: int; maximum number of templates kept in memory
+        :param directory: str; directory where the templates are persisted (None for memory only), which
+                          must be trusted since its files are unpickled
+        """
+        if maxsize < 1:
+            raise ValueError("maxsize must be positive")
+        self.maxsize = maxsize
+        self.directory = directory
+        self.templates = OrderedDict()  # key -> template, from the least to the most recently used
+        self.hits = 0
+        self.loads = 0  # Templates read from the directory
+        self.misses = 0  # Templates built
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    # Methods
+    def get(self, generator, *args, first_id: int = 0) -> BoolCirc:
+        """
+        Returns a new instance of the circuit built by generator(*args)
+        :param generator: either a function returning a BoolCirc (e.g. BoolCirc.adder_circuit), or the name
+                          of a BoolCirc method building the circuit in place (e.g. 'adder', 'half_adder')
+        :param args: the parameters of the generator (hashable, with a stable repr for the persistence)
+        :param first_id: int; the ids of the nodes are first_id..first_id+V-1
+        :return: BoolCirc; an independent circuit
+        """
+        return self.template(generator, *args).instantiate(first_id)
+
+    def template(self, generator, *args) -> CircuitTemplate:
+        """
+        Returns the template of the circuit built by generator(*args), building it only if it is neither
+        in memory nor on disk (see get for the parameters)
+        """
+        name = generator if isinstance(generator, str) else f"{generator.__module__}.{generator.__qualname__}"
+        key = (name, args)
+        if key in self.templates:
+            self.hits += 1
+            self.templates.move_to_end(key)
+            return self.templates[key]
+
+        path = None
+        template = None
+        if self.directory is not None:
+            function = getattr(BoolCirc, generator) if isinstance(generator, str) else generator
+            stamp = (TEMPLATE_FORMAT, code_digest(function), key)
+            digest = hashlib.sha1(repr(stamp).encode()).hexdigest()
+            path = os.path.join(self.directory, f"{digest}.template")
+            if os.path.exists(path):
+                with open(path, 'rb') as file:
+                    template = pickle.load(file)
+                self.loads += 1
+
+        if template is None:
+            self.misses += 1
+            if isinstance(generator, str):
+                circ = BoolCirc(OpenDigraph.empty())
+                getattr(circ, generator)(*args)
+            else:
+                circ = generator(*args)
+            template = CircuitTemplate(circ)
+            if path is not None:  # Written to a temporary file first, so readers never see a partial file
+                with open(path + '.tmp', 'wb') as file:
+                    pickle.dump(template, file, pickle.HIGHEST_PROTOCOL)
+                os.replace(path + '.tmp', path)
+
+        self.templates[key] = template
+        if len(self.templates) > self.maxsize:
+            self.templates.popitem(last=False)
+        return template
+
+    def clear(self) -> None:
         """
-        Creates a Boolean circuit representing the given integer instantiated in a register
-        :param number: int; the integer value to be represented.
-        :param register_size: int; the size of the register (number of bits). Default is 8
-        """
-        # Convert the integer to binary representation
-        binary_str = bin(number)[2:]
-
-        # Pad the binary string with leading zeros if necessary
-        padded_binary_str = binary_str.zfill(register_size)
-
-        # Create nodes for each bit of the binary representation
-        for bit in padded_binary_str:
-            self.g.add_node(bit)
-
-        # Connect the nodes in the circuit to represent the binary value
-        for i in range(register_size - 1):
-            self.g.add_edge(int(padded_binary_str[i]), int(padded_binary_str[i + 1]))
-
-    def rule_not(self) -> None:
-        """
-        Applies transformation for NOT gates: ~0 -> 1, ~1 -> 0
-        """
-        node_ids = self.g.get_node_ids()
-        for node_id in node_ids:
-            node = self.g.nodes[node_id]
-            if node.get_label() == '∼':
-                pred = node.get_parents()[0]
-                pred_label = self.g.nodes[pred].get_label()
-                if pred_label == '0':
-                    self.g.nodes[node_id].set_label('1')
-                elif pred_label == '1':
-                    self.g.nodes[node_id].set_label('0')
-                self.g.remove_edge(pred, node_id)
-
-    def rule_and(self) -> None:
-        """
-        Applies transformation for AND gates: 0 & x -> 0, x & 0 -> 0, 1 & x -> x, x & 1 -> x
-        """
-        node_ids = self.g.get_node_ids()
-        for node_id in node_ids:
-            node = self.g.nodes[node_id]
-            if node.get_label() == '&':
-                inputs = [self.g.nodes[n].get_label() for n in node.get_parents()]
-                if '0' in inputs:
-                    self.g.nodes[node_id].set_label('0')
-                elif '1' in inputs:
-                    inputs.remove('1')
-                    self.g.nodes[node_id].set_label(inputs[0])
-                for pred in node.get_parents():
-                    self.g.remove_edge(pred, node_id)
-
-    def rule_or(self) -> None:
-        """
-        Applies transformation for OR gates: 0 | x -> x, x | 0 -> x, 1 | x -> 1, x | 1 -> 1
-        """
-        node_ids = self.g.get_node_ids()
-        for node_id in node_ids:
-            node = self.g.nodes[node_id]
-            if node.get_label() == '|':
-                inputs = [self.g.nodes[n].get_label() for n in node.get_parents()]
-                if '1' in inputs:
-                    self.g.nodes[node_id].set_label('1')
-                elif '0' in inputs:
-                    inputs.remove('0')
-                    self.g.nodes[node_id].set_label(inputs[0])
-                for pred in node.get_parents():
-                    self.g.remove_edge(pred, node_id)
-
-    def rule_xor(self) -> None:
-        """
-        Applies transformation for XOR gates and neutral elements: 0 ˆ x -> x, x ˆ 0 -> x, 1 ˆ x -> ~x, x ˆ 1 -> ~x
-        """
-        node_ids = self.g.get_node_ids()
-        for node_id in node_ids:
-            node = self.g.nodes[node_id]
-            if node.get_label() == 'ˆ':
-                inputs = [self.g.nodes[n].get_label() for n in node.get_parents()]
-                if '0' in inputs:
-                    inputs.remove('0')
-                    self.g.nodes[node_id].set_label(inputs[0])
-                elif '1' in inputs:
-                    inputs.remove('1')
-                    self.g.nodes[node_id].set_label('∼' + inputs[0])
-                for pred in node.get_parents():
-                    self.g.remove_edge(pred, node_id)
-
-    def evaluate_rule_neutral(self) -> None:
-        """
-        Applies transformation for neutral elements in OR gates: x | ~x -> 1, ~x | x -> 1
-        """
-        node_ids = self.g.get_node_ids()
-        for node_id in node_ids:
-            node = self.g.nodes[node_id]
-            if node.get_label() == '|':
-                inputs = [self.g.nodes[n].get_label() for n in node.get_parents()]
-                if len(inputs) == 2 and '∼' + inputs[0] == inputs[1]:
-                    self.g.nodes[node_id].set_label('1')
-                elif len(inputs) == 2 and '∼' + inputs[1] == inputs[0]:
-                    self.g.nodes[node_id].set_label('1')
-                for pred in node.get_parents():
-                    self.g.remove_edge(pred, node_id)
-
-    def rule_copy(self) -> None:
-        """
-        Applies transformation for copying without output: x -> x, x | x -> x
-        """
-        node_ids = self.g.get_node_ids()
-        for node_id in node_ids:
-            node = self.g.nodes[node_id]
-            if node.indegree() == 1 and node.outdegree() == 0:
-                pred = node.get_parents()[0]
-                self.g.nodes[node_id].set_label(self.g.nodes[pred].get_label())
-                self.g.remove_edge(pred, node_id)
-
-    def rule_erase(self) -> None:
-        """
-        Applies transformation for erasing a node with a unary operator.
-        """
-        node_ids = self.g.get_node_ids()
-        for node_id in node_ids:
-            node = self.g.nodes[node_id]
-            if node.indegree() == 1 and node.outdegree() == 1:
-                pred = node.get_parents()[0]
-                self.g.add_edge(pred, node.get_parents()[0])
-                self.g.remove_id(node_id)
-
-    def rule_involution(self) -> None:
-        """
-        Applies transformation for involution of XOR gates with more than two inputs.
-        """
-        node_ids = self.g.get_node_ids()
-        for node_id in node_ids:
-            node = self.g.nodes[node_id]
-            if node.get_label() == 'ˆ' and node.indegree() > 2:
-                inputs = [self.g.nodes[n] for n in node.get_parents()]
-                even_inputs = inputs[::2]
-                odd_inputs = inputs[1::2]
-                for i in range(len(even_inputs)):
-                    self.g.add_node('ˆ')
-                    self.g.add_edge(even_inputs[i].get_id(), len(self.g.nodes) - 1)
-                    self.g.add_edge(odd_inputs[i].get_id(), len(self.g.nodes) - 1)
-                    if i == len(even_inputs) - 1 and len(odd_inputs) > len(even_inputs):
-                        self.g.add_edge(odd_inputs[-1].get_id(), len(self.g.nodes) - 1)
-
-    def evaluate(self):
-        """
-        Applies transformation rules iteratively until there are no more transformations to apply.
-        """
-        # Set to keep track of nodes directly connected to an output
-        output_nodes: Set[int] = set()
-        for node_id in self.g.get_node_ids():
-            if self.g.nodes[node_id].outdegree() == 0:
-                output_nodes.add(node_id)
-
-        # Loop until there are no more transformations to apply
-        transformed = True
-        while transformed:
-            transformed = False  # Flag to check if any transformation was applied in the current iteration
-            # Loop through each node
-            for node_id in list(self.g.get_node_ids()):
-                node = self.g.nodes[node_id]
-
-                # Check if the node is a co-leaf (not directly connected to an output)
-                if node_id not in output_nodes:
-                    # Apply transformation rules
-                    if node.get_label() == '∼':
-                        self.rule_not()
-                        transformed = True
-                    elif node.get_label() == '&':
-                        self.rule_and()
-                        transformed = True
-                    elif node.get_label() == '|':
-                        self.rule_or()
-                        transformed = True
-                    elif node.get_label() == 'ˆ':
-                        self.rule_xor()
-                        transformed = True
-                    elif node.indegree() == 1 and node.outdegree() == 0:
-                        self.rule_copy()
-                        transformed = True
-                    elif node.indegree() == 1 and node.outdegree() == 1:
-                        self.rule_erase()
-                        transformed = True
-                    elif node.get_label() == 'ˆ' and node.indegree() > 2:
-                        self.rule_involution()
-                        transformed = True
-
-    def hamming_encoder(self):
-        """
-        Constructs the Boolean circuit for the Hamming decoder.
-        """
-        self.parse_parentheses("(x0 & (~x2 ~x4 ~x5) & ((x1 & ~x4) ^ (~x2 & x6)))")
-
-    def hamming_decoder(self):
-        """
-        Constructs the Boolean circuit for the Hamming encoder.
-        """
-        self.parse_parentheses("(x0 & (~x2 ~x4 ~x5) & ((x1 & ~x4) ^ (~x2 & x6))) ^ (x0 ~x1 ~x3)) & "
-                               "((~x2 x4 ~x5) ^ (~x4 ~x5 x6)) & (x0 x1 ~x3))")
+        Empties the memory of the cache (the persisted templates are kept)
+        """
+        self.templates.clear()
+
+
+class RewriteEngine:
+    """
+    Worklist-driven rewriting of a graph. Rules register the label and degree patterns of the nodes they
+    apply to; each rewrite returns the ids of the nodes it touched and only those are visited again.
+    A rule is a function rule(engine, node_id) returning None if it doesn't apply, else the touched ids.
+    """
+
+    # Constructor
+    def __init__(self, g: OpenDigraph) -> None:
+        """
+        Constructs a new RewriteEngine object
+        :param g: OpenDigraph; the graph to rewrite in place
+        """
+        self.g = g
+        self.rules = {}  # label -> list of (indegree, outdegree, rule)
+        self.inputs = set(g.get_input_ids())
+        self.outputs = set(g.get_output_ids())
+        self.next_id = g.max_id() + 1 if g.get_id_node_map() else 0
+
+    def register(self, rule, labels: str, indegree: int = None, outdegree: int = None) -> None:
+        """
+        Registers a rule for the nodes whose label is in labels (and with the given degrees, if not None)
+        :param rule: function (engine, node_id) -> None or list of touched ids
+        :param labels: iterable of labels; '' must be given inside a list or tuple
+        :param indegree: int; number of distinct parents of the matched nodes, None for any
+        :param outdegree: int; number of distinct children of the matched nodes, None for any
+        """
+        for label in labels:
+            self.rules.setdefault(label, []).append((indegree, outdegree, rule))
+
+    def run(self, node_ids: List[int] = None) -> int:
+        """
+        Applies the rules until no rule matches the nodes left in the worklist
+        :param node_ids: List[int]; initial worklist (all the nodes if None)
+        :return: int; number of rewrites applied
+        """
+        nodes = self.g.get_id_node_map()
+        queue = deque(nodes if node_ids is None else node_ids)
+        queued = set(queue)
+        rewrites = 0
+        while queue:
+            node_id = queue.popleft()
+            queued.discard(node_id)
+            if node_id not in nodes:  # Removed by a previous rewrite
+                continue
+            node = nodes[node_id]
+            for indegree, outdegree, rule in self.rules.get(node.get_label(), []):
+                if indegree is not None and node.indegree() != indegree:
+                    continue
+                if outdegree is not None and node.outdegree() != outdegree:
+                    continue
+                touched = rule(self, node_id)
+                if touched is not None:
+                    rewrites += 1
+                    for touched_id in touched:
+                        if touched_id in nodes and touched_id not in queued:
+                            queued.add(touched_id)
+                            queue.append(touched_id)
+                    break
+        return rewrites
+
+    # Graph edition in O(1) per edge (the OpenDigraph methods check the ids in O(V))
+    def new_node(self, label: str) -> int:
+        """
+        Adds an isolated node and returns its id
+        """
+        node_id = self.next_id
+        self.next_id += 1
+        self.g.nodes[node_id] = Node(node_id, label, {}, {})
+        return node_id
+
+    def add_edge(self, src: int, tgt: int, multiplicity: int = 1) -> None:
+        """
+        Adds multiplicity edges from src to tgt
+        """
+        children = self.g.nodes[src].children
+        parents = self.g.nodes[tgt].parents
+        children[tgt] = children.get(tgt, 0) + multiplicity
+        parents[src] = parents.get(src, 0) + multiplicity
+
+    def remove_edges(self, src: int, tgt: int) -> None:
+        """
+        Removes all the edges from src to tgt
+        """
+        self.g.nodes[src].remove_child_id(tgt)
+        self.g.nodes[tgt].remove_parent_id(src)
+
+    def remove_node(self, node_id: int) -> List[int]:
+        """
+        Removes a node with all its edges and returns the ids of its former neighbours
+        """
+        node = self.g.nodes.pop(node_id)
+        for parent_id in node.get_parents():
+            self.g.nodes[parent_id].remove_child_id(node_id)
+        for child_id in node.get_children():
+            self.g.nodes[child_id].remove_parent_id(node_id)
+        return list(node.get_parents()) + list(node.get_children())
+
+
+def rewrite_constant(engine: RewriteEngine, node_id: int):
+    """
+    Propagates a constant into its child: copy, not, and, or and xor gates
+    """
+    nodes = engine.g.get_id_node_map()
+    node = nodes[node_id]
+    label = node.get_label()
+
+    # A constant with several outgoing edges is first duplicated, one constant per edge
+    edges = [child_id for child_id, m in node.get_children().items() for _ in range(m)]
+    if not edges:
+        return None
+    if len(edges) > 1:
+        touched = [node_id]
+        for child_id in edges[1:]:
+            node.remove_child_once(child_id)
+            nodes[child_id].remove_parent_once(node_id)
+            constant_id = engine.new_node(label)
+            engine.add_edge(constant_id, child_id)
+            touched.append(constant_id)
+        return touched
+
+    child_id = edges[0]
+    child = nodes[child_id]
+    child_label = child.get_label()
+    if child_id in engine.outputs or child_label in ('0', '1'):
+        return None  # Final result (or an ill-formed circuit)
+
+    if child_label == '':  # Copy: one constant per child of the copy node
+        touched = []
+        for grandchild_id, m in child.get_children().items():
+            for _ in range(m):
+                constant_id = engine.new_node(label)
+                engine.add_edge(constant_id, grandchild_id)
+                touched.append(constant_id)
+        engine.remove_node(child_id)
+        engine.remove_node(node_id)
+        return touched
+
+    if child_label == '~':
+        child.set_label('0' if label == '1' else '1')
+        engine.remove_node(node_id)
+        return [child_id]
+
+    if child_label in ('&', '|'):
+        if (child_label == '&') == (label == '0'):  # Absorbing element: the gate becomes the constant
+            child.set_label(label)
+            touched = list(child.get_parents())
+            for parent_id in touched:
+                engine.remove_edges(parent_id, child_id)
+            return touched + [child_id]
+        engine.remove_node(node_id)  # Neutral element
+        return [child_id]
+
+    if child_label == '^':
+        engine.remove_node(node_id)
+        if label == '0':
+            return [child_id]
+        # x ^ 1 = ~x: a not gate is inserted after the xor gate
+        not_id = engine.new_node('~')
+        for grandchild_id, m in list(child.get_children().items()):
+            engine.remove_edges(child_id, grandchild_id)
+            engine.add_edge(not_id, grandchild_id, m)
+        engine.add_edge(child_id, not_id)
+        return [child_id, not_id]
+
+    return None
+
+
+def rewrite_neutral(engine: RewriteEngine, node_id: int):
+    """
+    A gate without input becomes its neutral element: & -> 1, | -> 0, ^ -> 0
+    """
+    node = engine.g.get_node_by_id(node_id)
+    node.set_label('1' if node.get_label() == '&' else '0')
+    return [node_id]
+
+
+def rewrite_erase(engine: RewriteEngine, node_id: int):
+    """
+    Removes a node whose value isn't used (no child, and not an input or an output).
+    An input must keep one child, so it is given a childless copy node instead.
+    """
+    if node_id in engine.inputs or node_id in engine.outputs:
+        return None
+    node = engine.g.get_node_by_id(node_id)
+    inputs = [parent_id for parent_id in node.get_parents() if parent_id in engine.inputs]
+    if inputs and node.get_label() == '':
+        return None  # Already the placeholder child of an input
+    for input_id in inputs:
+        engine.remove_edges(input_id, node_id)
+        engine.add_edge(input_id, engine.new_node(''))
+    return engine.remove_node(node_id)
+
+
+def rewrite_double_not(engine: RewriteEngine, node_id: int):
+    """
+    ~~x -> x: the second not gate becomes a copy of x
+    """
+    nodes = engine.g.get_id_node_map()
+    parent_id = next(iter(nodes[node_id].get_parents()))
+    parent = nodes[parent_id]
+    if parent.get_label() != '~' or parent.indegree() != 1:
+        return None
+    grandparent_id = next(iter(parent.get_parents()))
+    if grandparent_id in engine.inputs and parent.outdegree() > 1:
+        return None  # An input can't have a second child
+    engine.remove_edges(parent_id, node_id)
+    nodes[node_id].set_label('')
+    if parent.outdegree() == 0:
+        engine.remove_node(parent_id)
+    engine.add_edge(grandparent_id, node_id)
+    return [node_id, parent_id, grandparent_id]
+
+
+def rewrite_single_input(engine: RewriteEngine, node_id: int):
+    """
+    A gate with a single input edge is a copy of its input: &(x) = |(x) = ^(x) = x
+    """
+    node = engine.g.get_node_by_id(node_id)
+    if next(iter(node.get_parents().values())) != 1:
+        return None
+    node.set_label('')
+    return [node_id]
+
+
+def rewrite_copy(engine: RewriteEngine, node_id: int):
+    """
+    Removes a copy node by giving its children to its parent (except when the parent is an input
+    and the copy has several children)
+    """
+    if node_id in engine.inputs or node_id in engine.outputs:
+        return None
+    nodes = engine.g.get_id_node_map()
+    node = nodes[node_id]
+    parent_id = next(iter(node.get_parents()))
+    if parent_id in engine.inputs and sum(node.get_children().values()) != 1:
+        return None
+    children = list(node.get_children().items())
+    engine.remove_node(node_id)
+    for child_id, m in children:
+        engine.add_edge(parent_id, child_id, m)
+    return [parent_id] + [child_id for child_id, _ in children]
+
+
+# (rule, labels, indegree, outdegree) used by BoolCirc.evaluate
+EVALUATION_RULES = [
+    (rewrite_erase, ['0', '1', '~', '&', '|', '^', ''], None, 0),
+    (rewrite_constant, ['0', '1'], None, None),
+    (rewrite_neutral, ['&', '|', '^'], 0, None),
+]
+
+# Rules used by BoolCirc.optimize
+OPTIMIZATION_RULES = EVALUATION_RULES + [
+    (rewrite_double_not, ['~'], 1, None),
+    (rewrite_single_input, ['&', '|', '^'], 1, None),
+    (rewrite_copy, [''], 1, None),
+]
 
 
 def random_int_list(n: int, bound: int, unique=False) -> List[int]:
@@ -1798,11 +4093,13 @@ def random_int_list(n: int, bound: int, unique=False) -> List[int]:
     if unique and n > bound + 1:
         raise ValueError("Bound too small compared to n")
     res = []
+    seen = set()
     for _ in range(n):
         tmp = randint(0, bound)
         if unique:
-            while tmp in res:  # All numbers must be different to be IDs
+            while tmp in seen:  # All numbers must be different to be IDs
                 tmp = randint(0, bound)
+            seen.add(tmp)
         res.append(tmp)
     return res
 
@@ -1893,3 +4190,419 @@ def min_distance(dic: Dict[int, int], nodes: List[int]) -> int:
                 if dic[node] < dic[mini]:
                     mini = node
     return mini
+
+
+# Binary graph format (see OpenDigraph.save_binary): magic, version, flags, then the numbers of nodes,
+# edges, labels, inputs and outputs
+BINARY_HEADER = '<4sHHQQQQQ'  # 48 bytes, so that the next sections stay 8-byte aligned
+BINARY_MAGIC = b'ODGB'
+BINARY_VERSION = 1
+
+# Format of the templates persisted by TemplateCache, part of their on-disk keys
+TEMPLATE_FORMAT = 1
+
+# Compressions of OpenDigraph.write_dot, by path suffix
+DOT_COMPRESSIONS = {'.gz': 'gzip', '.xz': 'xz'}
+
+# Tokens of the DOT subset read by OpenDigraph.from_dot_file: quoted string, edge operator, identifier,
+# punctuation, comment, anything else
+DOT_TOKEN = re.compile(r'\s*(?:"((?:[^"\\\n]|\\.)*)"|(->|--)|(v-\d+|[A-Za-z_]\w*|-?(?:\d+(?:\.\d*)?|\.\d+))'
+                       r'|([{}\[\];,=])|(//.*|#.*)|(\S))')
+DOT_ESCAPE = re.compile(r'\\(.)')
+# Whole node or edge line of write_dot, read without tokenizing: source, target (edges only), label
+DOT_LINE = re.compile(r'\s*v(-?\d+)(?: -> v(-?\d+))? \[label="([^"\\\n]*)"\];\s*$')
+
+
+def dot_statements(lines):
+    """
+    Tokenizes DOT text line by line, and groups the tokens into statements, ended by ';', '{' or '}',
+    or by the end of a line outside of an attribute list
+    :param lines: iterable of str; the lines of the text
+    :return: generator of (int, list, tuple); the line number and the (kind, value) tokens of each statement,
+             the kind being 'id' for identifiers and quoted strings, and the symbol itself otherwise.
+             Lines matching DOT_LINE aren't tokenized: their tokens are None and the tuple holds the fields
+             of DOT_LINE (it is None for the other statements)
+    """
+    statement, depth = [], 0
+    for number, line in enumerate(lines, 1):
+        if not statement:
+            match = DOT_LINE.match(line)
+            if match:
+                yield number, None, match.groups()
+                continue
+        for match in DOT_TOKEN.finditer(line):
+            group = match.lastindex
+            value = match.group(group)
+            if group == 1:
+                if '\\' in value:
+                    value = DOT_ESCAPE.sub(lambda m: '\n' if m.group(1) == 'n' else m.group(1), value)
+                statement.append(('id', value))
+            elif group == 3:
+                statement.append(('id', value))
+            elif group == 5:  # Comment
+                break
+            elif group == 6:
+                raise ValueError(f"Unexpected {value!r} at line {number}")
+            elif value in ';}' and not depth:
+                if statement:
+                    yield number, statement, None
+                if value == '}':
+                    yield number, [('}', '}')], None
+                statement = []
+            else:
+                depth += (value == '[') - (value == ']')
+                statement.append((value, value))
+                if value == '{':
+                    yield number, statement, None
+                    statement = []
+        if (statement and not depth and statement[-1][0] not in ('->', '=')
+                and statement[0] not in (('id', 'strict'), ('id', 'digraph'))):  # Header continued by '{'
+            yield number, statement, None
+            statement = []
+    if statement:
+        raise ValueError("Unexpected end of file")
+
+
+def dot_attributes(tokens: List[Tuple[str, str]], k: int, number: int) -> Dict[str, str]:
+    """
+    Reads the attribute lists [name=value, ...] ending a DOT statement
+    :param tokens: List[Tuple[str, str]]; the tokens of the statement
+    :param k: int; position of the first list
+    :param number: int; line number, for the errors
+    :return: Dict[str, str]; the attributes
+    """
+    attributes = {}
+    while k < len(tokens):
+        if tokens[k][0] != '[':
+            raise ValueError(f"Unexpected {tokens[k][1]!r} at line {number}")
+        k += 1
+        while k < len(tokens) and tokens[k][0] != ']':
+            if [kind for kind, _ in tokens[k:k + 3]] != ['id', '=', 'id']:
+                raise ValueError(f"Invalid attribute list at line {number}")
+            attributes[tokens[k][1]] = tokens[k + 2][1]
+            k += 3
+            if k < len(tokens) and tokens[k][0] in (',', ';'):
+                k += 1
+        if k == len(tokens):
+            raise ValueError(f"Unclosed attribute list at line {number}")
+        k += 1
+    return attributes
+
+
+def dot_node_id(name: str, number: int) -> int:
+    """
+    Returns the id of a DOT node named v<id> or <id>
+    :param name: str; the name of the node
+    :param number: int; line number, for the errors
+    :return: int; the id
+    """
+    try:
+        return int(name[1:] if name[:1] == 'v' else name)
+    except ValueError:
+        raise ValueError(f"Invalid node name {name!r} at line {number}, expected v<id> or <id>") from None
+
+
+# Process pool workers of CompiledCirc.map_shards: the circuit is received once, by init_worker
+worker_circuit = None
+
+
+def init_worker(circuit: 'CompiledCirc') -> None:
+    """
+    Stores the circuit in the worker process
+    """
+    global worker_circuit
+    worker_circuit = circuit
+
+
+def call_worker(function, shard):
+    """
+    Applies function to the circuit of the worker and the shard
+    """
+    return function(worker_circuit, shard)
+
+
+def evaluate_shard(circuit: 'CompiledCirc', shard: List[Tuple[int, ...]]) -> List[Tuple[int, ...]]:
+    """
+    Evaluates a list of assignments with one bitwise operation per gate over the whole shard
+    """
+    words = circuit.evaluate_packed(pack_bits(shard, circuit.n_inputs), len(shard))
+    return unpack_bits(words, len(shard))
+
+
+def evaluate_packed_shard(circuit: 'CompiledCirc', batch: Tuple[List[int], int]) -> Tuple[int, ...]:
+    """
+    Evaluates a batch (words, width) of packed assignments
+    """
+    return circuit.evaluate_packed(*batch)
+
+
+# Tokens of the formulas: (name, constant, operator or parenthesis, anything else), after blanks
+FORMULA_TOKEN = re.compile(r'\s*(?:([A-Za-z_]\w*)|([01])|([~&^|()])|(\S))')
+BINARY_PRIORITY = {'|': 1, '^': 2, '&': 3}
+
+
+def tokenize_formula(s: str):
+    """
+    Generator over the tokens of a formula, as (kind, text, position) with kind in
+    'name', 'constant' and 'operator'
+    :param s: str; the formula
+    :return: iterator over the tokens
+    """
+    for match in FORMULA_TOKEN.finditer(s):
+        name, constant, operator, other = match.groups()
+        if other is not None:
+            raise ValueError(f"Unexpected character {other!r} at position {match.start(4)}")
+        if name is not None:
+            yield 'name', name, match.start(1)
+        elif constant is not None:
+            yield 'constant', constant, match.start(2)
+        elif operator is not None:
+            yield 'operator', operator, match.start(3)
+
+
+def parse_formula(builder: 'CircuitBuilder', s: str, variables: Dict[str, int]) -> int:
+    """
+    Adds the gates of a formula to a circuit builder (see BoolCirc.parse_parentheses for the syntax).
+    The parser uses explicit stacks (shunting-yard), so deep nestings don't hit the recursion limit.
+    :param builder: CircuitBuilder; the builder receiving the gates
+    :param s: str; the formula
+    :param variables: Dict[str, int]; maps the variable names to their signal, new ones are added
+    :return: int; id of the signal computing the formula
+    """
+    operands = []
+    operators = []  # (operator, position)
+
+    def reduce():
+        operator, _ = operators.pop()
+        if operator == '~':
+            operands.append(builder.add_gate('~', [operands.pop()]))
+        else:
+            right = operands.pop()
+            operands.append(builder.add_gate(operator, [operands.pop(), right]))
+
+    expect_operand = True
+    for kind, text, position in tokenize_formula(s):
+        if expect_operand:
+            if kind == 'name':
+                if text not in variables:
+                    variables[text] = builder.add_input()
+                operands.append(variables[text])
+                expect_operand = False
+            elif kind == 'constant':
+                operands.append(builder.add_gate(text, []))
+                expect_operand = False
+            elif text in '~(':
+                operators.append((text, position))
+            else:
+                raise ValueError(f"Expected a variable, a constant, '~' or '(' at position {position}")
+        elif text in BINARY_PRIORITY:
+            while operators and operators[-1][0] != '(' and \
+                    BINARY_PRIORITY.get(operators[-1][0], 4) >= BINARY_PRIORITY[text]:
+                reduce()
+            operators.append((text, position))
+            expect_operand = True
+        elif text == ')':
+            while operators and operators[-1][0] != '(':
+                reduce()
+            if not operators:
+                raise ValueError(f"Unmatched ')' at position {position}")
+            operators.pop()
+        else:
+            raise ValueError(f"Expected an operator or ')' at position {position}")
+
+    if expect_operand:
+        raise ValueError(f"Unexpected end of formula at position {len(s)}")
+    while operators:
+        if operators[-1][0] == '(':
+            raise ValueError(f"Unmatched '(' at position {operators[-1][1]}")
+        reduce()
+    return operands[0]
+
+
+def build_adder(builder: 'CircuitBuilder', a: List[int], b: List[int], carry: int = None,
+                architecture: str = 'ripple') -> Tuple[List[int], int]:
+    """
+    Adds the gates of an adder to a circuit builder (see BoolCirc.adder_circuit for the architectures)
+    :param builder: CircuitBuilder; the builder receiving the gates
+    :param a: List[int]; signals of the first register, LSB first
+    :param b: List[int]; signals of the second register, LSB first
+    :param carry: int; signal of the carry input, None for no carry
+    :param architecture: str; one of 'ripple', 'lookahead', 'brent-kung', 'kogge-stone'
+    :return: Tuple[List[int], int]; the signals of the sum bits (LSB first) and of the carry output
+    """
+    if len(a) != len(b):
+        raise ValueError("The registers don't have the same size")
+    width = len(a)
+    propagate = [builder.add_gate('^', [x, y]) for x, y in zip(a, b)]
+    generate = [builder.add_gate('&', [x, y]) for x, y in zip(a, b)]
+
+    def sum_bits(carries):
+        # carries[i] is the carry into bit i (None for no carry)
+        return [p if c is None else builder.add_gate('^', [p, c]) for p, c in zip(propagate, carries)]
+
+    if architecture == 'ripple':
+        carries = [carry]
+        for i in range(width):
+            if carries[i] is None:
+                carries.append(generate[i])
+            else:
+                carries.append(builder.add_gate('|', [generate[i], builder.add_gate('&', [propagate[i], carries[i]])]))
+        return sum_bits(carries[:width]), carries[width]
+
+    if architecture == 'lookahead':
+        # Inside each block of 4 bits, c_{i+1} = g_i | p_i g_{i-1} | ... | p_i ... p_j c_j
+        carries = [carry]
+        for start in range(0, width, 4):
+            block_carry = carries[start]
+            for i in range(start, min(start + 4, width)):
+                terms = [generate[i]]
+                for j in range(i - 1, start - 1, -1):
+                    terms.append(builder.add_gate('&', propagate[j + 1:i + 1] + [generate[j]]))
+                if block_carry is not None:
+                    terms.append(builder.add_gate('&', propagate[start:i + 1] + [block_carry]))
+                carries.append(terms[0] if len(terms) == 1 else builder.add_gate('|', terms))
+        return sum_bits(carries[:width]), carries[width]
+
+    if architecture not in ('brent-kung', 'kogge-stone'):
+        raise ValueError(f"Unknown adder architecture {architecture!r}")
+
+    # Parallel prefix over the (generate, propagate) pairs, the carry input being folded into bit 0.
+    # combine(high, low) is the pair of the concatenated span: (g_h | p_h & g_l, p_h & p_l); a span
+    # starting at bit 0 has no propagate (None), since nothing below it can be combined with it
+    def combine(high, low, need_propagate=True):
+        g = builder.add_gate('|', [high[0], builder.add_gate('&', [high[1], low[0]])])
+        if not need_propagate or low[1] is None:
+            return g, None
+        return g, builder.add_gate('&', [high[1], low[1]])
+
+    spans = list(zip(generate, propagate))
+    if carry is not None:
+        spans[0] = (builder.add_gate('|', [generate[0], builder.add_gate('&', [propagate[0], carry])]), None)
+    else:
+        spans[0] = (generate[0], None)  # The span of bit 0 starts at the carry: its propagate isn't needed
+
+    if architecture == 'kogge-stone':
+        distance = 1
+        while distance < width:
+            spans = spans[:distance] + [combine(spans[i], spans[i - distance], 2 * distance < width)
+                                        for i in range(distance, width)]
+            distance *= 2
+    else:
+        distance = 1
+        while 2 * distance <= width:  # Up-sweep: bit 2^k d - 1 gets the span of its 2^k d lowest bits
+            for i in range(2 * distance - 1, width, 2 * distance):
+                spans[i] = combine(spans[i], spans[i - distance])
+            distance *= 2
+        while distance > 1:  # Down-sweep: the other bits get their span from the closest complete one
+            distance //= 2
+            for i in range(3 * distance - 1, width, 2 * distance):
+                spans[i] = combine(spans[i], spans[i - distance], False)
+
+    return sum_bits([carry] + [g for g, _ in spans[:width - 1]]), spans[width - 1][0]
+
+
+def build_in_order(roots: list, fanins, done, build) -> None:
+    """
+    Calls build(name) for every name the roots depend on, each one after all its fan-in is done,
+    with an iterative depth-first search (for formats that don't order their definitions)
+    :param roots: list; the names to build
+    :param fanins: function name -> names it depends on
+    :param done: container of the names already built (build must add the name to it)
+    :param build: function name -> None
+    """
+    on_path = set()
+    stack = [(root, False) for root in roots]
+    while stack:
+        name, expanded = stack.pop()
+        if name in done:
+            continue
+        if expanded:  # Its fan-in is done
+            build(name)
+            on_path.discard(name)
+            continue
+        if name in on_path:  # Only the ancestors of the current node are unfinished and on the path
+            raise ValueError(f"Combinational loop through {name}")
+        on_path.add(name)
+        stack.append((name, True))
+        stack.extend((fanin, False) for fanin in fanins(name) if fanin not in done)
+
+
+def gate_key(label: str, parents: Dict[int, int]) -> Tuple[str, Tuple[Tuple[int, int], ...]]:
+    """
+    Returns a key identifying the function computed by a gate from its label and parents:
+    & and | are idempotent so only the set of parents matters, and x ^ x = 0 so only the parents
+    of odd multiplicity matter; the other gates keep their multiplicities
+    :param label: str; label of the gate
+    :param parents: Dict[int, int]; maps the parent ids to the multiplicities
+    :return: Tuple[str, Tuple[Tuple[int, int], ...]]; the key, with the (parent, multiplicity) pairs sorted
+    """
+    if label in ('&', '|'):
+        return label, tuple((parent_id, 1) for parent_id in sorted(parents))
+    if label == '^':
+        return label, tuple((parent_id, 1) for parent_id in sorted(parents) if parents[parent_id] % 2)
+    return label, tuple(sorted(parents.items()))
+
+
+def pack_bits(vectors: List[Tuple[int, ...]], n: int) -> List[int]:
+    """
+    Packs bit vectors into words: bit j of the i-th word is the i-th bit of the j-th vector
+    :param vectors: List[Tuple[int, ...]]; the bit vectors, all of length n
+    :param n: int; length of the vectors
+    :return: List[int]; n words
+    """
+    words = []
+    for i in range(n):
+        word = 0
+        for j, vector in enumerate(vectors):
+            if vector[i]:
+                word |= 1 << j
+        words.append(word)
+    return words
+
+
+def unpack_bits(words: Tuple[int, ...], count: int) -> List[Tuple[int, ...]]:
+    """
+    Inverse of pack_bits: returns the count bit vectors packed in the words
+    :param words: Tuple[int, ...]; one word per bit of the vectors
+    :param count: int; number of vectors packed in each word
+    :return: List[Tuple[int, ...]]; the bit vectors
+    """
+    return [tuple((word >> j) & 1 for word in words) for j in range(count)]
+
+
+def words_to_rows(words: Tuple[int, ...], width: int) -> List[int]:
+    """
+    Transposes packed words into rows: bit i of the t-th row is bit t of words[i]
+    :param words: Tuple[int, ...]; the packed words
+    :param width: int; number of bits in each word
+    :return: List[int]; width packed rows
+    """
+    if not words:
+        return [0] * width
+    columns = [format(word, f'0{width}b')[::-1] for word in words]  # Character t is bit t
+    return [int(''.join(bits)[::-1], 2) for bits in zip(*columns)]
+
+
+def code_digest(function) -> str:
+    """
+    Returns a digest of the bytecode and constants of a function (recursively for the nested functions),
+    which changes when the function is modified but not when it only moves in its file
+    :param function: the function (or method); a callable without code, such as a builtin, gives ''
+    :return: str; the hexadecimal digest
+    """
+    code = getattr(function, '__code__', None)
+    if code is None:
+        return ''
+    digest = hashlib.sha1()
+    stack = [code]
+    while stack:
+        constant = stack.pop()
+        if hasattr(constant, 'co_code'):  # The function, or a nested function or comprehension
+            digest.update(constant.co_code + repr(constant.co_names).encode())
+            stack += constant.co_consts
+        elif isinstance(constant, (tuple, frozenset)):  # Sets are sorted: their order depends on the hash seed
+            digest.update(b'(' if isinstance(constant, tuple) else b'{')
+            stack += constant if isinstance(constant, tuple) else sorted(constant, key=repr)
+        else:
+            digest.update(repr(constant).encode())
+    return digest.hexdigest()
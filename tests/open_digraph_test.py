@@ -1,9 +1,35 @@
 import unittest
 import sys
 import os
+import io
+import gzip
+import lzma
+import pickle
+import tempfile
+import pathlib
 root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.append(root)  # allows us to fetch files from the project root
 from modules.open_digraph import *
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def and_or_not_circuit() -> BoolCirc:
+    """
+    Returns the circuit with inputs a, b, c and outputs (a & b) | c and ~c, shared by the simulation tests
+    """
+    n0 = Node(0, '', {}, {3: 1})
+    n1 = Node(1, '', {}, {3: 1})
+    n2 = Node(2, '', {}, {4: 1})
+    n3 = Node(3, '&', {0: 1, 1: 1}, {5: 1})
+    n4 = Node(4, '', {2: 1}, {5: 1, 6: 1})
+    n5 = Node(5, '|', {3: 1, 4: 1}, {7: 1})
+    n6 = Node(6, '~', {4: 1}, {8: 1})
+    n7 = Node(7, '', {5: 1}, {})
+    n8 = Node(8, '', {6: 1}, {})
+    return BoolCirc(OpenDigraph([0, 1, 2], [7, 8], [n0, n1, n2, n3, n4, n5, n6, n7, n8]))
 
 
 class InitTest(unittest.TestCase):
@@ -137,6 +163,14 @@ class InitTest(unittest.TestCase):
         self.assertEqual(g.get_node_by_id(1), Node(1, 'Le Guichet', {0: 1}, {2: 1}))
         self.assertEqual(g.get_node_by_id(2), Node(2, 'Paris', {1: 1}, {}))
 
+        g.add_edges([(0, 1), (2, 0)], [2, 1])
+        self.assertEqual(g.get_node_by_id(0), Node(0, 'Orsay', {2: 1}, {1: 3}))
+        for edges, multiplicities in (([(0, 1), (1, 0)], [2]), ([(0, 1)], [0]), ([(0, 1)], [1.5]),
+                                      ([(0, 1), (0, 3)], None)):
+            with self.assertRaises(ValueError):  # Nothing is added
+                g.add_edges(edges, multiplicities)
+            self.assertEqual(g.get_node_by_id(0), Node(0, 'Orsay', {2: 1}, {1: 3}))
+
     def test_add_node_OpenDigraph(self):
         n0 = Node(0, 'Orsay', {}, {})
         n1 = Node(1, 'Le Guichet', {}, {})
@@ -440,6 +474,175 @@ class InitTest(unittest.TestCase):
             OpenDigraph.random(n=10, bound=9, inputs=11, outputs=0, form='oriented')
             OpenDigraph.random(n=10, bound=9, inputs=0, outputs=11, form='oriented')
 
+    @unittest.skipIf(np is None, "NumPy is not installed")
+    def test_random_sparse_OpenDigraph(self):
+        for form in ["free", "DAG", "oriented", "loop-free", "undirected", "loop-free_undirected"]:
+            g = OpenDigraph.random_sparse(50, 120, bound=3, inputs=2, outputs=3, form=form, seed=5)
+            self.assertTrue(g.is_well_formed())
+            self.assertEqual(len(g.get_nodes()), 55)
+            self.assertEqual((len(g.get_input_ids()), len(g.get_output_ids())), (2, 3))
+            inner = [(i, j, m) for i in range(50) for j, m in g.get_node_by_id(i).get_children().items() if j < 50]
+            self.assertTrue(all(1 <= m <= 3 for _, _, m in inner))
+            pairs = {(i, j) for i, j, _ in inner}
+            if form in ("undirected", "loop-free_undirected"):
+                self.assertTrue(all((j, i) in pairs for i, j in pairs))
+                self.assertEqual(len({(min(i, j), max(i, j)) for i, j in pairs}), 120)
+            else:
+                self.assertEqual(len(pairs), 120)
+            if form != "free" and form != "undirected":
+                self.assertTrue(all(i != j for i, j in pairs))
+            if form == "oriented":
+                self.assertTrue(all((j, i) not in pairs for i, j in pairs))
+            if form == "DAG":
+                self.assertFalse(g.is_cyclic())
+
+        self.assertEqual(OpenDigraph.random_sparse(30, 60, seed=2), OpenDigraph.random_sparse(30, 60, seed=2))
+        for form in ["DAG", "oriented"]:  # A few hubs, which are sources
+            g = OpenDigraph.random_sparse(100, 300, form=form, seed=3, exponent=1.5)
+            self.assertGreater(max(node.outdegree() for node in g.get_nodes()), 30)
+            self.assertLess(max(node.indegree() for node in g.get_nodes()), 15)
+        self.assertEqual(len(OpenDigraph.random_sparse(4, 16, form="free").get_nodes()), 4)  # Complete
+        with self.assertRaises(ValueError):
+            OpenDigraph.random_sparse(4, 13, form="loop-free")
+        with self.assertRaises(ValueError):
+            OpenDigraph.random_sparse(4, 2, form="invalid_form")
+
+    def test_save_binary_OpenDigraph(self):
+        n0 = Node(7, 'Orsay', {}, {3: 2, 12: 1})
+        n1 = Node(3, 'Paris', {7: 2, 3: 1}, {3: 1, 12: 1})
+        n2 = Node(12, 'Orsay', {7: 1, 3: 1}, {})
+        n3 = Node(-4, '', {}, {})
+        g = OpenDigraph([], [], [n0, n1, n2, n3])
+        g.inputs, g.outputs = [12, 7], [3]  # Port order is kept, even if it isn't well-formed
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'graph.odg')
+            g.save_binary(path)
+            loaded = OpenDigraph.load_binary(path)
+            self.assertEqual(loaded, g)
+            self.assertEqual((loaded.get_input_ids(), loaded.get_output_ids()), ([12, 7], [3]))
+
+            with MappedGraph(path) as mapped:
+                self.assertEqual(len(mapped), 4)
+                self.assertEqual(mapped.labels, ['Orsay', 'Paris', ''])  # Interned
+                k = mapped.index_of(3)
+                self.assertEqual(mapped.get_label(k), 'Paris')
+                self.assertEqual(sorted(mapped.ids[i] for i, _ in mapped.get_children(k)), [3, 12])
+                self.assertEqual(mapped.get_parents(mapped.index_of(7)), [])
+                with self.assertRaises(ValueError):
+                    mapped.index_of(5)
+
+            adder = BoolCirc.adder_circuit(3)
+            adder.save_binary(pathlib.Path(path))
+            self.assertEqual(BoolCirc.load_binary(pathlib.Path(path)).g, adder.g)
+            with open(path, 'rb') as file:  # A real file is mapped, and left open
+                self.assertEqual(BoolCirc.load_binary(file).g, adder.g)
+                self.assertFalse(file.closed)
+            labelled = OpenDigraph([], [], [Node(0, 7, {}, {1: 1}), Node(1, '7', {0: 1}, {})])
+            labelled.save_binary(path)
+            loaded = OpenDigraph.load_binary(path)
+            self.assertEqual([node.get_label() for node in loaded.get_nodes()], ['7', '7'])  # Read back as str
+            self.assertEqual(loaded.get_node_by_id(1).get_parents(), {0: 1})
+            with MappedGraph(path) as mapped:
+                self.assertEqual(mapped.labels, ['7'])
+            with self.assertRaises(ValueError):  # mmap needs a file descriptor
+                OpenDigraph.load_binary(io.BytesIO(pathlib.Path(path).read_bytes()))
+            with self.assertRaises(ValueError):
+                OpenDigraph([], [], [Node(0, '', {0: 1 << 32}, {0: 1 << 32})]).save_binary(io.BytesIO())
+
+            with open(path, 'r+b') as file:
+                file.truncate(100)
+            with self.assertRaises(ValueError):
+                OpenDigraph.load_binary(path)
+            with open(path, 'wb') as file:
+                file.write(b'digraph G {}\n' * 8)
+            with self.assertRaises(ValueError):
+                OpenDigraph.load_binary(path)
+
+    def test_write_dot_OpenDigraph(self):
+        n0 = Node(0, 'A', {}, {1: 2})
+        n1 = Node(1, 'say "hi"', {0: 2}, {})
+        g = OpenDigraph([0], [1], [n0, n1])
+        expected = ('digraph G {\n'
+                    'inputs="0";\n'
+                    'outputs="1";\n'
+                    'v0 [label="A"];\n'
+                    'v0 -> v1 [label="2"];\n'
+                    'v1 [label="say \\"hi\\""];\n'
+                    '}\n')
+        text = io.StringIO()
+        g.write_dot(text)
+        self.assertEqual(text.getvalue(), expected)
+        self.assertEqual(''.join(g.dot_chunks()), expected)
+        self.assertEqual(''.join(g.dot_chunks(lines=1)), expected)  # Many small chunks
+
+        binary = io.BytesIO()
+        g.write_dot(binary, compression='gzip')
+        self.assertEqual(gzip.decompress(binary.getvalue()).decode(), expected)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'graph.dot.xz')
+            g.save_as_dot_file(path)
+            with lzma.open(path, 'rt') as file:
+                self.assertEqual(file.read(), expected)
+            path = pathlib.Path(directory, 'graph.dot.gz')
+            g.save_as_dot_file(path)
+            with gzip.open(path, 'rt') as file:
+                self.assertEqual(file.read(), expected)
+        with self.assertRaises(ValueError):
+            g.write_dot(binary, compression='zip')
+
+        self.assertIn('v0 [label="7"];', ''.join(OpenDigraph([], [], [Node(0, 7, {}, {})]).dot_chunks()))
+        circ = BoolCirc.adder_circuit(2)
+        self.assertEqual(''.join(circ.dot_chunks(True)), ''.join(circ.g.dot_chunks(True)))
+        self.assertIn('(id: 0)', ''.join(circ.dot_chunks(True)))
+
+    def test_from_dot_file_OpenDigraph(self):
+        n0 = Node(-4, 'A', {}, {1: 2, 5: 1})
+        n1 = Node(1, 'say "hi"\nagain', {-4: 2}, {5: 1})
+        n2 = Node(5, '', {-4: 1, 1: 1}, {})
+        g = OpenDigraph([-4], [5, 1], [n0, n1, n2])
+        for verbose in (False, True):
+            text = io.StringIO()
+            g.write_dot(text, verbose)
+            text.seek(0)
+            loaded = OpenDigraph.from_dot_file(text)
+            self.assertEqual(loaded, g)
+            self.assertEqual((loaded.get_input_ids(), loaded.get_output_ids()), ([-4], [5, 1]))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'adder.dot.gz')
+            adder = BoolCirc.adder_circuit(3)
+            adder.save_as_dot_file(path)
+            self.assertEqual(BoolCirc.from_dot_file(pathlib.Path(path)).g, adder.g)
+
+        labelled = OpenDigraph([], [], [Node(3, 'x (id: 3)', {}, {})])  # Not stripped without verbose="true"
+        for verbose in (False, True):
+            text = io.StringIO()
+            labelled.write_dot(text, verbose)
+            text.seek(0)
+            self.assertEqual(OpenDigraph.from_dot_file(text).get_node_by_id(3).get_label(), 'x (id: 3)')
+
+        # Written by hand: no I/O attributes, optional semicolons, chained edges, nodes declared by edges
+        dot = io.BytesIO(b"""// Example
+            strict digraph "G"
+            {
+                graph [rankdir=LR, outputs="v3"]
+                node [shape=box];
+                v0 [label="Node 0"]; v1 [label = "Node 1"]
+                v0 -> v1 -> v2 [color=red]
+                v1 -> v3; v0 -> v1 [label="2"]
+            }
+            """)
+        loaded = OpenDigraph.from_dot_file(dot)
+        self.assertEqual([node.get_label() for node in loaded.get_nodes()], ['Node 0', 'Node 1', '', ''])
+        self.assertEqual((loaded.get_input_ids(), loaded.get_output_ids()), ([], [3]))
+        self.assertEqual(loaded.get_node_by_id(0).get_children(), {1: 3})
+        self.assertEqual(loaded.get_node_by_id(1).get_children(), {2: 1, 3: 1})
+
+        for dot in ('graph G { a -- b }', 'digraph G { a -> b }', 'digraph G { v0 -> v1 [label="0"] }',
+                    'digraph G { v0 [label="A"];', 'digraph G { inputs="7"; v0 }', 'digraph G { v0 [label] }',
+                    'digraph G { v0 } v1'):
+            with self.assertRaises(ValueError):
+                OpenDigraph.from_dot_file(io.StringIO(dot))
+
     def test_adjency_matrix_OpenDigraph(self):
         m = [[0, 1, 1, 0, 0],
              [0, 0, 0, 1, 2],
@@ -454,6 +657,18 @@ class InitTest(unittest.TestCase):
         g = OpenDigraph([], [], [n1, n2, n3, n4, n5])
         self.assertEqual(m, g.adjacency_matrix())
 
+    def test_example_graph_OpenDigraph(self):
+        # A simple example graph, saved as a .dot file
+        node1 = Node(identity=1, label="A", parents={}, children={2: 1, 3: 1})
+        node2 = Node(identity=2, label="B", parents={1: 1}, children={4: 1})
+        node3 = Node(identity=3, label="C", parents={1: 1}, children={4: 1})
+        node4 = Node(identity=4, label="D", parents={2: 1, 3: 1}, children={})
+        graph = OpenDigraph(inputs=[1], outputs=[4], nodes=[node1, node2, node3, node4])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'example_graph.dot')
+            graph.save_as_dot_file(path, verbose=True)
+            self.assertEqual(OpenDigraph.from_dot_file(path), graph)
+
     '''
     def test_save_as_dot_file_OpenDigraph(self):
         # Create a graph
@@ -725,6 +940,718 @@ class InitTest(unittest.TestCase):
         self.assertEqual(dist, {0: 0, 1: 1, 2: 1})
         self.assertEqual(prev, {1: 0, 2: 0})
 
+    def test_merge_nodes_OpenDigraph(self):
+        n0 = Node(0, 'A', {}, {1: 1, 2: 1})
+        n1 = Node(1, 'B', {0: 1}, {3: 1})
+        n2 = Node(2, 'C', {0: 1}, {3: 2})
+        n3 = Node(3, 'D', {1: 1, 2: 2}, {})
+        g = OpenDigraph([], [], [n0, n1, n2, n3])
+        self.assertEqual(g.merge_nodes(1, 2, 'E'), 1)
+        self.assertTrue(g.is_well_formed())
+        self.assertEqual(g.get_node_by_id(1), Node(1, 'E', {0: 2}, {3: 3}))
+        self.assertEqual(g.get_node_by_id(3).get_parents(), {1: 3})
+        self.assertEqual(g.get_node_by_id(0).get_children(), {1: 2})
+
+    def test_contract_OpenDigraph(self):
+        n0 = Node(0, 'A', {}, {1: 1, 2: 1})
+        n1 = Node(1, 'B', {0: 1}, {3: 1})
+        n2 = Node(2, 'C', {0: 1}, {3: 2})
+        n3 = Node(3, 'D', {1: 1, 2: 2}, {4: 1})
+        n4 = Node(4, 'E', {3: 1}, {})
+        g = OpenDigraph([], [4, 3], [n0, n1, n2, n3, n4])
+        mapping = g.contract([(1, 2), (4, 3)])
+        self.assertEqual(mapping, {2: 1, 3: 4})
+        self.assertEqual(g.get_node_ids(), [0, 1, 4])
+        self.assertEqual(g.get_node_by_id(1), Node(1, 'B', {0: 2}, {4: 3}))
+        self.assertEqual(g.get_node_by_id(4), Node(4, 'E', {1: 3, 4: 1}, {4: 1}))
+        self.assertEqual(g.get_output_ids(), [4])
+
+        # Label map: every node with the same key is merged into the first one
+        n0 = Node(0, 'x', {}, {2: 1})
+        n1 = Node(1, 'x', {}, {2: 1})
+        n2 = Node(2, '&', {0: 1, 1: 1}, {})
+        g = OpenDigraph([], [], [n0, n1, n2])
+        self.assertEqual(g.contract({0: 'x', 1: 'x', 2: '&'}), {1: 0})
+        self.assertEqual(g.get_node_by_id(2).get_parents(), {0: 2})
+        self.assertTrue(g.is_well_formed())
+        with self.assertRaises(ValueError):
+            g.contract([(0, 7)])
+
+    def test_diff_OpenDigraph(self):
+        n0 = Node(0, '', {}, {2: 1})
+        n1 = Node(1, '', {}, {2: 1})
+        n2 = Node(2, '&', {0: 1, 1: 1}, {3: 1})
+        n3 = Node(3, '~', {2: 1}, {4: 1})
+        n4 = Node(4, '', {3: 1}, {})
+        g1 = OpenDigraph([0, 1], [4], [n0, n1, n2, n3, n4])
+
+        # Same graph with node 3 removed, node 2 renumbered, a relabel and a new output
+        m0 = Node(0, '', {}, {7: 1})
+        m1 = Node(1, '', {}, {7: 1})
+        m7 = Node(7, '&', {0: 1, 1: 1}, {4: 1, 5: 1})
+        m4 = Node(4, 'o', {7: 1}, {})
+        m5 = Node(5, '', {7: 1}, {})
+        g2 = OpenDigraph([0, 1], [4, 5], [m0, m1, m7, m4, m5])
+
+        patch = g1.diff(g2)
+        self.assertEqual(patch['remove'], [3])
+        self.assertEqual(patch['rename'], [(2, 7)])
+        self.assertEqual(patch['add'], [(5, '')])
+        self.assertEqual(patch['labels'], [(4, 'o')])
+        self.assertEqual(patch['inputs'], None)
+        self.assertEqual(patch['outputs'], [4, 5])
+        self.assertEqual(g1.diff(g1), {'remove': [], 'rename': [], 'add': [], 'labels': [], 'edges': [],
+                                       'inputs': None, 'outputs': None})
+
+        g1.apply_patch(patch)
+        self.assertEqual(g1.get_id_node_map(), g2.get_id_node_map())
+        self.assertEqual(g1.get_output_ids(), [4, 5])
+        self.assertTrue(g1.is_well_formed())
+
+        # Only the output node is renamed: the ports follow it
+        g1 = OpenDigraph([0], [2], [Node(0, '', {}, {1: 1}), Node(1, '~', {0: 1}, {2: 1}), Node(2, '', {1: 1}, {})])
+        g2 = OpenDigraph([0], [5], [Node(0, '', {}, {1: 1}), Node(1, '~', {0: 1}, {5: 1}), Node(5, '', {1: 1}, {})])
+        patch = g1.diff(g2)
+        self.assertEqual((patch['rename'], patch['outputs']), ([(2, 5)], None))
+        g1.apply_patch(patch)
+        self.assertEqual(g1, g2)
+        self.assertTrue(g1.is_well_formed())
+
+        for _ in range(10):
+            g1 = OpenDigraph.random(n=8, bound=2, form='free')
+            g2 = OpenDigraph.random(n=10, bound=2, form='DAG')
+            g1.apply_patch(g1.diff(g2))
+            self.assertEqual(g1.get_id_node_map(), g2.get_id_node_map())
+
+    def test_compile_BoolCirc(self):
+        # Half adder: outputs a ^ b and a & b
+        n0 = Node(0, '', {}, {2: 1})
+        n1 = Node(1, '', {}, {3: 1})
+        n2 = Node(2, '', {0: 1}, {4: 1, 5: 1})
+        n3 = Node(3, '', {1: 1}, {4: 1, 5: 1})
+        n4 = Node(4, '^', {2: 1, 3: 1}, {6: 1})
+        n5 = Node(5, '&', {2: 1, 3: 1}, {7: 1})
+        n6 = Node(6, '', {4: 1}, {})
+        n7 = Node(7, '', {5: 1}, {})
+        n8 = Node(8, '~', {}, {})  # Dead gate
+        b = BoolCirc(OpenDigraph([0, 1], [6, 7], [n0, n1, n2, n3, n4, n5, n6, n7, n8]))
+
+        f = b.compile()
+        self.assertEqual(len(f.ops), 2)
+        for x in range(2):
+            for y in range(2):
+                self.assertEqual(f((x, y)), (x ^ y, x & y))
+        self.assertEqual(f((0b1100, 0b1010), 0b1111), (0b0110, 0b1000))  # 4 assignments at once
+        self.assertEqual(len(b.g.get_nodes()), 9)  # b is unchanged
+
+        self.assertEqual(pickle.loads(pickle.dumps(f))((1, 1)), (0, 1))
+        with self.assertRaises(ValueError):
+            f((1,))
+
+        # Constants, negation and multiplicities
+        n0 = Node(0, '', {}, {2: 1})
+        n1 = Node(1, '1', {}, {3: 1})
+        n2 = Node(2, '~', {0: 1}, {3: 2})
+        n3 = Node(3, '^', {1: 1, 2: 2}, {4: 1})
+        n4 = Node(4, '', {3: 1}, {})
+        f = BoolCirc(OpenDigraph([0], [4], [n0, n1, n2, n3, n4])).compile()
+        self.assertEqual(f((0,)), (1,))
+        self.assertEqual(f((1,)), (1,))
+
+    def test_simulate_BoolCirc(self):
+        b = and_or_not_circuit()
+
+        vectors = [tuple(randint(0, 1) for _ in range(3)) for _ in range(50)]
+        expected = [((x & y) | z, 1 - z) for x, y, z in vectors]
+        self.assertEqual(b.simulate(vectors), expected)
+        self.assertEqual(b.simulate(vectors, width=8), expected)  # Several chunks, the last one partial
+        self.assertEqual(b.simulate([]), [])
+
+        self.assertEqual(pack_bits([(1, 0), (1, 1), (0, 1)], 2), [0b011, 0b110])
+        self.assertEqual(unpack_bits((0b011, 0b110), 3), [(1, 0), (1, 1), (0, 1)])
+        f = b.compile()
+        self.assertEqual(f.evaluate_packed([0b1111, 0b0101, 0b0011], 4), (0b0111, 0b1100))
+
+    @unittest.skipIf(np is None, "NumPy is not installed")
+    def test_evaluate_array_BoolCirc(self):
+        b = and_or_not_circuit()
+
+        array = np.random.randint(0, 2, size=(100, 3)).astype(np.uint8)
+        expected = np.array(b.simulate([tuple(row) for row in array]), dtype=np.uint8)
+        result = b.evaluate_array(array, chunk=7)
+        self.assertEqual(result.shape, (100, 2))
+        self.assertEqual(result.dtype, np.uint8)
+        self.assertTrue((result == expected).all())
+        self.assertTrue((b.evaluate_array(array.astype(bool)) == expected.astype(bool)).all())
+        with self.assertRaises(ValueError):
+            b.evaluate_array(np.zeros((4, 2), dtype=bool))
+
+        # Constant outputs are broadcast, and a long chain only needs a couple of registers
+        n0 = Node(0, '', {}, {1: 1})
+        nodes = [n0] + [Node(i, '~', {i - 1: 1}, {i + 1: 1}) for i in range(1, 100)]
+        nodes += [Node(100, '', {99: 1}, {}), Node(101, '1', {}, {102: 1}), Node(102, '', {101: 1}, {})]
+        f = BoolCirc(OpenDigraph([0], [100, 102], nodes)).compile()
+        self.assertNotIn('r2', f.source)
+        result = f.evaluate_array(np.array([[0], [1]], dtype=bool))
+        self.assertEqual(result.tolist(), [[True, True], [False, True]])
+
+    def test_evaluate_parallel_BoolCirc(self):
+        # Outputs a & b and a ^ b ^ c
+        n0 = Node(0, '', {}, {3: 1})
+        n1 = Node(1, '', {}, {4: 1})
+        n2 = Node(2, '', {}, {6: 1})
+        n3 = Node(3, '', {0: 1}, {5: 1, 6: 1})
+        n4 = Node(4, '', {1: 1}, {5: 1, 6: 1})
+        n5 = Node(5, '&', {3: 1, 4: 1}, {7: 1})
+        n6 = Node(6, '^', {2: 1, 3: 1, 4: 1}, {8: 1})
+        n7 = Node(7, '', {5: 1}, {})
+        n8 = Node(8, '', {6: 1}, {})
+        b = BoolCirc(OpenDigraph([0, 1, 2], [7, 8], [n0, n1, n2, n3, n4, n5, n6, n7, n8]))
+        compiled = b.compile()
+
+        rng = Random(3)
+        assignments = [tuple(rng.getrandbits(1) for _ in range(3)) for _ in range(1000)]
+        expected = [compiled(bits) for bits in assignments]
+        self.assertEqual(list(b.evaluate_parallel(assignments, processes=2, shard=64)), expected)
+        self.assertEqual(list(compiled.evaluate_parallel(iter(assignments), processes=1, shard=300)), expected)
+
+        batches = [([0b0101, 0b0011, 0b1111], 4), ([1, 1, 0], 1)]
+        self.assertEqual(list(compiled.evaluate_packed_parallel(batches, processes=2)),
+                         [(0b0001, 0b1001), (1, 0)])
+        with self.assertRaises(ValueError):
+            list(compiled.evaluate_parallel(assignments, processes=0))
+
+    def test_check_equivalence_BoolCirc(self):
+        def circuit(label):
+            # Outputs ~(a & b) computed as ~(a & b) or as ~a | ~b, or a wrong ~a & ~b
+            n0 = Node(0, '', {}, {2: 1})
+            n1 = Node(1, '', {}, {3: 1})
+            nodes = [n0, n1]
+            if label == 'nand':
+                nodes += [Node(2, '&', {0: 1}, {4: 1}), Node(3, '', {1: 1}, {2: 1}), Node(4, '~', {2: 1}, {5: 1})]
+                nodes[2].parents[3] = 1
+                nodes += [Node(5, '', {4: 1}, {})]
+                return BoolCirc(OpenDigraph([0, 1], [5], nodes))
+            gate = '|' if label == 'or' else '&'
+            nodes += [Node(2, '~', {0: 1}, {4: 1}), Node(3, '~', {1: 1}, {4: 1}),
+                      Node(4, gate, {2: 1, 3: 1}, {5: 1}), Node(5, '', {4: 1}, {})]
+            return BoolCirc(OpenDigraph([0, 1], [5], nodes))
+
+        nand = circuit('nand')
+        self.assertEqual(nand.check_equivalence(circuit('or')), (None, 4, True))  # Proved
+        # Random vectors only: not a proof, even with as many vectors as assignments
+        self.assertEqual(nand.check_equivalence(circuit('or'), exhaustive_inputs=1, processes=2), (None, 4, False))
+        counterexample, checked, exhaustive = nand.check_equivalence(circuit('and'), seed=1)
+        self.assertIn(counterexample, [(0, 1), (1, 0)])
+        self.assertLessEqual(checked, 4)
+        self.assertTrue(exhaustive)
+        counterexample, _, exhaustive = nand.check_equivalence(circuit('and'), exhaustive_inputs=0, seed=1)
+        self.assertIn(counterexample, [(0, 1), (1, 0)])
+        self.assertFalse(exhaustive)
+
+        optimized, _ = nand.optimize()
+        self.assertEqual(nand.check_equivalence(optimized, random_vectors=0), (None, 4, True))
+        with self.assertRaises(ValueError):
+            nand.check_equivalence(BoolCirc(OpenDigraph([0], [1], [Node(0, '', {}, {1: 1}),
+                                                                   Node(1, '', {0: 1}, {})])))
+
+    def test_truth_table_BoolCirc(self):
+        b = and_or_not_circuit()
+
+        def expected(x):
+            a, b_, c = x & 1, (x >> 1) & 1, (x >> 2) & 1
+            return ((a & b_) | c) | ((1 - c) << 1)
+
+        table = [(x, expected(x)) for x in range(8)]
+        self.assertEqual(list(b.truth_table()), table)
+        self.assertEqual(list(b.truth_table(chunk_bits=1)), table)  # 4 chunks of 2 rows
+        self.assertEqual(list(b.truth_table(fixed={2: 1, 0: 0})), [(4, expected(4)), (6, expected(6))])
+
+        rows = list(b.truth_table(chunk_bits=3, samples=20, seed=1))
+        self.assertEqual(len(rows), 20)
+        self.assertEqual(rows, list(b.truth_table(chunk_bits=3, samples=20, seed=1)))
+        for x, y in rows:
+            self.assertEqual(y, expected(x))
+        with self.assertRaises(ValueError):
+            list(b.truth_table(fixed={3: 1}))
+
+        stream = io.BytesIO()
+        self.assertEqual(b.write_truth_table(stream), 8)
+        self.assertEqual(stream.getvalue(), bytes(v for x, y in table for v in (x, y)))
+        with tempfile.TemporaryDirectory() as directory:
+            path = pathlib.Path(directory, 'table.bin')
+            self.assertEqual(b.write_truth_table(path), 8)
+            self.assertEqual(path.read_bytes(), stream.getvalue())
+
+    def test_incremental_simulator_BoolCirc(self):
+        b = and_or_not_circuit()
+
+        sim = b.incremental_simulator()
+        self.assertEqual(sim.get_outputs(), (0, 1))
+        self.assertEqual(sim.set_inputs({0: 1}), 1)  # a & b stays 0, only a flips
+        self.assertEqual(sim.set_inputs({1: 1}), 4)  # b, a & b, the or gate and its output
+        self.assertEqual(sim.get_outputs(), (1, 1))
+        self.assertEqual(sim.get_value(3), 1)
+        self.assertEqual(sim.set_inputs({1: 1}), 0)
+
+        bits = [1, 1, 0]
+        for _ in range(30):
+            i, bit = randint(0, 2), randint(0, 1)
+            bits[i] = bit
+            sim.set_inputs({i: bit})
+            self.assertEqual(sim.get_outputs(), b.compile()(bits))
+        with self.assertRaises(ValueError):
+            b.incremental_simulator([1])
+
+    def test_evaluate_BoolCirc(self):
+        def circuit():
+            # Outputs (a & b) | (c ^ 1), ~c and a ^ a ^ b
+            n0 = Node(0, '', {}, {3: 1})
+            n1 = Node(1, '', {}, {9: 1})
+            n2 = Node(2, '', {}, {4: 1})
+            n3 = Node(3, '', {0: 1}, {5: 1, 11: 2})
+            n4 = Node(4, '', {2: 1}, {10: 1, 6: 1})
+            n5 = Node(5, '&', {3: 1, 9: 1}, {12: 1})
+            n6 = Node(6, '~', {4: 1}, {8: 1})
+            n7 = Node(7, '', {12: 1}, {})
+            n8 = Node(8, '', {6: 1}, {})
+            n9 = Node(9, '', {1: 1}, {5: 1, 11: 1})
+            n10 = Node(10, '^', {4: 1, 13: 1}, {12: 1})
+            n11 = Node(11, '^', {3: 2, 9: 1}, {14: 1})
+            n12 = Node(12, '|', {5: 1, 10: 1}, {7: 1})
+            n13 = Node(13, '1', {}, {10: 1})
+            n14 = Node(14, '', {11: 1}, {})
+            return BoolCirc(OpenDigraph([0, 1, 2], [7, 8, 14],
+                                        [n0, n1, n2, n3, n4, n5, n6, n7, n8, n9, n10, n11, n12, n13, n14]))
+
+        f = circuit().compile()
+        for x in range(8):
+            bits = [(x >> i) & 1 for i in range(3)]
+            b = circuit()
+            for input_id, bit in zip(b.g.get_input_ids(), bits):  # Inputs become constants
+                b.g.get_node_by_id(input_id).set_label(str(bit))
+            b.g.inputs = []
+            self.assertGreater(b.evaluate(), 0)
+            results = tuple(int(b.g.get_node_by_id(next(iter(b.g.get_node_by_id(i).get_parents()))).get_label())
+                            for i in b.g.get_output_ids())
+            self.assertEqual(results, f(bits))
+            self.assertEqual(len(b.g.get_nodes()), 6)  # Only the outputs and their constants are left
+            self.assertTrue(b.g.is_well_formed())
+
+    def test_optimize_BoolCirc(self):
+        # Outputs ~~(a & 1) and b ^ 0, with a dead gate using c
+        n0 = Node(0, '', {}, {3: 1})
+        n1 = Node(1, '', {}, {8: 1})
+        n2 = Node(2, '', {}, {10: 1})
+        n3 = Node(3, '&', {0: 1, 4: 1}, {5: 1})
+        n4 = Node(4, '1', {}, {3: 1})
+        n5 = Node(5, '~', {3: 1}, {6: 1})
+        n6 = Node(6, '~', {5: 1}, {7: 1})
+        n7 = Node(7, '', {6: 1}, {})
+        n8 = Node(8, '^', {1: 1, 9: 1}, {11: 1})
+        n9 = Node(9, '0', {}, {8: 1})
+        n10 = Node(10, '|', {2: 1}, {})
+        n11 = Node(11, '', {8: 1}, {})
+        b = BoolCirc(OpenDigraph([0, 1, 2], [7, 11], [n0, n1, n2, n3, n4, n5, n6, n7, n8, n9, n10, n11]))
+
+        optimized, stats = b.optimize()
+        self.assertEqual(len(b.g.get_nodes()), 12)  # b is unchanged
+        self.assertEqual(b.g.get_node_by_id(3).get_parents(), {0: 1, 4: 1})
+        self.assertEqual(list(optimized.truth_table()), list(b.truth_table()))
+        self.assertEqual(stats['gates_before'], 7)
+        self.assertEqual(stats['gates_after'], 0)  # Both outputs are copies of an input
+        self.assertEqual(stats['gates_removed'], 7)
+        self.assertEqual(stats['depth_before'], 4)
+        self.assertEqual(stats['depth_after'], 1)
+        self.assertEqual(optimized.g.get_node_by_id(7).get_parents(), {0: 1})
+        self.assertEqual(optimized.g.get_input_ids(), [0, 1, 2])
+        self.assertTrue(optimized.is_well_formed())
+
+    def test_structural_hashing_BoolCirc(self):
+        # Outputs (~a & b) and (b & ~a): both not gates and both and gates are duplicates
+        n0 = Node(0, '', {}, {2: 1})
+        n1 = Node(1, '', {}, {3: 1})
+        n2 = Node(2, '', {0: 1}, {4: 1, 5: 1})
+        n3 = Node(3, '', {1: 1}, {6: 1, 7: 1})
+        n4 = Node(4, '~', {2: 1}, {6: 1})
+        n5 = Node(5, '~', {2: 1}, {7: 1})
+        n6 = Node(6, '&', {4: 1, 3: 1}, {8: 1})
+        n7 = Node(7, '&', {3: 1, 5: 1}, {9: 1})
+        n8 = Node(8, '', {6: 1}, {})
+        n9 = Node(9, '', {7: 1}, {})
+        b = BoolCirc(OpenDigraph([0, 1], [8, 9], [n0, n1, n2, n3, n4, n5, n6, n7, n8, n9]))
+        table = list(b.truth_table())
+
+        self.assertEqual(b.structural_hashing(), {5: 4, 7: 6})
+        self.assertEqual(sorted(b.g.get_node_ids()), [0, 1, 2, 3, 4, 6, 8, 9])
+        self.assertEqual(b.g.get_node_by_id(6).get_children(), {8: 1, 9: 1})
+        self.assertEqual(b.g.get_node_by_id(3).get_children(), {6: 1})
+        self.assertTrue(b.is_well_formed())
+        self.assertEqual(list(b.truth_table()), table)
+        self.assertEqual(b.structural_hashing(), {})
+
+    def test_CircuitBuilder(self):
+        builder = CircuitBuilder()
+        a, b = builder.add_input(), builder.add_input()
+        not_a = builder.add_gate('~', [a])
+        self.assertEqual(builder.add_gate('~', [a]), not_a)
+        gate = builder.add_gate('&', [not_a, b])
+        self.assertEqual(builder.add_gate('&', [b, not_a, b]), gate)
+        self.assertEqual(builder.add_gate('^', [a, b, b]), builder.add_gate('^', [a]))
+        self.assertNotEqual(builder.add_gate('|', [not_a, b]), gate)
+        builder.add_output(gate)
+        builder.add_output(builder.add_gate('^', [a, b, b]))
+        with self.assertRaises(ValueError):
+            builder.add_gate('~', [a, b])
+        with self.assertRaises(ValueError):
+            builder.add_gate('x', [a])
+
+        circ = builder.build()
+        self.assertEqual(len(circ.g.get_nodes()), 10)
+        self.assertEqual(circ.g.get_input_ids(), [0, 2])
+        self.assertEqual(list(circ.truth_table()), [(0, 0), (1, 2), (2, 1), (3, 2)])  # (~a & b, a)
+
+    def test_parse_parentheses_BoolCirc(self):
+        b, variables = BoolCirc().parse_parentheses("(x0 & ~x10) | ~x10 ^ 1 & x0")
+        self.assertEqual(variables, ['x0', 'x10'])
+        self.assertTrue(b.is_well_formed())
+        # x0 & ~x10 | (~x10 ^ (1 & x0)), with a single ~x10 gate
+        self.assertEqual([y for _, y in b.truth_table()], [1, 1, 0, 1])
+        self.assertEqual(sum(1 for node in b.g.get_nodes() if node.get_label() == '~'), 1)
+
+        b, variables = BoolCirc().parse_parentheses("~~(a_1)&(((b)))")
+        self.assertEqual(variables, ['a_1', 'b'])
+        self.assertEqual([y for _, y in b.truth_table()], [0, 0, 0, 1])
+
+        deep = '(' * 5000 + 'a' + ' ^ b)' * 5000
+        self.assertEqual([y for _, y in BoolCirc().parse_parentheses(deep)[0].truth_table()], [0, 1, 0, 1])  # = a
+
+        for formula, position in [("a & ", 4), ("a b", 2), ("(a | b", 0), ("a)", 1), ("a + b", 2), ("&a", 0)]:
+            with self.assertRaises(ValueError) as context:
+                BoolCirc().parse_parentheses(formula)
+            self.assertIn(f"position {position}", str(context.exception))
+
+    def test_parse_parentheses_multiple_BoolCirc(self):
+        b = BoolCirc.parse_parentheses_multiple("a & ~c", "~c & a | b", "b")
+        self.assertEqual(b.g.get_input_ids(), [0, 2, 7])  # a, c, b
+        self.assertEqual(len(b.g.get_output_ids()), 3)
+        self.assertEqual(sum(1 for node in b.g.get_nodes() if node.get_label() != ''), 3)  # ~c, &, |
+        rows = dict(b.truth_table())
+        self.assertEqual([rows[x] for x in range(8)], [0, 3, 0, 0, 6, 7, 6, 6])
+
+        b, variables = BoolCirc.from_formulas(f"x{k} ^ x{k + 1}" for k in range(100))
+        self.assertEqual(variables, [f"x{k}" for k in range(101)])
+        self.assertEqual(len(b.g.get_output_ids()), 100)
+        with self.assertRaises(ValueError) as context:
+            BoolCirc.from_formulas(["a", "a |"])
+        self.assertIn("Formula 1", str(context.exception))
+
+    def test_adder_circuit_BoolCirc(self):
+        for architecture in ['ripple', 'lookahead', 'brent-kung', 'kogge-stone']:
+            for width in [1, 3, 4, 6]:
+                for carry_in in [True, False]:
+                    adder = BoolCirc.adder_circuit(width, architecture, carry_in)
+                    self.assertEqual(len(adder.g.get_output_ids()), width + 1)
+                    mask = (1 << width) - 1
+                    for x, y in adder.truth_table():  # Inputs a, b then c, LSB first
+                        self.assertEqual(y, (x & mask) + ((x >> width) & mask) + (x >> (2 * width)))
+
+        def depth(architecture):
+            return max(BoolCirc.adder_circuit(64, architecture).g.levels().values())
+        self.assertLess(depth('kogge-stone'), depth('brent-kung'))
+        self.assertLess(depth('brent-kung'), depth('lookahead'))
+        self.assertLess(depth('lookahead'), depth('ripple'))
+        with self.assertRaises(ValueError):
+            BoolCirc.adder_circuit(4, 'sklansky')
+
+        b = BoolCirc()
+        b.adder(2)
+        self.assertEqual((len(b.g.get_input_ids()), len(b.g.get_output_ids())), (9, 5))
+        b.half_adder(0)
+        self.assertEqual(list(b.truth_table()), [(0, 0), (1, 1), (2, 1), (3, 2)])
+        b.carry_lookahead_adder(2)
+        self.assertEqual(len(b.g.get_input_ids()), 17)
+
+    def test_TemplateCache(self):
+        cache = TemplateCache(maxsize=2)
+        first = cache.get(BoolCirc.adder_circuit, 4, 'kogge-stone')
+        second = cache.get(BoolCirc.adder_circuit, 4, 'kogge-stone', first_id=1000)
+        self.assertEqual((cache.misses, cache.hits), (1, 1))
+        self.assertEqual(min(second.g.get_node_ids()), 1000)
+        self.assertEqual(list(first.truth_table()), list(second.truth_table()))
+        self.assertEqual(first.g, BoolCirc.adder_circuit(4, 'kogge-stone').g)
+        template = cache.template(BoolCirc.adder_circuit, 4, 'kogge-stone')
+        labels, edges = template.labels, template.edges
+
+        output = first.g.get_output_ids()[0]  # Instances are independent of the template and of each other
+        first.g.get_node_by_id(output).set_label('~')
+        first.g.add_edge(first.g.get_input_ids()[0], output)
+        self.assertEqual((template.labels, template.edges), (labels, edges))
+        third = cache.get(BoolCirc.adder_circuit, 4, 'kogge-stone')
+        self.assertNotEqual(third.g, first.g)
+        self.assertEqual(third.g, BoolCirc.adder_circuit(4, 'kogge-stone').g)
+        self.assertEqual(third.g.get_node_by_id(output).get_label(), '')
+
+        b = BoolCirc()
+        b.half_adder(1)
+        self.assertEqual(list(cache.get('half_adder', 1).truth_table()), list(b.truth_table()))
+        cache.get('adder', 1)
+        self.assertEqual(len(cache.templates), 2)  # The kogge-stone adder was evicted
+        cache.get(BoolCirc.adder_circuit, 4, 'kogge-stone')
+        self.assertEqual(cache.misses, 4)
+
+        with tempfile.TemporaryDirectory() as directory:
+            TemplateCache(directory=directory).get('adder', 2)
+            warm = TemplateCache(directory=directory)
+            adder = warm.get('adder', 2)
+            self.assertEqual((warm.misses, warm.loads), (0, 1))
+            self.assertTrue(adder.is_well_formed())
+            self.assertEqual(len(adder.g.get_input_ids()), 9)
+
+            def generator(n):
+                return BoolCirc.adder_circuit(n)
+            TemplateCache(directory=directory).get(generator, 2)
+
+            def generator(n):  # Same qualified name, other code: built again
+                return BoolCirc.adder_circuit(n, 'kogge-stone')
+            warm = TemplateCache(directory=directory)
+            self.assertEqual(warm.get(generator, 2).g, BoolCirc.adder_circuit(2, 'kogge-stone').g)
+            self.assertEqual((warm.misses, warm.loads), (1, 0))
+        self.assertEqual(code_digest(BoolCirc.adder), code_digest(BoolCirc().adder))
+        self.assertEqual(code_digest(len), '')
+
+    def test_constant_registers_BoolCirc(self):
+        b, ports = BoolCirc.constant_registers([5, 0, 12], 4, first_id=10)
+        self.assertEqual(ports, [range(22, 26), range(26, 30), range(30, 34)])
+        self.assertEqual(sorted(b.g.get_node_ids()), list(range(10, 34)))
+        self.assertEqual(list(b.truth_table()), [(0, 5 | 0 << 4 | 12 << 8)])
+        self.assertEqual([b.g.get_node_by_id(i).get_label() for i in range(10, 14)], ['1', '0', '1', '0'])
+        with self.assertRaises(ValueError):
+            BoolCirc.constant_registers([16], 4)
+        with self.assertRaises(ValueError):
+            BoolCirc.constant_registers([-1], 4)
+
+        b = BoolCirc()
+        b.int_to_register_circuit(6, 8)
+        self.assertEqual(list(b.truth_table()), [(0, 6)])
+        self.assertEqual(list(BoolCirc.constant_registers([1 << 70], 72)[0].truth_table()), [(0, 1 << 70)])
+
+    @unittest.skipIf(np is None, "NumPy is not installed")
+    def test_constant_registers_array_BoolCirc(self):
+        values = np.arange(0, 256, 17, dtype=np.uint8)
+        b, ports = BoolCirc.constant_registers(values, 8)
+        self.assertEqual(len(ports), len(values))
+        (_, y), = b.truth_table()
+        self.assertEqual([(y >> (8 * r)) & 255 for r in range(len(values))], values.tolist())
+
+        for width in (12, 64):  # uint64 can't be shifted by the default int64 range
+            values = np.array([0, 4095, 2730], dtype=np.uint64)
+            b, ports = BoolCirc.constant_registers(values, width)
+            (_, y), = b.truth_table()
+            self.assertEqual([(y >> (width * r)) & 4095 for r in range(3)], values.tolist())
+        with self.assertRaises(ValueError):
+            BoolCirc.constant_registers(np.array([4096], dtype=np.uint64), 12)
+        self.assertEqual(BoolCirc.constant_registers(np.array([]), 4)[1], [])
+
+    def test_HammingCodec(self):
+        codec = HammingCodec(chunk=5)
+        codewords = list(codec.encode(range(16)))
+        self.assertEqual(codewords[:4], [0, 7, 25, 30])
+        self.assertEqual(list(codec.decode(codewords)), list(range(16)))
+        for codeword in codewords:  # Every single-bit error is corrected
+            self.assertEqual(list(codec.decode(codeword ^ (1 << k) for k in range(7))), [codewords.index(codeword)] * 7)
+        received = list(HammingCodec.inject_errors(codewords, seed=4))
+        self.assertTrue(all(bin(x ^ y).count('1') == 1 for x, y in zip(codewords, received)))
+        self.assertEqual(list(HammingCodec.inject_errors(codewords, rate=0.0)), codewords)
+        with self.assertRaises(ValueError):
+            list(codec.encode([16]))
+        self.assertEqual(codec.benchmark(100, seed=1)['codewords'], 100)
+
+    @unittest.skipIf(np is None, "NumPy is not installed")
+    def test_HammingCodec_array(self):
+        codec = HammingCodec()
+        nibbles = np.arange(32, dtype=np.uint8).reshape(4, 8) % 16
+        codewords = codec.encode(nibbles)
+        self.assertEqual(codewords.shape, (4, 8))
+        self.assertEqual(codewords.dtype, np.uint8)
+        self.assertEqual(codewords.ravel().tolist(), list(codec.encode(nibbles.ravel().tolist())))
+        received = HammingCodec.inject_errors(codewords, seed=3)
+        self.assertTrue((received != codewords).all())
+        self.assertTrue((codec.decode(received) == nibbles).all())
+
+        wide = np.arange(16, dtype=np.uint64)  # uint64 can't be shifted by the default int64 range
+        encoded = codec.encode(wide)
+        self.assertEqual(encoded.dtype, np.uint64)
+        self.assertEqual(encoded.tolist(), list(codec.encode(range(16))))
+        self.assertEqual(codec.decode(encoded).tolist(), list(range(16)))
+        with self.assertRaises(ValueError):
+            codec.encode(np.array([16], dtype=np.uint64))
+
+    def test_random_circuit_BoolCirc(self):
+        b = BoolCirc.random_circuit(200, 8, 5, depth=12, seed=7)
+        self.assertTrue(b.is_well_formed())
+        self.assertEqual(len(b.g.get_input_ids()), 8)
+        self.assertEqual(len(b.g.get_output_ids()), 5)
+        self.assertEqual(sum(1 for node in b.g.get_nodes() if node.get_label() != ''), 200)
+        self.assertEqual(max(b.g.levels().values()), 12 + 2)  # Input and copy node, 12 gates, output
+        self.assertEqual(sorted(b.g.get_node_ids()), list(range(2 * 8 + 200 + 5)))
+        self.assertEqual(b.g, BoolCirc.random_circuit(200, 8, 5, depth=12, seed=7).g)
+        self.assertNotEqual(b.g, BoolCirc.random_circuit(200, 8, 5, depth=12, seed=8).g)
+
+        for depth in (12, None):  # Every gate is in the cone of some output
+            b = BoolCirc.random_circuit(200, 8, 5, depth=depth, seed=3)
+            covered = set().union(*(mapping for _, mapping in b.cones()))
+            self.assertTrue(all(node.get_id() in covered for node in b.g.get_nodes() if node.get_label() != ''))
+
+        b = BoolCirc.random_circuit(50, 1, 50, seed=1, unary_operators='', binary_operators='&')
+        self.assertTrue(b.is_well_formed())
+        self.assertEqual(len(list(b.truth_table())), 2)
+        with self.assertRaises(ValueError):
+            BoolCirc.random_circuit(3, 2, 4)
+        with self.assertRaises(ValueError):
+            BoolCirc.random_circuit(3, 2, 1, depth=4)
+
+        b = BoolCirc(OpenDigraph.random(10, 2, form="DAG"), test=True)
+        b.random_bool_circ('~', '&|', 2, 3, seed=0)
+        self.assertTrue(b.is_well_formed())
+        self.assertEqual(len(b.g.get_output_ids()), 3)
+
+    def test_blif_BoolCirc(self):
+        blif = io.StringIO("""# Out of order covers, off-set cover and continued line
+.model test
+.inputs a b \\
+ c
+.outputs f g
+.names t c f
+1- 1
+-1 1
+.names a b t
+11 1
+.names a c g
+00 0
+.end
+""")
+        b, inputs, outputs = BoolCirc.read_blif(blif)
+        self.assertEqual((inputs, outputs), (['a', 'b', 'c'], ['f', 'g']))
+        self.assertTrue(b.is_well_formed())
+        rows = dict(b.truth_table())  # f = a & b | c, g = a | c
+        self.assertEqual([rows[x] for x in range(8)], [0, 2, 0, 3, 3, 3, 3, 3])
+
+        stream = io.StringIO()
+        b.write_blif(stream, input_names=inputs, output_names=outputs)
+        stream.seek(0)
+        self.assertEqual(list(BoolCirc.read_blif(stream)[0].truth_table()), list(b.truth_table()))
+
+        xor = BoolCirc.parse_parentheses_multiple("x ^ y ^ z ^ 1")
+        stream = io.StringIO()
+        xor.write_blif(stream)
+        stream.seek(0)
+        self.assertEqual(list(BoolCirc.read_blif(stream)[0].truth_table()), list(xor.truth_table()))
+        names = [f"n{k}" for k in range(xor.compile().n_inputs + len(xor.compile().ops) + 1)]
+        with tempfile.TemporaryDirectory() as directory:  # Internal names don't collide with the given ones
+            path = pathlib.Path(directory, 'xor.blif')
+            xor.write_blif(path, input_names=names[:3], output_names=[names[-1] + '_0'])
+            self.assertIn('.names _n', path.read_text())
+            self.assertEqual(list(BoolCirc.read_blif(path)[0].truth_table()), list(xor.truth_table()))
+        with self.assertRaises(ValueError):
+            xor.write_blif(io.StringIO(), input_names=['a', 'b', 'c'], output_names=['a'])
+
+        for text in [".inputs a\n.outputs f\n.names a b f\n11 1\n", ".inputs a\n.outputs f\n.latch a f\n",
+                     ".inputs a\n.outputs f\n.names a g f\n11 1\n.names f g\n1 1\n"]:
+            with self.assertRaises(ValueError):
+                BoolCirc.read_blif(io.StringIO(text))
+
+    def test_aiger_BoolCirc(self):
+        half_adder = b"aag 7 2 0 2 3\n2\n4\n6\n12\n6 13 15\n12 2 4\n14 3 5\ni0 x\ni1 y\no0 s\no1 c\nc\nhalf adder\n"
+        b, inputs, outputs = BoolCirc.read_aiger(io.BytesIO(half_adder))
+        self.assertEqual((inputs, outputs), (['x', 'y'], ['s', 'c']))
+        self.assertEqual(list(b.truth_table()), [(0, 0), (1, 1), (2, 1), (3, 2)])
+
+        b, _, _ = BoolCirc.read_aiger(io.BytesIO(b"aig 3 2 0 1 1\n6\n\x02\x02"))  # and gate
+        self.assertEqual([y for _, y in b.truth_table()], [0, 0, 0, 1])
+
+        adder = BoolCirc.adder_circuit(3, 'brent-kung')
+        for binary in [True, False]:
+            stream = io.BytesIO()
+            adder.write_aiger(stream, binary, output_names=['s0'])
+            stream.seek(0)
+            self.assertTrue(stream.getvalue().startswith(b'aig' if binary else b'aag'))
+            circ, inputs, outputs = BoolCirc.read_aiger(stream)
+            self.assertEqual(outputs[:2], ['s0', 'o1'])
+            self.assertEqual(list(circ.truth_table()), list(adder.truth_table()))
+
+        with self.assertRaises(ValueError):
+            BoolCirc.read_aiger(io.BytesIO(b"aag 1 0 1 0 0\n2 3\n"))  # Latch
+        with self.assertRaises(ValueError):
+            BoolCirc.read_aiger(io.BytesIO(b"aig 3 2 0 1 1\n6\n\x82"))  # Truncated
+        with self.assertRaises(ValueError):
+            BoolCirc.read_aiger(io.BytesIO(b"aag 2 0 0 1 2\n2\n2 4 0\n4 2 1\n"))  # Loop
+
+    def test_topological_order_OpenDigraph(self):
+        n0 = Node(0, 'A', {}, {1: 1, 2: 1})
+        n1 = Node(1, 'B', {0: 1}, {2: 2})
+        n2 = Node(2, 'C', {0: 1, 1: 2}, {})
+        g = OpenDigraph([], [], [n0, n1, n2])
+        self.assertEqual(g.topological_order(), [0, 1, 2])
+
+        n0 = Node(0, 'A', {1: 1}, {1: 1})
+        n1 = Node(1, 'B', {0: 1}, {0: 1})
+        with self.assertRaises(ValueError):
+            OpenDigraph([], [], [n0, n1]).topological_order()
+
+    def test_subgraph_OpenDigraph(self):
+        n0 = Node(0, 'A', {}, {1: 1, 2: 1})
+        n1 = Node(1, 'B', {0: 1}, {2: 1, 3: 2})
+        n2 = Node(2, 'C', {0: 1, 1: 1}, {3: 1})
+        n3 = Node(3, 'D', {1: 2, 2: 1}, {})
+        g = OpenDigraph([], [], [n0, n1, n2, n3])
+
+        sub, mapping = g.subgraph([1, 2], remap=True)
+        self.assertTrue(sub.is_well_formed())
+        self.assertEqual(mapping[1], 0)
+        self.assertEqual(mapping[2], 1)
+        self.assertEqual(len(sub.get_input_ids()), 1)  # Node 0 feeds both nodes through a single input
+        self.assertEqual(len(sub.get_output_ids()), 2)  # Both nodes feed node 3
+        self.assertEqual(sub.get_node_by_id(1).get_parents(), {0: 1, mapping[0] + 1: 1})
+        self.assertEqual(g.get_node_by_id(1).get_children(), {2: 1, 3: 2})  # g is unchanged
+
+        sub, mapping = g.subgraph([2, 3])
+        self.assertTrue(sub.is_well_formed())
+        self.assertEqual(sub.get_node_by_id(3).get_parents(), {2: 1, mapping[1] + 1: 2})
+        self.assertEqual(sub.get_output_ids(), [])
+        with self.assertRaises(ValueError):
+            g.subgraph([4])
+
+    def test_cone_BoolCirc(self):
+        n0 = Node(0, '', {}, {3: 1})
+        n1 = Node(1, '', {}, {3: 1})
+        n2 = Node(2, '', {}, {4: 1})
+        n3 = Node(3, '&', {0: 1, 1: 1}, {5: 1})
+        n4 = Node(4, '|', {5: 1, 2: 1}, {7: 1})
+        n5 = Node(5, '', {3: 1}, {4: 1, 6: 1})
+        n6 = Node(6, '~', {5: 1}, {8: 1})
+        n7 = Node(7, '', {4: 1}, {})
+        n8 = Node(8, '', {6: 1}, {})
+        b = BoolCirc(OpenDigraph([0, 1, 2], [7, 8], [n0, n1, n2, n3, n4, n5, n6, n7, n8]))
+
+        cone, mapping = b.cone(1)
+        self.assertEqual(sorted(cone.g.get_node_ids()), [0, 1, 3, 5, 6, 8])
+        self.assertEqual(cone.g.get_input_ids(), [0, 1])
+        self.assertEqual(cone.g.get_output_ids(), [8])
+        self.assertEqual(cone.g.get_node_by_id(5).get_children(), {6: 1})
+
+        cone, mapping = b.cone(0, remap=True)
+        self.assertEqual(sorted(cone.g.get_node_ids()), list(range(7)))
+        self.assertEqual(cone.g.get_input_ids(), [0, 1, 2])
+        self.assertEqual(cone.g.get_output_ids(), [mapping[7]])
+
+        cones = b.cones()
+        self.assertEqual(len(cones), 2)
+        self.assertEqual(sorted(cones[0][0].g.get_node_ids()), [0, 1, 2, 3, 4, 5, 7])
+        self.assertEqual(sorted(cones[1][0].g.get_node_ids()), [0, 1, 3, 5, 6, 8])
+        self.assertEqual(cones[1][0].g.get_output_ids(), [8])
+        self.assertEqual(len(b.g.get_nodes()), 9)  # b is unchanged
+
     '''
     def test_hamming_BoolCirc(self):
         code_hamming = BoolCirc()
@@ -769,18 +1696,5 @@ class InitTest(unittest.TestCase):
     '''
 
 
-# Creating a simple example graph
-node1 = Node(identity=1, label="A", parents={}, children={2: 1, 3: 1})
-node2 = Node(identity=2, label="B", parents={1: 1}, children={4: 1})
-node3 = Node(identity=3, label="C", parents={1: 1}, children={4: 1})
-node4 = Node(identity=4, label="D", parents={2: 1, 3: 1}, children={})
-
-graph = OpenDigraph(inputs=[1], outputs=[4], nodes=[node1, node2, node3, node4])
-
-
-# Save the graph as a .dot file
-graph.save_as_dot_file("example_graph.dot", verbose=True)
-
-
 if __name__ == '__main__':  # the following code is called only when
     unittest.main()  # precisely this file is run